@@ -20,6 +20,7 @@
 
 import os
 import csv
+import time
 import re
 import numpy as np
 
@@ -33,8 +34,10 @@ from slicer.util import VTKObservationMixin
 from slicer.parameterNodeWrapper import *
 from slicer import vtkMRMLSequenceNode
 from slicer import vtkMRMLSequenceBrowserNode
+from slicer import vtkMRMLLinearTransformNode
 from utils.Helper import SpinBox, Slider
 from utils.TrackLogic import TrackLogic
+from utils import TransformMath
 from typing import List
 
 #
@@ -83,6 +86,7 @@ class CustomParameterNode:
   node3DSegmentationLabelMap: int  # subject hierarchy id
   transformsFilePath: str
   sequenceNodeTransforms: vtkMRMLSequenceNode
+  frameTransformNode: vtkMRMLLinearTransformNode
   sequenceBrowserNode: vtkMRMLSequenceBrowserNode
   totalImages: int
   fps: float
@@ -90,6 +94,14 @@ class CustomParameterNode:
   overlayAsOutline: bool
   overlayColor: list[float] = [0.0, 1.0, 0.0] # [r, g, b] values from 0 to 1
   overlayThickness: int = 4
+  lazyLoading: bool = False
+  compactStorage: bool = False
+  frameStride: int = 1
+  firstFrame: int = 1
+  lastFrame: int = 0 # 0 loads up to the last frame
+  transformTable: bool = False
+  precomputeOverlays: bool = False
+  transformLayout: str = "translation" # see TransformMath.TRANSFORM_LAYOUTS
 
 #
 # TrackWidget
@@ -207,6 +219,76 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
     self.inputsFormLayout.addRow("Cine Image Files: ", self.selectorImageFilesLayout)
 
+    # Load on demand checkbox
+    self.lazyLoadingBox = qt.QCheckBox()
+    self.lazyLoadingBox.checked = False
+    self.lazyLoadingBox.setToolTip("Only read the image headers when loading. Each image is decoded "
+                                   "when it is displayed, keeping a limited number of images in memory.")
+    # Save cine pack button
+    self.saveCinePackButton = qt.QPushButton("Save Cine Pack...")
+    self.saveCinePackButton.setSizePolicy(qt.QSizePolicy.Maximum, qt.QSizePolicy.Fixed)
+    self.saveCinePackButton.enabled = False
+    self.saveCinePackButton.setToolTip("Save the loaded cine images into a single .cinepack file, "
+                                       "which can be selected instead of the images to reload them quickly.")
+    self.lazyLoadingLayout = qt.QHBoxLayout()
+    self.lazyLoadingLayout.addWidget(self.lazyLoadingBox)
+    self.lazyLoadingLayout.addWidget(self.saveCinePackButton)
+    self.inputsFormLayout.addRow("Load On Demand: ", self.lazyLoadingLayout)
+
+    # Compact storage checkbox
+    self.compactStorageBox = qt.QCheckBox()
+    self.compactStorageBox.checked = False
+    self.compactStorageBox.setToolTip("Store the loaded images with the smallest pixel type that holds "
+                                      "their values exactly, to reduce memory use.")
+    self.inputsFormLayout.addRow("Compact Storage: ", self.compactStorageBox)
+
+    # Frame selection: every Nth frame, within a range of frames
+    self.frameStrideBox = qt.QSpinBox()
+    self.frameStrideBox.minimum = 1
+    self.frameStrideBox.maximum = 10000
+    self.frameStrideBox.value = 1
+    self.frameStrideBox.setToolTip("Only load every Nth image.")
+    self.firstFrameBox = qt.QSpinBox()
+    self.firstFrameBox.minimum = 1
+    self.firstFrameBox.maximum = 1000000
+    self.firstFrameBox.value = 1
+    self.firstFrameBox.setToolTip("First image to load, in playback order.")
+    self.lastFrameBox = qt.QSpinBox()
+    self.lastFrameBox.minimum = 0
+    self.lastFrameBox.maximum = 1000000
+    self.lastFrameBox.value = 0
+    self.lastFrameBox.setSpecialValueText("Last")
+    self.lastFrameBox.setToolTip("Last image to load, in playback order.")
+    self.frameSelectionLayout = qt.QHBoxLayout()
+    self.frameSelectionLayout.addWidget(qt.QLabel("Every"))
+    self.frameSelectionLayout.addWidget(self.frameStrideBox)
+    self.frameSelectionLayout.addWidget(qt.QLabel("image(s), from"))
+    self.frameSelectionLayout.addWidget(self.firstFrameBox)
+    self.frameSelectionLayout.addWidget(qt.QLabel("to"))
+    self.frameSelectionLayout.addWidget(self.lastFrameBox)
+    self.frameSelectionLayout.addStretch()
+    self.inputsFormLayout.addRow("Load Images: ", self.frameSelectionLayout)
+
+    # Live folder watch button and ring buffer size
+    self.watchFolderButton = qt.QPushButton("Watch Folder...")
+    self.watchFolderButton.setCheckable(True)
+    self.watchFolderButton.setSizePolicy(qt.QSizePolicy.Maximum, qt.QSizePolicy.Fixed)
+    self.watchFolderButton.setToolTip("Append the cine images written into a folder to the sequence "
+                                      "as they are acquired. Click again to stop watching.")
+    self.maxLiveFramesBox = qt.QSpinBox()
+    self.maxLiveFramesBox.minimum = 0
+    self.maxLiveFramesBox.maximum = 100000
+    self.maxLiveFramesBox.value = 0
+    self.maxLiveFramesBox.setSpecialValueText("All")
+    self.maxLiveFramesBox.setSizePolicy(qt.QSizePolicy.Maximum, qt.QSizePolicy.Fixed)
+    self.maxLiveFramesBox.setToolTip("Only keep the most recent images while watching a folder, "
+                                     "so memory stays fixed during long sessions.")
+    self.watchFolderLayout = qt.QHBoxLayout()
+    self.watchFolderLayout.addWidget(self.watchFolderButton)
+    self.watchFolderLayout.addWidget(qt.QLabel("Keep Last:"))
+    self.watchFolderLayout.addWidget(self.maxLiveFramesBox)
+    self.inputsFormLayout.addRow("Live Folder: ", self.watchFolderLayout)
+
     # Set tooltips for the widgets
     tooltipText = "Select Cine images in .mha format."
     self.selector2DImagesFiles.setToolTip(tooltipText)
@@ -255,7 +337,8 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.selectorTransformsLayout.addWidget(self.deleteTransformsButton)
     self.inputsFormLayout.addRow("Transforms File: ", self.selectorTransformsLayout)
 
-    tooltipText = "Insert a Transforms file. Valid filetypes: .csv, .xls, .xlsx"
+    tooltipText = "Insert a Transforms file. Valid filetypes: .csv, .txt, .xls, .xlsx, .parquet, .feather, " \
+                  ".arrow, .h5, .hdf5"
     self.selectorTransformsFile.setToolTip(tooltipText)
     browseButton = self.selectorTransformsFile.findChildren(qt.QToolButton)[0]
     browseButton.setToolTip(tooltipText)
@@ -296,13 +379,73 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.columnSelectorsLayout.addWidget(self.columnZSelector)
     
     self.inputsFormLayout.addRow('Translations: ',self.columnSelectorsLayout)
+
+    ## Transform layout, and rotation columns
+    self.transformLayoutNames = {
+      "translation": "Translation",
+      "euler": "Euler Angles",
+      "quaternion": "Quaternion",
+      "matrix": "4x4 Matrix",
+    }
+    self.transformLayoutSelector = qt.QComboBox()
+    self.transformLayoutSelector.addItems(list(self.transformLayoutNames.values()))
+    self.transformLayoutSelector.setSizePolicy(qt.QSizePolicy.Minimum, qt.QSizePolicy.Fixed)
+    self.transformLayoutSelector.setToolTip("Columns describing the transform of each image: a translation, a "
+                                            "translation and Euler angles in degrees (applied around X, then Y, "
+                                            "then Z), a translation and a (W, X, Y, Z) quaternion, or the 16 "
+                                            "columns of a 4x4 matrix, row by row, starting at the X column.")
+    self.inputsFormLayout.addRow('Transform Layout: ', self.transformLayoutSelector)
+
+    self.columnRotationSelectors = []
+    self.columnRotationSelectorLabels = []
+    self.columnRotationSelectorsLayout = qt.QHBoxLayout()
+    for _ in range(4):
+      label = qt.QLabel()
+      label.setSizePolicy(qt.QSizePolicy.Maximum, qt.QSizePolicy.Fixed)
+      selector = qt.QComboBox()
+      selector.enabled = False
+      selector.setSizePolicy(qt.QSizePolicy.Minimum, qt.QSizePolicy.Fixed)
+      self.columnRotationSelectorsLayout.addWidget(label)
+      self.columnRotationSelectorsLayout.addWidget(selector)
+      self.columnRotationSelectorLabels.append(label)
+      self.columnRotationSelectors.append(selector)
+    self.columnRotationSelectorsWidget = qt.QWidget()
+    self.columnRotationSelectorsLayout.setContentsMargins(0, 0, 0, 0)
+    self.columnRotationSelectorsWidget.setLayout(self.columnRotationSelectorsLayout)
+    self.inputsFormLayout.addRow('Rotation: ', self.columnRotationSelectorsWidget)
+    self.updateRotationSelectors()
+
+    ## Timestamp column
+    self.columnTimeSelector = qt.QComboBox()
+    self.columnTimeSelector.enabled = False
+    self.columnTimeSelector.setSizePolicy(qt.QSizePolicy.Minimum, qt.QSizePolicy.Fixed)
+    self.columnTimeSelectorToolTip = "Column holding the time of every transform, in seconds. Every image " \
+                                     "then gets the transform interpolated at its acquisition time, and the " \
+                                     "file may hold any number of rows."
+    self.columnTimeSelector.setToolTip(self.columnTimeSelectorToolTip)
+    self.inputsFormLayout.addRow('Timestamps: ', self.columnTimeSelector)
     
     # Layout for apply transformation button
     self.applyTransformButton = qt.QPushButton("Apply Transformations")
     self.applyTransformButton.setSizePolicy(qt.QSizePolicy.Maximum, qt.QSizePolicy.Fixed)
     
+    # Transform table checkbox
+    self.transformTableBox = qt.QCheckBox("Single Transform Node")
+    self.transformTableBox.checked = False
+    self.transformTableBox.setToolTip("Keep the transforms of all the images in a single table applied to one "
+                                      "transform node, instead of creating a transform node per image.")
+
+    # Precompute overlays checkbox
+    self.precomputeOverlaysBox = qt.QCheckBox("Precompute Overlays")
+    self.precomputeOverlaysBox.checked = False
+    self.precomputeOverlaysBox.setToolTip("Compute the overlay of the 3D segmentation on every 2D image when the "
+                                          "transformations are applied, so playback does not reslice the "
+                                          "segmentation. The memory used is printed in the Python console.")
+
     self.columnTransformsLayout = qt.QHBoxLayout()
     self.columnTransformsLayout.addWidget(self.applyTransformButton)
+    self.columnTransformsLayout.addWidget(self.transformTableBox)
+    self.columnTransformsLayout.addWidget(self.precomputeOverlaysBox)
     self.inputsFormLayout.addRow(' ',self.columnTransformsLayout)
     
     # Playback speed label and spinbox
@@ -399,10 +542,11 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.controlLayout.addWidget(self.nextFrameButton)
     self.nextFrameButton.setToolTip("To enable this feature, load valid files in the inputs area above.")
 
-    # Play button
+    # Play button, showing the pause icon during playback (see updatePlaybackButtons)
+    self.playIcon = qt.QIcon(os.path.join(mediaIconsPath, 'play.png'))
+    self.pauseIcon = qt.QIcon(os.path.join(mediaIconsPath, 'pause.png'))
     self.playSequenceButton = qt.QPushButton()
-    icon = qt.QIcon(os.path.join(mediaIconsPath, 'play.png'))
-    self.playSequenceButton.setIcon(icon)
+    self.playSequenceButton.setIcon(self.playIcon)
     self.playSequenceButton.setIconSize(iconSize)
     self.playSequenceButton.setSizePolicy(qt.QSizePolicy.Fixed, qt.QSizePolicy.Fixed)
     self.playSequenceButton.setFixedSize(buttonSize)
@@ -524,6 +668,16 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     # Create logic class. Logic implements all computations that should be possible to run
     # in batch mode, without a graphical user interface.
     self.logic = TrackLogic()
+
+    # Modifications of the sequence browser during playback are coalesced, so the GUI is refreshed
+    # at most at this rate (see onPlaybackTick)
+    self.guiRefreshIntervalMs = 1000.0 / float(qt.QSettings().value("Track/GUIRefreshRate", 60))
+    self.guiRefreshTimer = qt.QTimer()
+    self.guiRefreshTimer.setSingleShot(True)
+    self.guiRefreshTimer.connect("timeout()", self.onPlaybackTick)
+    self._lastGUIRefresh = 0.0
+    # Playback state shown by the playback buttons
+    self._shownPlaybackActive = None
   
 
     # These connections ensure that we update parameter node when scene is closed
@@ -558,6 +712,15 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.deleteImagesButton.clicked.connect(self.onDeleteImagesButton)
     self.overlayColorButton.connect('clicked(bool)', self.onOverlayColorPicker)
     self.overlayThicknessSlider.connect("valueChanged(double)", self.onOverlayThicknessChange)
+    self.lazyLoadingBox.connect("toggled(bool)", self.onLazyLoadingChange)
+    self.compactStorageBox.connect("toggled(bool)", self.onCompactStorageChange)
+    self.frameStrideBox.connect("valueChanged(int)", self.onFrameSelectionChange)
+    self.transformTableBox.connect("toggled(bool)", self.onTransformTableChange)
+    self.precomputeOverlaysBox.connect("toggled(bool)", self.onPrecomputeOverlaysChange)
+    self.firstFrameBox.connect("valueChanged(int)", self.onFrameSelectionChange)
+    self.lastFrameBox.connect("valueChanged(int)", self.onFrameSelectionChange)
+    self.saveCinePackButton.connect("clicked(bool)", self.onSaveCinePackButton)
+    self.watchFolderButton.connect("toggled(bool)", self.onWatchFolderButton)
 
     # These connections ensure that whenever user changes some settings on the GUI, that is saved
     # in the MRML scene (in the selected parameter node).
@@ -573,6 +736,10 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.columnXSelector.connect("currentTextChanged(QString)", self.onColumnXSelectorChange)
     self.columnYSelector.connect("currentTextChanged(QString)", self.onColumnXSelectorChange)
     self.columnZSelector.connect("currentTextChanged(QString)", self.onColumnXSelectorChange)
+    self.columnTimeSelector.connect("currentTextChanged(QString)", self.onColumnXSelectorChange)
+    for selector in self.columnRotationSelectors:
+      selector.connect("currentTextChanged(QString)", self.onColumnXSelectorChange)
+    self.transformLayoutSelector.connect("currentIndexChanged(int)", self.onTransformLayoutChange)
     
     self.applyTransformButton.connect("clicked(bool)", \
       lambda: self.updateParameterNodeFromGUI("applyTransformsButton", "clicked"))
@@ -610,6 +777,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     """
     Called when the application closes and the module widget is destroyed.
     """
+    self.guiRefreshTimer.stop()
     self.removeObservers()
 
   def enter(self):
@@ -690,19 +858,36 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
   def updateGUIFromParameterNode(self, caller=None, event=None):
     """
     This method is called whenever parameter node is changed.
-    The module GUI is updated to show the current state of the parameter node.
+    The module GUI is updated to show the current state of the parameter node. Only the widgets
+    whose value differs from the parameter node are modified. Modifications of the sequence browser
+    are coalesced, and a frame advance during playback only updates the frame shown (see
+    onPlaybackTick).
     """
     
     if self.customParamNode is None or self._updatingGUIFromParameterNode:
       return
+
+    if isinstance(caller, vtkMRMLSequenceBrowserNode):
+      if not self.guiRefreshTimer.isActive():
+        elapsedMs = (time.monotonic() - self._lastGUIRefresh) * 1000.0
+        self.guiRefreshTimer.start(max(0, int(self.guiRefreshIntervalMs - elapsedMs)))
+      return
+    self._lastGUIRefresh = time.monotonic()
     
     # Make sure GUI changes do not call updateParameterNodeFromGUI (it could cause infinite loop)
     self._updatingGUIFromParameterNode = True
 
-    self.selector3DSegmentation.currentPath = self.customParamNode.path3DSegmentation
-    self.selectorTransformsFile.currentPath = self.customParamNode.transformsFilePath
-    self.selector2DImagesFiles.clear()
-    self.selector2DImagesFiles.addPaths(self.customParamNode.files2DImages)
+    if self.selector3DSegmentation.currentPath != self.customParamNode.path3DSegmentation:
+      self.selector3DSegmentation.currentPath = self.customParamNode.path3DSegmentation
+    if self.selectorTransformsFile.currentPath != self.customParamNode.transformsFilePath:
+      self.selectorTransformsFile.currentPath = self.customParamNode.transformsFilePath
+    # Listing thousands of images is slow, the list is only rebuilt when the images change
+    files2DImages = list(self.customParamNode.files2DImages)
+    if list(self.selector2DImagesFiles.paths) != files2DImages:
+      self.selector2DImagesFiles.clear()
+      self.selector2DImagesFiles.addPaths(files2DImages)
+
+    self.saveCinePackButton.enabled = bool(self.customParamNode.sequenceNode2DImages)
 
     if self.customParamNode.sequenceNode2DImages:
       self.selectorTransformsFile.enabled = True
@@ -713,46 +898,106 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
     # True if the 2D images, transforms and 3D segmentation have been provided
     inputsProvided = self.customParamNode.sequenceNode2DImages and \
-                     self.customParamNode.sequenceNodeTransforms and \
+                     (self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode) and \
                      self.customParamNode.node3DSegmentation
 
     self.updatePlaybackButtons(inputsProvided)
 
-    self.sequenceSlider.setMaximum(self.customParamNode.totalImages)
+    if self.sequenceSlider.maximum != self.customParamNode.totalImages:
+      self.sequenceSlider.setMaximum(self.customParamNode.totalImages)
 
-    if self.customParamNode.sequenceBrowserNode and self.customParamNode.sequenceBrowserNode.GetPlaybackActive():
-      imageDict = self.getSliceDict()
-      imageNum = self.customParamNode.sequenceBrowserNode.GetSelectedItemNumber() + 1
-      self.sequenceSlider.setValue(imageNum)
-      self.currentFrameInputBox.setValue(imageNum)
-      
-      self.logic.visualize(self.customParamNode.sequenceBrowserNode,
-                           self.customParamNode.sequenceNode2DImages,
-                           self.customParamNode.node3DSegmentationLabelMap,
-                           self.customParamNode.sequenceNodeTransforms,
-                           self.customParamNode.opacity,
-                           self.customParamNode.overlayAsOutline,
-                           self.customParamNode.overlayThickness,
-                           customParamNode=self.customParamNode)
-      self.editSliceView(imageDict)
+    self._shownPlaybackActive = bool(self.customParamNode.sequenceBrowserNode and
+                                     self.customParamNode.sequenceBrowserNode.GetPlaybackActive())
+    if self._shownPlaybackActive:
+      self.updateFrameGUI()
                            
     elif not self.customParamNode.sequenceBrowserNode:
       self.sequenceSlider.setValue(1)
       self.currentFrameInputBox.setValue(1)
 
-    self.playbackSpeedBox.value = self.customParamNode.fps
+    if self.playbackSpeedBox.value != self.customParamNode.fps:
+      self.playbackSpeedBox.value = self.customParamNode.fps
 
-    self.opacitySlider.value = self.customParamNode.opacity
+    if self.opacitySlider.value != self.customParamNode.opacity:
+      self.opacitySlider.value = self.customParamNode.opacity
 
     self.opacityPercentageLabel.text = str(int(self.customParamNode.opacity * 100)) + "%"
 
-    self.overlayOutlineOnlyBox.checked = self.customParamNode.overlayAsOutline
+    if self.overlayOutlineOnlyBox.checked != self.customParamNode.overlayAsOutline:
+      self.overlayOutlineOnlyBox.checked = self.customParamNode.overlayAsOutline
+
+    if self.lazyLoadingBox.checked != self.customParamNode.lazyLoading:
+      self.lazyLoadingBox.checked = self.customParamNode.lazyLoading
+
+    if self.compactStorageBox.checked != self.customParamNode.compactStorage:
+      self.compactStorageBox.checked = self.customParamNode.compactStorage
+
+    if self.transformTableBox.checked != self.customParamNode.transformTable:
+      self.transformTableBox.checked = self.customParamNode.transformTable
+
+    if self.precomputeOverlaysBox.checked != self.customParamNode.precomputeOverlays:
+      self.precomputeOverlaysBox.checked = self.customParamNode.precomputeOverlays
+
+    transformLayoutIndex = list(self.transformLayoutNames).index(self.customParamNode.transformLayout)
+    if self.transformLayoutSelector.currentIndex != transformLayoutIndex:
+      self.transformLayoutSelector.setCurrentIndex(transformLayoutIndex)
+
+    if self.frameStrideBox.value != self.customParamNode.frameStride:
+      self.frameStrideBox.value = self.customParamNode.frameStride
+    if self.firstFrameBox.value != self.customParamNode.firstFrame:
+      self.firstFrameBox.value = self.customParamNode.firstFrame
+    if self.lastFrameBox.value != self.customParamNode.lastFrame:
+      self.lastFrameBox.value = self.customParamNode.lastFrame
 
     # All the GUI updates are done
     self._updatingGUIFromParameterNode = False
     
     # Disable the "Apply Transformation" button to assure the user the Transformation is applied
     self.applyTransformButton.enabled = False
+
+  def onPlaybackTick(self):
+    """
+    Refreshes the GUI once the sequence browser was modified, at most once per
+    guiRefreshIntervalMs. When the sequence browser only advanced to another frame during
+    playback, only the slider, the frame counter and the frame visualization are updated.
+    Otherwise, the whole GUI is updated (see updateGUIFromParameterNode).
+    """
+    if self.customParamNode is None or self._updatingGUIFromParameterNode:
+      return
+    sequenceBrowserNode = self.customParamNode.sequenceBrowserNode
+    if not sequenceBrowserNode:
+      return
+    if sequenceBrowserNode.GetPlaybackActive() and self._shownPlaybackActive:
+      self._lastGUIRefresh = time.monotonic()
+      self._updatingGUIFromParameterNode = True
+      try:
+        self.updateFrameGUI()
+      finally:
+        # A frame failing to display must not stop the GUI from following the parameter node
+        self._updatingGUIFromParameterNode = False
+    else:
+      self.updateGUIFromParameterNode()
+
+  def updateFrameGUI(self):
+    """
+    Shows the frame selected by the sequence browser during playback in the slider, the frame
+    counter and the slice views.
+    """
+    imageDict = self.getSliceDict()
+    imageNum = self.customParamNode.sequenceBrowserNode.GetSelectedItemNumber() + 1
+    self.sequenceSlider.setValue(imageNum)
+    self.currentFrameInputBox.setValue(imageNum)
+    
+    self.logic.visualize(self.customParamNode.sequenceBrowserNode,
+                         self.customParamNode.sequenceNode2DImages,
+                         self.customParamNode.node3DSegmentationLabelMap,
+                         self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode,
+                         self.customParamNode.opacity,
+                         self.customParamNode.overlayAsOutline,
+                         self.customParamNode.overlayThickness,
+                         customParamNode=self.customParamNode)
+    self.editSliceView(imageDict)
+
   def updateParameterNodeFromGUI(self, caller=None, event=None):
     """
     This method is called when the user makes any change in the GUI.
@@ -776,6 +1021,9 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       if self.customParamNode.transformsFilePath:
         self.customParamNode.transformsFilePath = ""
         self.customParamNode.sequenceNodeTransforms = None
+        self.customParamNode.frameTransformNode = None
+        self.logic.clearTransformTable()
+        self.logic.clearOverlayMasks()
 
       if len(self.selector2DImagesFiles.paths) == 0:
         # Remove the Images folder stored in customParamNode
@@ -835,14 +1083,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             slicer.mrmlScene.RemoveNode(nodeToRemove)
             
           # Remove the image nodes of each slice view used to preserve the slice views
-          nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLScalarVolumeNode")
-          nodes.UnRegister(None)
-          for node in nodes:
-            if node.GetName() == 'Image Nodes Sequence':
-              break
-            if node.GetName() == node.GetAttribute('Sequences.BaseName'):
-              slicer.mrmlScene.RemoveNode(node.GetDisplayNode())
-              slicer.mrmlScene.RemoveNode(node)
+          self.logic.removeRetainedBackgrounds()
 
           # Remove the Volume Rendering Node, if it exists
           nodes = slicer.mrmlScene.GetNodesByClassByName("vtkMRMLLinearTransformNode", "Transform Nodes Sequence")
@@ -867,12 +1108,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             slicer.mrmlScene.RemoveNode(sequenceBrowserNodeToDelete)
           
           # Remove the image nodes of each slice view used to preserve the slice views
-          nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLScalarVolumeNode")
-          nodes.UnRegister(None)
-          for node in nodes:
-            if node.GetName() == node.GetAttribute('Sequences.BaseName'):
-              slicer.mrmlScene.RemoveNode(node.GetDisplayNode())
-              slicer.mrmlScene.RemoveNode(node)
+          self.logic.removeRetainedBackgrounds()
 
           # Remove the unused Image Nodes Sequence node, containing the whole image sequence if it exists
           nodes = slicer.mrmlScene.GetNodesByClassByName("vtkMRMLSequenceNode", "Image Nodes Sequence")
@@ -904,8 +1140,15 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             slicer.mrmlScene.RemoveNode(nodeToRemove)
 
         # Load the images into 3D Slicer
+        # Decode the images on all available cores
         imagesSequenceNode, cancelled = \
-          self.logic.loadImagesIntoSequenceNode(shNode, self.selector2DImagesFiles.paths)
+          self.logic.loadImagesIntoSequenceNode(shNode, self.selector2DImagesFiles.paths,
+                                                numWorkers=os.cpu_count(),
+                                                lazy=self.customParamNode.lazyLoading,
+                                                compact=self.customParamNode.compactStorage,
+                                                stride=self.customParamNode.frameStride,
+                                                startIndex=self.customParamNode.firstFrame - 1,
+                                                endIndex=self.customParamNode.lastFrame or None)
 
         if cancelled:
           # Unset the param which holds the list of paths to the 2D images
@@ -1054,12 +1297,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         structSelectorDialog.hide()      
       
       # Remove the image nodes of each slice view used to preserve the slice views
-      nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLScalarVolumeNode")
-      nodes.UnRegister(None)
-      for node in nodes:
-        if node.GetName() == node.GetAttribute('Sequences.BaseName'):
-          slicer.mrmlScene.RemoveNode(node.GetDisplayNode())
-          slicer.mrmlScene.RemoveNode(node)
+      self.logic.removeRetainedBackgrounds()
           
       # Remove the label map node and the nodes it referenced, all created by the previous node
       nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLLabelMapVolumeNode")
@@ -1098,31 +1336,17 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.customParamNode.path3DSegmentation = self.selector3DSegmentation.currentPath
 
         # Segmentation file should end with specified formats above
-        segmentationNode = slicer.util.loadVolume(self.selector3DSegmentation.currentPath,
-                                                  {"singleFile": True, "show": False})
-        
-        # Check if Segmentation file is a binary mask
-        if np.unique(slicer.util.arrayFromVolume(segmentationNode)).size == 2:
-          self.logic.clearSliceForegrounds()
-          segmentationNode.SetName("3D Segmentation")
+        segmentationNode, segmentationLabelMap = \
+          self.logic.loadSegmentation(self.selector3DSegmentation.currentPath)
+
+        if segmentationNode:
           # Set a param to hold the 3D segmentation node ID
           nodeID = shNode.GetItemByDataNode(segmentationNode)
           self.customParamNode.node3DSegmentation = nodeID
-
-          # Create a label map of the 3D segmentation that will be used to define the mask overlayed
-          # on the 2D images during playback
-          volumesModuleLogic = slicer.modules.volumes.logic()
-          segmentationLabelMap = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode',
-                                                                    "3D Segmentation Label Map")
-          volumesModuleLogic.CreateLabelVolumeFromVolume(slicer.mrmlScene, segmentationLabelMap,
-                                                        segmentationNode)
           # Set a param to hold the 3D segmentation label map ID
           labelMapID = shNode.GetItemByDataNode(segmentationLabelMap)
           self.customParamNode.node3DSegmentationLabelMap = labelMapID
         else:
-          # If the segmentation file is not binary, remove the nodes created
-          slicer.util.warningDisplay("The segmentation file is not binary. The file was not loaded into 3D Slicer.", "Input Error")
-          slicer.mrmlScene.RemoveNode(segmentationNode)
           self.customParamNode.node3DSegmentation = 0
           self.customParamNode.node3DSegmentationLabelMap = 0
           self.selector3DSegmentation.currentPath = ''
@@ -1145,29 +1369,48 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       # If even one line cannot be read correctly/is missing our playback cannot be successful. We
       # will validate the tranformations input first. If the input is valid, we get a list
       # containing all of the transformations read from the file.
-      headers = []
-      headers.append(self.columnXSelector.currentText)
-      headers.append(self.columnYSelector.currentText)
-      headers.append(self.columnZSelector.currentText)
+      layout, headers = self.getTransformsColumns()
+      # The first item of the timestamp selector means there is a row per image
+      timeHeader = self.columnTimeSelector.currentText if self.columnTimeSelector.currentIndex > 0 else None
       transformsList = \
-        self.logic.validateTransformsInput(self.selectorTransformsFile.currentPath, numImages,headers)
+        self.logic.validateTransformsInput(self.selectorTransformsFile.currentPath, numImages, headers,
+                                           frameSelection=self.logic.getFrameSelection(
+                                             self.customParamNode.sequenceNode2DImages),
+                                           timeHeader=timeHeader,
+                                           frameTimes=self.logic.getFrameTimes(
+                                             self.customParamNode.sequenceNode2DImages),
+                                           layout=layout)
+
+      # Transforms previously held in a transform table are replaced, along with the overlays
+      # computed from them
+      self.customParamNode.frameTransformNode = None
+      self.logic.clearTransformTable()
+      self.logic.clearOverlayMasks()
 
       if transformsList:
-        # Create transform nodes from the transform data and place them into a sequence node
-        transformsSequenceNode = \
-           self.logic.createTransformNodesFromTransformData(shNode, transformsList, numImages)
+        if self.customParamNode.transformTable:
+          # Keep the transforms in a single table applied to one transform node
+          frameTransformNode = self.logic.createTransformTableFromTransformData(transformsList, numImages)
+          transformsSequenceNode = None
+        else:
+          # Create transform nodes from the transform data and place them into a sequence node
+          frameTransformNode = None
+          transformsSequenceNode = \
+             self.logic.createTransformNodesFromTransformData(shNode, transformsList, numImages)
 
-        if not transformsSequenceNode:
+        if not transformsSequenceNode and not frameTransformNode:
           # If cancelled unset param to hold path to the transformations .csv file
           self.customParamNode.transformsFilePath = ""
         else:
           # Set a param to hold the sequence node which holds the transform nodes
           self.customParamNode.sequenceNodeTransforms = transformsSequenceNode
+          self.customParamNode.frameTransformNode = frameTransformNode
           # Create a sequence browser node
           sequenceBrowserNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceBrowserNode", \
                                                                    "Sequence Browser")
           sequenceBrowserNode.AddSynchronizedSequenceNode(self.customParamNode.sequenceNode2DImages)
-          sequenceBrowserNode.AddSynchronizedSequenceNode(self.customParamNode.sequenceNodeTransforms)
+          if transformsSequenceNode:
+            sequenceBrowserNode.AddSynchronizedSequenceNode(self.customParamNode.sequenceNodeTransforms)
           # We need to observe the changes to the sequence browser so that our GUI will update as
           # the sequence progresses
           self.addObserver(sequenceBrowserNode, vtk.vtkCommand.ModifiedEvent, \
@@ -1211,16 +1454,16 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
               slicer.mrmlScene.RemoveNode(nodeToRemove)
               
             # Remove the image nodes of each slice view used to preserve the slice views
-            nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLScalarVolumeNode")
-            nodes.UnRegister(None)
-            for node in nodes:
-              if node.GetName() == 'Image Nodes Sequence':
-                 break
-              if node.GetName() == node.GetAttribute('Sequences.BaseName'):
-                slicer.mrmlScene.RemoveNode(node.GetDisplayNode())
-                slicer.mrmlScene.RemoveNode(node)
+            self.logic.removeRetainedBackgrounds()
           self.overlayThicknessSlider.enabled = True
 
+          # Compute the overlay of every 2D image ahead of playback
+          if self.customParamNode.precomputeOverlays and self.customParamNode.node3DSegmentationLabelMap:
+            self.logic.precomputeOverlayMasks(self.customParamNode.sequenceNode2DImages,
+                                              self.customParamNode.node3DSegmentationLabelMap,
+                                              transformsSequenceNode or frameTransformNode,
+                                              numWorkers=os.cpu_count())
+
           # Load first image of the sequence when all required inputs are satisfied
           self.resetVisuals()
           
@@ -1258,6 +1501,11 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.columnYSelector.enabled = False
       self.columnZSelector.clear()
       self.columnZSelector.enabled = False
+      self.columnTimeSelector.clear()
+      self.columnTimeSelector.enabled = False
+      for selector in self.columnRotationSelectors:
+        selector.clear()
+        selector.enabled = False
     def addItemToColumnSeletors(self,headers):
       self.columnXSelector.enabled = True
       self.columnYSelector.enabled = True
@@ -1270,6 +1518,16 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.columnXSelector.setCurrentIndex(0)
       self.columnYSelector.setCurrentIndex(1)
       self.columnZSelector.setCurrentIndex(2)
+
+      self.columnTimeSelector.enabled = True
+      self.columnTimeSelector.addItem("None (One Row Per Image)")
+      self.columnTimeSelector.addItems(headers)
+
+      # The rotation columns usually follow the translation columns
+      for index, selector in enumerate(self.columnRotationSelectors):
+        selector.enabled = True
+        selector.addItems(headers)
+        selector.setCurrentIndex(min(3 + index, len(headers) - 1))
       
       self.transformationAppliedLabel.setVisible(False)
       self.applyTransformButton.enabled = True
@@ -1314,8 +1572,8 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     """
     layoutManager = slicer.app.layoutManager()
     self.customParamNode.sequenceBrowserNode.SetPlaybackItemSkippingEnabled(False) # Fixes image skipping bug on slower machines
-    proxy2DImageNode = self.customParamNode.sequenceBrowserNode.GetProxyNode(self.customParamNode.sequenceNode2DImages)
-    sliceWidget = TrackLogic().getSliceWidget(layoutManager, proxy2DImageNode)
+    sliceWidget = self.logic.getFrameSliceWidget(layoutManager, self.customParamNode.sequenceBrowserNode,
+                                                 self.customParamNode.sequenceNode2DImages)
     sliceView = sliceWidget.sliceView()
     
     ## Pause sequence
@@ -1336,7 +1594,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       for color in self.logic.backgrounds:
         background = getattr(self.logic, f"{color.lower()}Background")
         if background is not None:
-          imageFileNameText = slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").GetNodeReference('backgroundVolume').GetAttribute('Sequences.BaseName')
+          imageFileNameText = self.logic.backgroundFrameNames.get(color, "")
           sliceView = slicer.app.layoutManager().sliceWidget(color).sliceView()
           sliceView.cornerAnnotation().SetText(0, imageFileNameText)
           # Add an observer to the Text displaying the image file name to preserve the text when the sequence is paused
@@ -1419,7 +1677,8 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     fileDialog.setFileMode(qt.QFileDialog.ExistingFiles)  # Allow selection of multiple files
 
     # Create a filter for only supported file formats
-    supportedFormats = ["*.mha", "*.dcm", "*.nrrd", "*.nii", "*.hdr", "*.img", "*.nhdr", "*.mhd", "*.raw", "*.nii.gz"]
+    supportedFormats = ["*.mha", "*.dcm", "*.nrrd", "*.nii", "*.hdr", "*.img", "*.nhdr", "*.mhd", "*.raw", "*.nii.gz",
+                        "*.cinepack"]
     filterString = "Supported Files ({})".format(" ".join(supportedFormats))
     fileDialog.setNameFilter(filterString)
 
@@ -1429,8 +1688,38 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.selector2DImagesFiles.addPaths(selectedFiles)
       self.updateParameterNodeFromGUI("selector2DImagesFiles", "pathsChanged")
 
+  def onSaveCinePackButton(self):
+    # Saves the loaded cine images into a single cine pack file
+    packPath = qt.QFileDialog.getSaveFileName(None, "Save Cine Pack", "", "Cine Pack (*.cinepack)")
+    if not packPath:
+      return
+    if not packPath.endswith(".cinepack"):
+      packPath += ".cinepack"
+    self.logic.saveCinePack(self.customParamNode.sequenceNode2DImages, packPath)
+
+  def onWatchFolderButton(self, checked):
+    # Starts or stops appending the cine images written into a folder to the sequence
+    if not checked:
+      self.logic.stopFolderWatch()
+      return
+    directory = qt.QFileDialog.getExistingDirectory(None, "Select the folder the cine images are written into")
+    if not directory:
+      self.watchFolderButton.setChecked(False)
+      return
+    imagesSequenceNode = self.logic.startFolderWatch(directory, self.customParamNode.sequenceNode2DImages,
+                                                     self.maxLiveFramesBox.value, self.onLiveFramesAdded)
+    self.customParamNode.sequenceNode2DImages = imagesSequenceNode
+
+  def onLiveFramesAdded(self, numAdded):
+    # Extends the playback range to the frames appended while watching a folder
+    totalImages = self.customParamNode.sequenceNode2DImages.GetNumberOfDataNodes()
+    self.currentFrameInputBox.setMaximum(totalImages)
+    self.totalFrameLabel.setText(f"of {totalImages}")
+    self.customParamNode.totalImages = totalImages
+
   def onDeleteImagesButton(self):
     # Removes the cine images from the multi file selector
+    self.watchFolderButton.setChecked(False)
     self.selector2DImagesFiles.clear()
     self.customParamNode.files2DImages = []
     self.updateParameterNodeFromGUI("selector2DImagesFiles", "pathsChanged")
@@ -1485,7 +1774,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           self.logic.visualize(self.customParamNode.sequenceBrowserNode,
                                self.customParamNode.sequenceNode2DImages,
                                self.customParamNode.node3DSegmentationLabelMap,
-                               self.customParamNode.sequenceNodeTransforms,
+                               self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode,
                                self.customParamNode.opacity,
                                self.customParamNode.overlayAsOutline,
                                self.customParamNode.overlayThickness,
@@ -1494,7 +1783,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           self.customParamNode.sequenceBrowserNode.SetSelectedItemNumber(currentItemNumber)
 
         # Final render to ensure all changes are visible
-        slicer.util.forceRenderAllViews()
+        self.logic.renderScheduler.requestRender()
 
   def onViewMoreClicked(self):
     # Opens up a dialog displaying selected files when the user clicks "View More"
@@ -1551,6 +1840,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     dialog.exec()
       
   def onResetButton(self):
+    self.watchFolderButton.setChecked(False)
     if self.customParamNode.sequenceBrowserNode:
       self.customParamNode.sequenceBrowserNode.SetPlaybackActive(False)
       self.customParamNode.sequenceBrowserNode.SetSelectedItemNumber(0)
@@ -1567,6 +1857,11 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.columnYSelector.enabled = False
     self.columnZSelector.clear()
     self.columnZSelector.enabled = False
+    self.columnTimeSelector.clear()
+    self.columnTimeSelector.enabled = False
+    for selector in self.columnRotationSelectors:
+      selector.clear()
+      selector.enabled = False
     self.playbackSpeedBox.value = 5.0
     self.overlayOutlineOnlyBox.checked = True
     self.opacitySlider.value = 1
@@ -1579,12 +1874,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.totalFrameLabel.setText(f"of 0")
 
     # Remove the image nodes of each slice view used to preserve the slice views
-    nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLScalarVolumeNode")
-    nodes.UnRegister(None)
-    for node in nodes:
-      if node.GetName() == node.GetAttribute('Sequences.BaseName'):
-        slicer.mrmlScene.RemoveNode(node.GetDisplayNode())
-        slicer.mrmlScene.RemoveNode(node)
+    self.logic.removeRetainedBackgrounds()
         
     # Remove the label map node and the nodes it referenced, all created by the previous node
     nodes = slicer.mrmlScene.GetNodesByClass("vtkMRMLLabelMapVolumeNode")
@@ -1626,7 +1916,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.logic.visualize(self.customParamNode.sequenceBrowserNode,
                            self.customParamNode.sequenceNode2DImages,
                            self.customParamNode.node3DSegmentationLabelMap,
-                           self.customParamNode.sequenceNodeTransforms,
+                           self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode,
                            self.customParamNode.opacity,
                            self.customParamNode.overlayAsOutline,
                            self.customParamNode.overlayThickness,
@@ -1645,7 +1935,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.logic.visualize(self.customParamNode.sequenceBrowserNode,
                            self.customParamNode.sequenceNode2DImages,
                            self.customParamNode.node3DSegmentationLabelMap,
-                           self.customParamNode.sequenceNodeTransforms,
+                           self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode,
                            self.customParamNode.opacity,
                            self.customParamNode.overlayAsOutline,
                            self.customParamNode.overlayThickness,
@@ -1665,7 +1955,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.logic.visualize(self.customParamNode.sequenceBrowserNode,
                          self.customParamNode.sequenceNode2DImages,
                          self.customParamNode.node3DSegmentationLabelMap,
-                         self.customParamNode.sequenceNodeTransforms,
+                         self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode,
                          self.customParamNode.opacity,
                          self.customParamNode.overlayAsOutline,
                          self.customParamNode.overlayThickness,
@@ -1680,12 +1970,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     :param inputsProvided: True if all the 3 inputs have been provided: The 2D images folder,
     the 3D segmentation, and the transforms file.
     """
-    iconSize = qt.QSize(14, 14)
-    mediaIconsPath = os.path.join(os.path.dirname(slicer.util.modulePath(self.__module__)),
-                                  'Resources', 'Icons', 'media-control-icons')
-    pause_icon = qt.QIcon(os.path.join(mediaIconsPath, 'pause.png'))
-    play_icon = qt.QIcon(os.path.join(mediaIconsPath, 'play.png'))
-    self.playSequenceButton.setIconSize(iconSize)
+    self.playSequenceButton.setIconSize(qt.QSize(14, 14))
     
     # Reset file deletion and tooltips
     self.deleteImagesButton.enabled = True
@@ -1715,9 +2000,11 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.columnXSelector.setToolTip("Pause the player to enable this feature.")
         self.columnYSelector.setToolTip("Pause the player to enable this feature.")
         self.columnZSelector.setToolTip("Pause the player to enable this feature.")
+        self.columnTimeSelector.setToolTip("Pause the player to enable this feature.")
+        self.transformLayoutSelector.setToolTip("Pause the player to enable this feature.")
 
         # Set the play button to be a pause button
-        self.playSequenceButton.setIcon(pause_icon)
+        self.playSequenceButton.setIcon(self.pauseIcon)
         self.playSequenceButton.enabled = True
         
         # Enable file deletion
@@ -1733,6 +2020,10 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.columnXSelector.enabled = False
         self.columnYSelector.enabled = False
         self.columnZSelector.enabled = False
+        self.columnTimeSelector.enabled = False
+        self.transformLayoutSelector.enabled = False
+        for selector in self.columnRotationSelectors:
+          selector.enabled = False
       else:
         self.sequenceSlider.setToolTip("Select the next frame for playback.")
         self.deleteImagesButton.setToolTip("Remove Cine images.")
@@ -1740,7 +2031,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.deleteTransformsButton.setToolTip("Remove Transforms file.")
         
         # If we are paused
-        self.playSequenceButton.setIcon(play_icon)
+        self.playSequenceButton.setIcon(self.playIcon)
         self.currentFrameInputBox.enabled = True
         self.sequenceSlider.enabled = True
         self.playSequenceButton.setToolTip("Play playback at current frame.")
@@ -1755,9 +2046,14 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.columnXSelector.enabled = True
         self.columnYSelector.enabled = True
         self.columnZSelector.enabled = True
+        self.columnTimeSelector.enabled = True
+        self.transformLayoutSelector.enabled = True
+        for selector in self.columnRotationSelectors:
+          selector.enabled = True
         self.columnXSelector.setToolTip("")
         self.columnYSelector.setToolTip("")
         self.columnZSelector.setToolTip("")
+        self.columnTimeSelector.setToolTip(self.columnTimeSelectorToolTip)
 
         if self.atLastImage():
           #self.nextFrameButton.setToolTip("Move to the previous frame.") - may add a different tooltip at last image
@@ -1816,6 +2112,85 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       sliceCompositeNode = layoutManager.sliceWidget(name).mrmlSliceCompositeNode()
       sliceCompositeNode.SetLabelOpacity(self.opacitySlider.value)
 
+  def onLazyLoadingChange(self):
+    """
+    This function stores whether the cine images should be decoded on demand. It applies the next
+    time the images are loaded.
+    """
+    self.customParamNode.lazyLoading = self.lazyLoadingBox.checked
+
+  def onCompactStorageChange(self):
+    """
+    This function stores whether the cine images should be stored with the narrowest pixel type. It
+    applies the next time the images are loaded.
+    """
+    self.customParamNode.compactStorage = self.compactStorageBox.checked
+
+  def onTransformLayoutChange(self):
+    """
+    This function stores the layout of the columns of the transforms file. It applies the next time
+    the transformations are applied.
+    """
+    self.customParamNode.transformLayout = list(self.transformLayoutNames)[self.transformLayoutSelector.currentIndex]
+    self.updateRotationSelectors()
+    if self.selectorTransformsFile.currentPath:
+      self.onColumnXSelectorChange()
+
+  def updateRotationSelectors(self):
+    """
+    Shows the rotation column selectors needed by the selected transform layout.
+    """
+    layout = list(self.transformLayoutNames)[max(0, self.transformLayoutSelector.currentIndex)]
+    rotationColumns = TransformMath.TRANSFORM_LAYOUTS[layout][3:] if layout in ("euler", "quaternion") else []
+    self.columnRotationSelectorsWidget.setVisible(len(rotationColumns) > 0)
+    self.inputsFormLayout.labelForField(self.columnRotationSelectorsWidget).setVisible(len(rotationColumns) > 0)
+    for index, (label, selector) in enumerate(zip(self.columnRotationSelectorLabels, self.columnRotationSelectors)):
+      label.setVisible(index < len(rotationColumns))
+      selector.setVisible(index < len(rotationColumns))
+      if index < len(rotationColumns):
+        label.text = f"{rotationColumns[index]}:"
+
+  def getTransformsColumns(self):
+    """
+    Returns the selected transform layout, and the names of the columns of the transforms file to
+    read for it (see TransformMath.TRANSFORM_LAYOUTS).
+    """
+    layout = list(self.transformLayoutNames)[self.transformLayoutSelector.currentIndex]
+    headers = [self.columnXSelector.currentText, self.columnYSelector.currentText,
+               self.columnZSelector.currentText]
+    if layout == "matrix":
+      # The 16 columns of the matrix follow each other, starting at the X column
+      allHeaders = [self.columnXSelector.itemText(index) for index in range(self.columnXSelector.count)]
+      start = self.columnXSelector.currentIndex
+      headers = allHeaders[start:start + TransformMath.layoutColumnCount(layout)]
+    elif layout != "translation":
+      numRotationColumns = TransformMath.layoutColumnCount(layout) - 3
+      headers += [selector.currentText for selector in self.columnRotationSelectors[:numRotationColumns]]
+    return layout, headers
+
+  def onTransformTableChange(self):
+    """
+    This function stores whether the transforms should be kept in a single transform table. It
+    applies the next time the transformations are applied.
+    """
+    self.customParamNode.transformTable = self.transformTableBox.checked
+
+  def onPrecomputeOverlaysChange(self):
+    """
+    This function stores whether the overlays of the 2D images should be precomputed. It applies
+    the next time the transformations are applied.
+    """
+    self.customParamNode.precomputeOverlays = self.precomputeOverlaysBox.checked
+
+  def onFrameSelectionChange(self):
+    """
+    This function stores which of the cine images should be loaded. It applies the next time the
+    images are loaded.
+    """
+    self.customParamNode.frameStride = self.frameStrideBox.value
+    self.customParamNode.firstFrame = self.firstFrameBox.value
+    self.customParamNode.lastFrame = self.lastFrameBox.value
+
   def onOverlayOutlineChange(self):
     """
     This function updates whether the label map layer overlay is shown as outlined or as a filled
@@ -1857,8 +2232,9 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       sliceCompositeNode.SetBackgroundVolumeID("None")
       sliceCompositeNode.SetForegroundVolumeID("None")
       sliceCompositeNode.SetLabelVolumeID("")
-      # set `self.redBackground`, `self.greenBackground`, `self.yellowBackground` to None
-      setattr(self.logic, f"{name.lower()}Background", None)
+      # Remove `self.redBackground`, `self.greenBackground`, `self.yellowBackground`
+      if name in self.logic.backgrounds:
+        self.logic.removeRetainedBackgrounds([name])
       # Remove all observers to remove text in the slice views
       view = slicer.app.layoutManager().sliceWidget(name).sliceView()
       if view.cornerAnnotation().HasObserver(vtk.vtkCommand.ModifiedEvent):
@@ -1866,6 +2242,9 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       # Remove all text annotations in each slice view corner
       view.cornerAnnotation().ClearAllTexts()
 
+    # The views are wired again by the next visualization
+    self.logic.resetVisualization()
+
     # Clear segmentation label map from 3D view (only if the label map exists)
     if self.customParamNode.node3DSegmentationLabelMap:
       shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
@@ -1874,7 +2253,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     # After the visual reset we also want to setup our slice views for playback if all three
     # inputs have been provided
     inputsProvided = self.customParamNode.sequenceNode2DImages and \
-                     self.customParamNode.sequenceNodeTransforms and \
+                     (self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode) and \
                      self.customParamNode.node3DSegmentation
     if inputsProvided and reset:
       # Reset the Sequence back to the first image
@@ -1889,13 +2268,13 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.logic.visualize(self.customParamNode.sequenceBrowserNode,
                                  self.customParamNode.sequenceNode2DImages,
                                  self.customParamNode.node3DSegmentationLabelMap,
-                                 self.customParamNode.sequenceNodeTransforms,
+                                 self.customParamNode.sequenceNodeTransforms or self.customParamNode.frameTransformNode,
                                  self.customParamNode.opacity,
                                  self.customParamNode.overlayAsOutline,
                                  self.customParamNode.overlayThickness,
                                  customParamNode=self.customParamNode)
       # center 3D images on segmentation
-      if self.customParamNode.sequenceNode2DImages.GetDataNodeAtValue("0").GetImageData().GetDataDimension() == 3:
+      if self.customParamNode.sequenceNode2DImages.GetNthDataNode(0).GetImageData().GetDataDimension() == 3:
         labelmap = slicer.mrmlScene.GetNodesByClass('vtkMRMLLabelMapVolumeNode').GetItemAsObject(0)
         seg = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
         slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelmap, seg)
@@ -1908,8 +2287,7 @@ class TrackWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     
     self.applyTransformButton.enabled = False
 
-    slicer.util.forceRenderAllViews()
-    slicer.app.processEvents()
+    self.logic.renderScheduler.requestRender()
 
 
 
@@ -1958,13 +2336,40 @@ class TrackTest(ScriptedLoadableModuleTest):
     """Run as few or as many tests as needed here.
     """
     self.setUp()
+    # Tests that do not need the sample data
+    self.test_diskFrameCache()
+    self.test_loadMultiFrameImage()
+    self.test_loadUndecodableImage()
+    self.test_cinePack()
+    self.test_lazyFrames()
+    self.test_folderWatcher()
+    self.test_narrowArray()
+    self.test_cropRegion()
+    self.test_selectFrameIndices()
+    self.test_frameOrientations()
+    self.test_renderScheduler()
+    self.test_overlayMasks()
+    self.test_visualizationSetup()
+    self.test_retainedBackgrounds()
+    self.test_playbackGUI()
+    self.test_transformsReader()
+    self.test_alignTransformsToFrames()
+    self.test_transformLayouts()
+    self.test_transformsCache()
+    self.test_columnarTransforms()
+    self.test_transformTable()
+    self.test_transformNodesSequence()
+
     # check if folder exists
     if self.cine_images_folder_path is None or self.csv_file_path is None or self.cine_files_paths is None or not os.path.exists(self.cine_images_folder_path) or not os.path.exists(self.csv_file_path) or not os.path.exists(self.cine_files_paths):
         self.delayDisplay('Data is not available for testing',None,2000)
         return
     
     self.test_loadImagesIntoSequenceNode()
+    self.test_loadImagesIntoSequenceNodeInParallel()
+    self.test_scanImageHeaders()
     self.test_validateTransformsInput()
+    self.test_loadSession()
     self.delayDisplay('Test passed')
     
 
@@ -1977,6 +2382,829 @@ class TrackTest(ScriptedLoadableModuleTest):
     total_num_images = imagesSequenceNode.GetNumberOfDataNodes()
     self.assertEqual(total_num_images, 71)
     
+  def test_loadImagesIntoSequenceNodeInParallel(self):
+    shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
+    if self.cine_files_paths is None:
+        return
+    imagesSequenceNode, cancelled = \
+        self.logic.loadImagesIntoSequenceNode(shNode, self.cine_files_paths, numWorkers=4)
+    self.assertFalse(cancelled)
+    self.assertEqual(imagesSequenceNode.GetNumberOfDataNodes(), 71)
+    # Frames must be inserted in playback order, regardless of which worker decoded them first
+    imageFiles = [header["path"] for header in
+                  self.logic.scanImageHeaders(self.logic.getImageFilesFromPaths(self.cine_files_paths))["frames"]]
+    for index in range(imagesSequenceNode.GetNumberOfDataNodes()):
+      dataNode = imagesSequenceNode.GetDataNodeAtValue(str(index))
+      self.assertIn(os.path.basename(imageFiles[index]), dataNode.GetName())
+    
+  def test_scanImageHeaders(self):
+    if self.cine_files_paths is None:
+        return
+    imageFiles = self.logic.getImageFilesFromPaths(self.cine_files_paths)
+    scan = self.logic.scanImageHeaders(imageFiles, numWorkers=4)
+    self.assertEqual(len(scan["frames"]), 71)
+    self.assertEqual(len(scan["rejected"]), 0)
+    self.assertEqual(scan["totalBytes"], sum(header["bytes"] for header in scan["frames"]))
+    for header in scan["frames"]:
+      self.assertEqual(len(header["size"]), 3)
+      self.assertEqual(len(header["direction"]), 9)
+
+  def test_diskFrameCache(self):
+    import tempfile
+    import SimpleITK as sitk
+    from utils.FrameCache import DiskFrameCache, readFrameArray
+    with tempfile.TemporaryDirectory() as tempDir:
+      imagePath = os.path.join(tempDir, "frame.mha")
+      image = sitk.Image(64, 48, sitk.sitkInt16)
+      image[10, 20] = 123
+      sitk.WriteImage(image, imagePath)
+
+      frameCache = DiskFrameCache(os.path.join(tempDir, "cache"), 2**20)
+      decoded = readFrameArray(imagePath, frameCache)
+      cached = readFrameArray(imagePath, frameCache)
+      self.assertEqual(frameCache.statistics()["misses"], 1)
+      self.assertEqual(frameCache.statistics()["hits"], 1)
+      self.assertTrue(np.array_equal(decoded, cached))
+      self.assertEqual(cached[0, 20, 10], 123)
+
+      # Caching a frame again replaces it, and a new cache finds the frames of the previous one
+      frameBytes = frameCache.statistics()["bytes"]
+      frameCache.put(imagePath, decoded)
+      self.assertEqual(frameCache.statistics()["bytes"], frameBytes)
+      self.assertEqual(DiskFrameCache(os.path.join(tempDir, "cache"), 2**20).statistics()["bytes"], frameBytes)
+
+      # A cache too small for a second frame evicts the least recently used one
+      frameCache.maxBytes = frameCache.statistics()["bytes"]
+      otherPath = os.path.join(tempDir, "other.mha")
+      sitk.WriteImage(image, otherPath)
+      readFrameArray(otherPath, frameCache)
+      self.assertIsNone(frameCache.get(imagePath))
+      self.assertIsNotNone(frameCache.get(otherPath))
+
+  def test_loadMultiFrameImage(self):
+    import tempfile
+    import SimpleITK as sitk
+    with tempfile.TemporaryDirectory() as tempDir:
+      # A 2D+t cine stored as a single 3D image whose third axis is time
+      imagePath = os.path.join(tempDir, "cine.mha")
+      image = sitk.Image(64, 48, 5, sitk.sitkInt16)
+      for frameIndex in range(5):
+        image[10, 20, frameIndex] = frameIndex + 1
+      sitk.WriteImage(image, imagePath)
+
+      shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
+      imagesSequenceNode, cancelled = \
+          self.logic.loadImagesIntoSequenceNode(shNode, [imagePath],
+                                                progressCallback=lambda label, value, maximum: False)
+      self.assertFalse(cancelled)
+      self.assertEqual(imagesSequenceNode.GetNumberOfDataNodes(), 5)
+      for frameIndex in range(5):
+        frame = slicer.util.arrayFromVolume(imagesSequenceNode.GetNthDataNode(frameIndex))
+        self.assertEqual(frame.shape, (1, 48, 64))
+        self.assertEqual(frame[0, 20, 10], frameIndex + 1)
+
+  def test_loadUndecodableImage(self):
+    import tempfile
+    import SimpleITK as sitk
+    with tempfile.TemporaryDirectory() as tempDir:
+      imagePaths = [os.path.join(tempDir, f"frame{index}.mha") for index in range(3)]
+      for imagePath in imagePaths:
+        sitk.WriteImage(sitk.Image(64, 48, sitk.sitkInt16), imagePath)
+      # The header of the last image is valid, but its voxels are truncated
+      with open(imagePaths[2], "rb") as f:
+        content = f.read()
+      with open(imagePaths[2], "wb") as f:
+        f.write(content[:-100])
+
+      numSequences = slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLSequenceNode")
+      errors = []
+      shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
+      imagesSequenceNode, cancelled = \
+          self.logic.loadImagesIntoSequenceNode(shNode, imagePaths, numWorkers=2,
+                                                progressCallback=lambda label, value, maximum: False,
+                                                errorCallback=lambda message, title: errors.append(title))
+      self.assertIsNone(imagesSequenceNode)
+      self.assertEqual(errors, ["Failed to Load File"])
+      # The partially filled sequence is removed
+      self.assertEqual(slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLSequenceNode"), numSequences)
+
+  def test_cinePack(self):
+    import tempfile
+    from vtk.util import numpy_support
+    from utils import FrameIO
+    from utils.CinePack import CinePackFrameSource
+    # Frames of a multi-plane acquisition differ in shape and pixel type
+    frames = [np.arange(12, dtype=np.int16).reshape(1, 3, 4), np.arange(10, dtype=np.uint8).reshape(1, 5, 2)]
+    imagesSequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode", "Packed Sequence")
+    for index, array in enumerate(frames):
+      frameNode = FrameIO.volumeNodeFromArray(array, [1.0, 1.0, 1.0], [0.0, 0.0, float(index)],
+                                              [1, 0, 0, 0, 1, 0, 0, 0, 1], f"Frame {index}")
+      imagesSequenceNode.SetDataNodeAtValue(frameNode, str(index))
+    # Every other frame of a 4-frame acquisition was loaded
+    self.logic.setFrameSelection(imagesSequenceNode, [0, 2], 4, [0.0, 0.08])
+    loadedSequenceNode = None
+    try:
+      with tempfile.TemporaryDirectory() as tempDir:
+        packPath = os.path.join(tempDir, "cine.cinepack")
+        self.assertTrue(self.logic.saveCinePack(imagesSequenceNode, packPath,
+                                                progressCallback=lambda label, value, maximum: False))
+        frameSource = CinePackFrameSource(packPath)
+        self.assertEqual(len(frameSource), 2)
+        for index, array in enumerate(frames):
+          self.assertEqual(frameSource.readFrameArray(index).dtype, array.dtype)
+          np.testing.assert_array_equal(frameSource.readFrameArray(index), array)
+          self.assertEqual(frameSource.frameGeometry(index)[0], [array.shape[2], array.shape[1], 1])
+        self.assertEqual(frameSource.frameTimes, [0.0, 0.08])
+        self.assertEqual(frameSource.frameSelection, ([0, 2], 4))
+        del frameSource
+
+        loadedSequenceNode, cancelled = self.logic.loadCinePackIntoSequenceNode(
+          packPath, progressCallback=lambda label, value, maximum: False)
+        self.assertFalse(cancelled)
+        self.assertEqual(loadedSequenceNode.GetNumberOfDataNodes(), 2)
+        # The frame times and frame selection survive the pack
+        self.assertEqual(self.logic.getFrameTimes(loadedSequenceNode), [0.0, 0.08])
+        self.assertEqual(self.logic.getFrameSelection(loadedSequenceNode), ([0, 2], 4))
+        for index, array in enumerate(frames):
+          self.assertEqual(loadedSequenceNode.GetNthDataNode(index).GetName(), f"Frame {index}")
+          self.assertEqual(loadedSequenceNode.GetNthDataNode(index).GetImageData().GetDimensions(),
+                           (array.shape[2], array.shape[1], 1))
+          scalars = self.logic.lazyFrames.getImageData(index).GetPointData().GetScalars()
+          np.testing.assert_array_equal(numpy_support.vtk_to_numpy(scalars).reshape(array.shape), array)
+        self.logic.lazyFrames.shutdown()
+        self.logic.lazyFrames = None
+    finally:
+      slicer.mrmlScene.RemoveNode(imagesSequenceNode)
+      if loadedSequenceNode is not None:
+        slicer.mrmlScene.RemoveNode(loadedSequenceNode)
+
+  def test_lazyFrames(self):
+    from utils.LazyFrames import LazyFrameSequence
+    class CountingFrameSource():
+      def __init__(self):
+        self.reads = []
+      def __len__(self):
+        return 10
+      def readFrameArray(self, index):
+        self.reads.append(index)
+        return np.full((1, 2, 3), index, dtype=np.int16)
+    frameSource = CountingFrameSource()
+    lazyFrames = LazyFrameSequence(None, frameSource, cacheSize=4, numWorkers=1)
+    try:
+      imageData = lazyFrames.getImageData(0)
+      self.assertEqual(imageData.GetDimensions(), (3, 2, 1))
+      self.assertEqual(imageData.GetScalarComponentAsDouble(2, 1, 0, 0), 0)
+      # Requesting a frame again returns the same image data, without decoding it again
+      self.assertIs(lazyFrames.getImageData(0), imageData)
+      # The next frame was prefetched, and is only decoded once
+      self.assertEqual(lazyFrames.getImageData(1).GetScalarComponentAsDouble(0, 0, 0, 0), 1)
+      self.assertEqual(frameSource.reads.count(1), 1)
+      # Only a window of frames is kept while playing
+      for index in range(10):
+        self.assertEqual(lazyFrames.getImageData(index).GetScalarComponentAsDouble(0, 0, 0, 0), index)
+        self.assertLessEqual(len(lazyFrames.cache), 4)
+      self.assertNotIn(0, lazyFrames.cache)
+      self.assertIn(9, lazyFrames.cache)
+      # An evicted frame is decoded again
+      numReads = len(frameSource.reads)
+      self.assertEqual(lazyFrames.getImageData(0).GetScalarComponentAsDouble(0, 0, 0, 0), 0)
+      self.assertEqual(frameSource.reads[numReads], 0)
+    finally:
+      lazyFrames.shutdown()
+
+  def test_folderWatcher(self):
+    import tempfile
+    import SimpleITK as sitk
+    from utils.FolderWatcher import CineFolderWatcher
+    with tempfile.TemporaryDirectory() as tempDir:
+      def writeFrame(name, value):
+        image = sitk.Image(32, 24, sitk.sitkUInt8)
+        image[5, 6] = value
+        sitk.WriteImage(image, os.path.join(tempDir, name))
+        return os.path.join(tempDir, name)
+      writeFrame("frame000.mha", 1)
+      imagesSequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode", "Watched Sequence")
+      added = []
+      skipped = []
+      watcher = CineFolderWatcher(tempDir, imagesSequenceNode, self.logic.imageFileFormats, maxFrames=2,
+                                  onFramesAdded=added.append, maxWaitMs=60000,
+                                  onFileSkipped=lambda path, message: skipped.append(os.path.basename(path)))
+      try:
+        # Files present when watching starts are not appended
+        watcher.scan(wait=True)
+        self.assertEqual(imagesSequenceNode.GetNumberOfDataNodes(), 0)
+
+        # A partially written file holds back the following frames
+        partialPath = writeFrame("frame001.mha", 2)
+        with open(partialPath, "rb") as f:
+          content = f.read()
+        with open(partialPath, "wb") as f:
+          f.write(content[:10])
+        nextPath = writeFrame("frame002.mha", 3)
+        watcher.scan(wait=True)
+        self.assertEqual(imagesSequenceNode.GetNumberOfDataNodes(), 0)
+        self.assertEqual(watcher.pendingFiles, [partialPath, nextPath])
+
+        # Once written, the frames are appended in order
+        with open(partialPath, "wb") as f:
+          f.write(content)
+        watcher.scan(wait=True)
+        self.assertEqual(imagesSequenceNode.GetNumberOfDataNodes(), 2)
+        self.assertEqual(added, [2])
+        self.assertEqual(slicer.util.arrayFromVolume(imagesSequenceNode.GetNthDataNode(0))[0, 6, 5], 2)
+
+        # The ring buffer keeps the most recent frames
+        writeFrame("frame003.mha", 4)
+        watcher.scan(wait=True)
+        self.assertEqual(imagesSequenceNode.GetNumberOfDataNodes(), 2)
+        self.assertEqual([imagesSequenceNode.GetNthIndexValue(index) for index in range(2)], ["1", "2"])
+        self.assertEqual(slicer.util.arrayFromVolume(imagesSequenceNode.GetNthDataNode(1))[0, 6, 5], 4)
+
+        # A file that cannot be read for too long is skipped and reported
+        watcher.maxWaitMs = 0
+        with open(os.path.join(tempDir, "frame004.mha"), "w") as f:
+          f.write("not an image")
+        writeFrame("frame005.mha", 6)
+        watcher.scan(wait=True)
+        self.assertEqual(skipped, ["frame004.mha"])
+        self.assertEqual(watcher.pendingFiles, [])
+        self.assertEqual(slicer.util.arrayFromVolume(imagesSequenceNode.GetNthDataNode(1))[0, 6, 5], 6)
+      finally:
+        watcher.stop()
+        slicer.mrmlScene.RemoveNode(imagesSequenceNode)
+
+  def test_narrowArray(self):
+    from utils import FrameIO
+    # 12-bit values stored as 32-bit integers fit in 16 bits
+    array = np.array([[[0, 4095], [17, 2048]]], dtype=np.int32)
+    self.assertEqual(FrameIO.narrowArray(array).dtype, np.uint16)
+    self.assertTrue(np.array_equal(FrameIO.narrowArray(array), array))
+    self.assertEqual(FrameIO.narrowestDtype(array - 100), np.int16)
+    # Integer values stored as floating point numbers are narrowed, fractions are kept
+    self.assertEqual(FrameIO.narrowestDtype(array.astype(np.float32)), np.uint16)
+    self.assertEqual(FrameIO.narrowestDtype(array.astype(np.float32) + 0.5), np.float32)
+    self.assertEqual(FrameIO.narrowestDtype(np.array([0.1])), np.float64)
+    self.assertEqual(FrameIO.narrowestDtype(np.array([0.5, 1e6])), np.float32)
+    # Nothing narrower than 8 bits
+    self.assertEqual(FrameIO.narrowestDtype(np.array([1], dtype=np.uint8)), np.uint8)
+
+  def test_cropRegion(self):
+    from utils import FrameIO
+    size, spacing, origin, direction = [64, 48, 1], [1.0, 1.0, 1.0], [0.0, 0.0, 0.0], [1, 0, 0, 0, 1, 0, 0, 0, 1]
+    # RAS bounds covering LPS x in [10, 20] and y in [5, 30]
+    region = FrameIO.regionFromRASBounds([-20, -10, -30, -5, -1, 1], size, spacing, origin, direction)
+    self.assertEqual(region, ([10, 5, 0], [11, 26, 1]))
+    croppedSize, _, croppedOrigin, _ = FrameIO.croppedGeometry(region, spacing, origin, direction)
+    self.assertEqual(croppedSize, [11, 26, 1])
+    self.assertEqual(croppedOrigin, [10.0, 5.0, 0.0])
+    # Bounds covering the whole frame, or outside of it, do not crop
+    self.assertIsNone(FrameIO.regionFromRASBounds([-100, 100, -100, 100, -1, 1], size, spacing, origin, direction))
+    self.assertIsNone(FrameIO.regionFromRASBounds([100, 200, 100, 200, -1, 1], size, spacing, origin, direction))
+
+  def test_selectFrameIndices(self):
+    self.assertEqual(self.logic.selectFrameIndices(10), list(range(10)))
+    self.assertEqual(self.logic.selectFrameIndices(10, stride=3), [0, 3, 6, 9])
+    self.assertEqual(self.logic.selectFrameIndices(10, stride=2, startIndex=3, endIndex=8), [3, 5, 7])
+    frameTimes = [100.0 + 0.5 * index for index in range(10)]
+    self.assertEqual(self.logic.selectFrameIndices(10, startTime=1.0, endTime=2.0, frameTimes=frameTimes),
+                     [2, 3, 4])
+
+  def test_frameOrientations(self):
+    from utils import FrameIO
+    identity = [1, 0, 0, 0, 1, 0, 0, 0, 1]
+    self.assertEqual(FrameIO.sliceOrientation([64, 48, 1], identity), "Axial")
+    # Single-voxel I or J axis, as for frames stored as a volume
+    self.assertEqual(FrameIO.sliceOrientation([1, 64, 48], identity), "Sagittal")
+    self.assertEqual(FrameIO.sliceOrientation([64, 1, 48], identity), "Coronal")
+    # Oblique frames get the closest orientation
+    self.assertEqual(FrameIO.sliceOrientation([64, 48, 1], [1, 0, 0, 0, 0.3, -0.95, 0, 0.95, 0.3]), "Coronal")
+
+    # Orientations are indexed once, by index value
+    sequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode")
+    try:
+      for index, size in enumerate([[64, 48, 1], [1, 64, 48]]):
+        frame = FrameIO.placeholderVolumeNode(size, [1.0, 1.0, 1.0], [0.0, 0.0, 0.0], identity, f"frame{index}")
+        sequenceNode.SetDataNodeAtValue(frame, str(index))
+      self.assertEqual(self.logic.indexFrameOrientations(sequenceNode), {"0": "Axial", "1": "Sagittal"})
+      sequenceNode.RemoveDataNodeAtValue("0")
+      frame = FrameIO.placeholderVolumeNode([64, 1, 48], [1.0, 1.0, 1.0], [0.0, 0.0, 0.0], identity, "frame2")
+      sequenceNode.SetDataNodeAtValue(frame, "2")
+      self.assertEqual(self.logic.getFrameOrientation(sequenceNode, 0), "Sagittal")
+      self.assertEqual(self.logic.getFrameOrientation(sequenceNode, 1), "Coronal")
+    finally:
+      self.logic.frameOrientations.pop(sequenceNode.GetID(), None)
+      slicer.mrmlScene.RemoveNode(sequenceNode)
+
+  def test_renderScheduler(self):
+    from utils.RenderScheduler import RenderScheduler
+    layoutManager = slicer.app.layoutManager()
+    renderScheduler = RenderScheduler(threeDRate=5)
+    # Count the renders of every view
+    renders = {}
+    renderWindows = {name: layoutManager.sliceWidget(name).sliceView().renderWindow()
+                     for name in layoutManager.sliceViewNames()}
+    renderWindows["3D"] = layoutManager.threeDWidget(0).threeDView().renderWindow()
+    observations = []
+    for name, renderWindow in renderWindows.items():
+      def onRender(caller, event, name=name):
+        renders[name] = renders.get(name, 0) + 1
+      observations.append((renderWindow, renderWindow.AddObserver(vtk.vtkCommand.EndEvent, onRender)))
+    try:
+      # Requests are coalesced until the views are rendered, once each
+      renderScheduler.requestRender(["Red"], threeD=False)
+      renderScheduler.requestRender(["Red", "Yellow"], threeD=False)
+      renderScheduler.requestRender(["Yellow"])
+      renderScheduler.flush()
+      self.assertEqual(renders, {"Red": 1, "Yellow": 1, "3D": 1})
+      # Nothing is rendered again until views are requested again
+      renderScheduler.flush()
+      self.assertEqual(renders, {"Red": 1, "Yellow": 1, "3D": 1})
+      renderScheduler.requestRender(["Green"], threeD=False)
+      renderScheduler.flush()
+      self.assertEqual(renders, {"Red": 1, "Yellow": 1, "Green": 1, "3D": 1})
+      # Dropped requests are not rendered
+      renderScheduler.requestRender()
+      renderScheduler.clear()
+      renderScheduler.flush()
+      self.assertEqual(renders, {"Red": 1, "Yellow": 1, "Green": 1, "3D": 1})
+    finally:
+      for renderWindow, observation in observations:
+        renderWindow.RemoveObserver(observation)
+      renderScheduler.clear()
+
+  def test_overlayMasks(self):
+    from utils.OverlayMasks import computeOverlayMasks, overlayMask
+    labelArray = np.zeros((4, 4, 4), dtype=np.uint8)
+    labelArray[1:3, 1:3, 1:3] = 1
+    # A single-slice frame through k = 2 of the label map
+    frameIJKToRAS = np.eye(4)
+    frameIJKToRAS[2, 3] = 2
+    expected = np.zeros((1, 4, 4), dtype=bool)
+    expected[0, 1:3, 1:3] = True
+    np.testing.assert_array_equal(overlayMask(labelArray, np.eye(4), frameIJKToRAS, (1, 4, 4)), expected)
+    # The second transform moves the label map by 1 mm along R, and the third out of the frame
+    transforms = np.tile(np.eye(4), (3, 1, 1))
+    transforms[1, 0, 3] = 1
+    transforms[2, 2, 3] = 10
+    overlayMasks = computeOverlayMasks("key", labelArray, np.eye(4), [(frameIJKToRAS, (1, 4, 4))] * 3,
+                                       transforms, numWorkers=2)
+    self.assertEqual(len(overlayMasks), 3)
+    self.assertEqual(len(overlayMasks.frameGeometries), 1)
+    self.assertEqual(overlayMasks.nbytes, 3 * 2)
+    np.testing.assert_array_equal(overlayMasks.mask(0), expected)
+    np.testing.assert_array_equal(overlayMasks.mask(1), np.roll(expected, 1, axis=2))
+    self.assertFalse(overlayMasks.mask(2).any())
+    # Cancelling returns nothing
+    self.assertIsNone(computeOverlayMasks("key", labelArray, np.eye(4), [(frameIJKToRAS, (1, 4, 4))] * 3,
+                                          transforms, progressCallback=lambda numComputed: True))
+
+    # A slice view shows the overlay of a frame through its own label map node and display node
+    labelMapNode = slicer.util.addVolumeFromArray(labelArray, nodeClassName="vtkMRMLLabelMapVolumeNode")
+    labelMapNode.CreateDefaultDisplayNodes()
+    try:
+      maskNode = self.logic.updateOverlayMaskNode("Red", overlayMasks, 1, labelMapNode)
+      np.testing.assert_array_equal(slicer.util.arrayFromVolume(maskNode), np.roll(expected, 1, axis=2))
+      self.assertNotEqual(maskNode.GetDisplayNodeID(), labelMapNode.GetDisplayNodeID())
+      self.assertEqual(maskNode.GetDisplayNode().GetColorNodeID(), labelMapNode.GetDisplayNode().GetColorNodeID())
+      self.assertIs(self.logic.updateOverlayMaskNode("Red", overlayMasks, 0, labelMapNode), maskNode)
+      np.testing.assert_array_equal(slicer.util.arrayFromVolume(maskNode), expected)
+      maskDisplayNode = maskNode.GetDisplayNode()
+      self.logic.clearOverlayMasks()
+      self.assertFalse(slicer.mrmlScene.IsNodePresent(maskNode))
+      self.assertFalse(slicer.mrmlScene.IsNodePresent(maskDisplayNode))
+      self.assertIsNotNone(labelMapNode.GetDisplayNode())
+    finally:
+      slicer.mrmlScene.RemoveNode(labelMapNode)
+
+  def addPlaybackNodes(self):
+    """
+    Adds a sequence of 3 frames (axial, sagittal, then axial again, with voxel values 1, 2 and 3), a
+    label map, a transform table and the sequence browser playing them, without any sample data.
+    Returns the sequence browser, the sequence node, the label map node and the transform node.
+    """
+    from utils import FrameIO
+    slicer.app.layoutManager().setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutConventionalView)
+    identity = [1, 0, 0, 0, 1, 0, 0, 0, 1]
+    sequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode", "Playback Frames")
+    for index, shape in enumerate([(1, 4, 4), (4, 4, 1), (1, 4, 4)]):
+      frame = FrameIO.volumeNodeFromArray(np.full(shape, index + 1, dtype=np.uint8), [1.0, 1.0, 1.0],
+                                          [0.0, 0.0, 0.0], identity, f"Frame {index}")
+      sequenceNode.SetDataNodeAtValue(frame, str(index))
+    self.logic.indexFrameOrientations(sequenceNode)
+    labelMapNode = slicer.util.addVolumeFromArray(np.ones((4, 4, 4), dtype=np.uint8),
+                                                  nodeClassName="vtkMRMLLabelMapVolumeNode")
+    labelMapNode.CreateDefaultDisplayNodes()
+    transformNode = self.logic.createTransformTableFromTransformData([[index, 0, 0] for index in range(3)], 3)
+    sequenceBrowser = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceBrowserNode")
+    sequenceBrowser.AddSynchronizedSequenceNode(sequenceNode)
+    sequenceBrowser.SetSelectedItemNumber(0)
+    return sequenceBrowser, sequenceNode, labelMapNode, transformNode
+
+  def removePlaybackNodes(self, sequenceBrowser, sequenceNode, labelMapNode):
+    self.logic.removeRetainedBackgrounds()
+    self.logic.resetVisualization()
+    self.logic.clearTransformTable()
+    self.logic.frameOrientations.pop(sequenceNode.GetID(), None)
+    proxyNode = sequenceBrowser.GetProxyNode(sequenceNode)
+    for node in [sequenceBrowser, proxyNode, sequenceNode, labelMapNode]:
+      if node is not None:
+        slicer.mrmlScene.RemoveNode(node)
+
+  def test_visualizationSetup(self):
+    layoutManager = slicer.app.layoutManager()
+    sequenceBrowser, sequenceNode, labelMapNode, transformNode = self.addPlaybackNodes()
+    labelMapID = slicer.mrmlScene.GetSubjectHierarchyNode().GetItemByDataNode(labelMapNode)
+    try:
+      # The first frame wires the views
+      self.logic.visualize(sequenceBrowser, sequenceNode, labelMapID, transformNode, 0.5, True, 2)
+      state = self.logic.visualizationState
+      self.assertEqual(labelMapNode.GetTransformNodeID(), transformNode.GetID())
+      self.assertEqual(labelMapNode.GetDisplayNode().GetSliceIntersectionThickness(), 2)
+      redCompositeNode = layoutManager.sliceWidget("Red").mrmlSliceCompositeNode()
+      self.assertEqual(redCompositeNode.GetLabelVolumeID(), labelMapNode.GetID())
+      self.assertEqual(redCompositeNode.GetBackgroundVolumeID(), self.logic.redBackground.GetID())
+
+      # Stepping frames only updates the frame, its transform is applied in place
+      for itemNumber in [2, 0, 2]:
+        sequenceBrowser.SetSelectedItemNumber(itemNumber)
+        self.logic.visualize(sequenceBrowser, sequenceNode, labelMapID, transformNode, 0.5, True, 2)
+        self.assertIs(self.logic.visualizationState, state)
+        self.assertEqual(labelMapNode.GetTransformNodeID(), transformNode.GetID())
+        # The transforms are LPS translations, shown in RAS
+        self.assertAlmostEqual(slicer.util.arrayFromTransformMatrix(transformNode)[0, 3], -itemNumber)
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(self.logic.redBackground), itemNumber + 1)
+
+      # Changing a display option wires the views again
+      self.logic.visualize(sequenceBrowser, sequenceNode, labelMapID, transformNode, 0.8, False, 2)
+      self.assertIsNot(self.logic.visualizationState, state)
+      self.assertAlmostEqual(redCompositeNode.GetLabelOpacity(), 0.8)
+      self.assertFalse(layoutManager.sliceWidget("Red").mrmlSliceNode().GetUseLabelOutline())
+      state = self.logic.visualizationState
+      self.logic.visualize(sequenceBrowser, sequenceNode, labelMapID, transformNode, 0.8, False, 2)
+      self.assertIs(self.logic.visualizationState, state)
+
+      # Once the views are reset, the next frame wires them again
+      self.logic.resetVisualization()
+      self.assertIsNone(self.logic.visualizationState)
+      self.logic.visualize(sequenceBrowser, sequenceNode, labelMapID, transformNode, 0.8, False, 2)
+      self.assertIsNotNone(self.logic.visualizationState)
+    finally:
+      self.removePlaybackNodes(sequenceBrowser, sequenceNode, labelMapNode)
+
+  def test_retainedBackgrounds(self):
+    layoutManager = slicer.app.layoutManager()
+    cornerText = lambda viewName, corner: layoutManager.sliceWidget(viewName).sliceView().cornerAnnotation().GetText(corner) or ""
+    sequenceBrowser, sequenceNode, labelMapNode, transformNode = self.addPlaybackNodes()
+    labelMapID = slicer.mrmlScene.GetSubjectHierarchyNode().GetItemByDataNode(labelMapNode)
+    try:
+      frameNames = []
+      for itemNumber in range(3):
+        sequenceBrowser.SetSelectedItemNumber(itemNumber)
+        self.logic.visualize(sequenceBrowser, sequenceNode, labelMapID, transformNode, 0.5, True, 2, show=True)
+        frameNames.append(sequenceBrowser.GetProxyNode(sequenceNode).GetAttribute('Sequences.BaseName') or "")
+        if itemNumber == 0:
+          # The background references the voxels and display node of the frame
+          proxyNode = sequenceBrowser.GetProxyNode(sequenceNode)
+          redBackground = self.logic.redBackground
+          self.assertIs(redBackground.GetImageData(), proxyNode.GetImageData())
+          self.assertEqual(redBackground.GetDisplayNodeID(), proxyNode.GetDisplayNodeID())
+          self.assertIsNone(self.logic.yellowBackground)
+
+        if itemNumber == 1:
+          # A sagittal frame gets its own background, the axial one keeps the first frame
+          np.testing.assert_array_equal(slicer.util.arrayFromVolume(self.logic.redBackground), 1)
+          np.testing.assert_array_equal(slicer.util.arrayFromVolume(self.logic.yellowBackground), 2)
+          self.assertEqual(cornerText("Red", vtk.vtkCornerAnnotation.LowerLeft), frameNames[0])
+          self.assertEqual(cornerText("Red", vtk.vtkCornerAnnotation.UpperLeft), "")
+          self.assertEqual(cornerText("Yellow", vtk.vtkCornerAnnotation.LowerLeft), frameNames[1])
+          self.assertEqual(cornerText("Yellow", vtk.vtkCornerAnnotation.UpperLeft), "Current Alignment")
+
+      # The next axial frame is swapped into the same background
+      self.assertIs(self.logic.redBackground, redBackground)
+      self.assertEqual(slicer.mrmlScene.GetNodesByName("Red Background").GetNumberOfItems(), 1)
+      np.testing.assert_array_equal(slicer.util.arrayFromVolume(redBackground), 3)
+      np.testing.assert_array_equal(slicer.util.arrayFromVolume(self.logic.yellowBackground), 2)
+      self.assertEqual(self.logic.backgroundFrameNames, {"Red": frameNames[2], "Yellow": frameNames[1]})
+      self.assertEqual(cornerText("Red", vtk.vtkCornerAnnotation.LowerLeft), frameNames[2])
+      self.assertEqual(cornerText("Red", vtk.vtkCornerAnnotation.UpperLeft), "Current Alignment")
+      self.assertEqual(cornerText("Yellow", vtk.vtkCornerAnnotation.LowerLeft), frameNames[1])
+      self.assertEqual(cornerText("Yellow", vtk.vtkCornerAnnotation.UpperLeft), "")
+
+      # Removing the backgrounds keeps the display node of the frames
+      yellowBackground = self.logic.yellowBackground
+      self.logic.removeRetainedBackgrounds(["Yellow"])
+      self.assertIsNone(self.logic.yellowBackground)
+      self.assertFalse(slicer.mrmlScene.IsNodePresent(yellowBackground))
+      self.assertIs(self.logic.redBackground, redBackground)
+      self.assertEqual(list(self.logic.backgroundFrameNames), ["Red"])
+      self.logic.removeRetainedBackgrounds()
+      self.assertIsNone(self.logic.redBackground)
+      self.assertFalse(slicer.mrmlScene.IsNodePresent(redBackground))
+      self.assertEqual(self.logic.backgroundFrameNames, {})
+      self.assertIsNotNone(proxyNode.GetDisplayNode())
+    finally:
+      self.removePlaybackNodes(sequenceBrowser, sequenceNode, labelMapNode)
+
+  def test_playbackGUI(self):
+    layoutManager = slicer.app.layoutManager()
+    cornerText = lambda viewName, corner: layoutManager.sliceWidget(viewName).sliceView().cornerAnnotation().GetText(corner) or ""
+    widget = slicer.util.getModuleWidget("Track")
+    widget.initializeParameterNode()
+    # The widget plays the frames with its own logic
+    testLogic, self.logic = self.logic, widget.logic
+    self.logic.removeRetainedBackgrounds()
+    self.logic.resetVisualization()
+    sequenceBrowser, sequenceNode, labelMapNode, transformNode = self.addPlaybackNodes()
+    try:
+      widget.customParamNode.sequenceNode2DImages = sequenceNode
+      widget.customParamNode.frameTransformNode = transformNode
+      widget.customParamNode.node3DSegmentationLabelMap = \
+        slicer.mrmlScene.GetSubjectHierarchyNode().GetItemByDataNode(labelMapNode)
+      widget.customParamNode.totalImages = 3
+      widget.customParamNode.sequenceBrowserNode = sequenceBrowser
+      # The playback timer only advances the frames while events are processed
+      sequenceBrowser.SetPlaybackActive(True)
+      widget.updateGUIFromParameterNode()
+      self.assertEqual(widget.sequenceSlider.value, 1)
+      self.assertEqual(self.logic.backgroundFrameNames.keys(), {"Red"})
+
+      # Modifications of the sequence browser are coalesced into a single refresh
+      sequenceBrowser.SetSelectedItemNumber(1)
+      for _ in range(3):
+        widget.updateGUIFromParameterNode(sequenceBrowser, vtk.vtkCommand.ModifiedEvent)
+      self.assertTrue(widget.guiRefreshTimer.isActive())
+      self.assertEqual(widget.sequenceSlider.value, 1)
+      self.assertIsNone(self.logic.yellowBackground)
+      widget.guiRefreshTimer.stop()
+      widget.onPlaybackTick()
+      self.assertEqual(widget.sequenceSlider.value, 2)
+      self.assertEqual(widget.currentFrameInputBox.value, 2)
+      np.testing.assert_array_equal(slicer.util.arrayFromVolume(self.logic.yellowBackground), 2)
+      frameNames = dict(self.logic.backgroundFrameNames)
+
+      # Pausing keeps the frame and shows which view holds it
+      widget.onPlayButton()
+      self.assertFalse(sequenceBrowser.GetPlaybackActive())
+      self.assertEqual(sequenceBrowser.GetSelectedItemNumber(), 1)
+      self.assertEqual(cornerText("Yellow", vtk.vtkCornerAnnotation.UpperLeft), "Current Alignment")
+      self.assertEqual(cornerText("Yellow", vtk.vtkCornerAnnotation.LowerLeft), frameNames["Yellow"])
+      self.assertEqual(cornerText("Red", vtk.vtkCornerAnnotation.LowerLeft), frameNames["Red"])
+      np.testing.assert_array_equal(slicer.util.arrayFromVolume(self.logic.redBackground), 1)
+
+      # Resetting clears the backgrounds and the corner texts
+      redBackground = self.logic.redBackground
+      widget.resetVisuals(reset=False)
+      self.assertIsNone(self.logic.redBackground)
+      self.assertIsNone(self.logic.yellowBackground)
+      self.assertFalse(slicer.mrmlScene.IsNodePresent(redBackground))
+      self.assertIsNone(self.logic.visualizationState)
+      for viewName in ["Red", "Yellow"]:
+        self.assertEqual(cornerText(viewName, vtk.vtkCornerAnnotation.UpperLeft), "")
+        self.assertEqual(cornerText(viewName, vtk.vtkCornerAnnotation.LowerLeft), "")
+    finally:
+      sequenceBrowser.SetPlaybackActive(False)
+      widget.guiRefreshTimer.stop()
+      self.removePlaybackNodes(sequenceBrowser, sequenceNode, labelMapNode)
+      self.logic = testLogic
+
+  def test_transformsReader(self):
+    import itertools
+    import tempfile
+    from utils import TransformsReader
+    with tempfile.TemporaryDirectory() as tempDir:
+      csvPath = os.path.join(tempDir, "transforms.csv")
+      with open(csvPath, "w", encoding="utf-8-sig") as f:
+        f.write("Time,X,Y,Z,Déplacement\n0,1.5,-2,3,a\n1,4,5,6e-1,b\n")
+      self.assertEqual(TransformsReader.detectEncoding(csvPath), "utf-8-sig")
+      self.assertEqual(TransformsReader.readHeader(csvPath), ["Time", "X", "Y", "Z", "Déplacement"])
+      transforms = TransformsReader.readColumns(csvPath, ["X", "Y", "Z"])
+      self.assertEqual(transforms.dtype, np.float64)
+      self.assertEqual(transforms.tolist(), [[1.5, -2.0, 3.0], [4.0, 5.0, 0.6]])
+
+      # Every column of a table is parsed in the same pass, only the requested ones must be numbers
+      rows = [["0", "1.5", "a"], [], ["1", "4", "b"]]
+      errors = {}
+      chunks = list(TransformsReader.iterTableColumns(rows, ["Time", "X", "Label"], ["X"], errors))
+      self.assertEqual(len(chunks), 1)
+      self.assertEqual(chunks[0][0].tolist(), [[1.5], [4.0]])
+      self.assertEqual(chunks[0][1][:, :2].tolist(), [[0.0, 1.5], [1.0, 4.0]])
+      self.assertEqual(errors, {2: {"position": 0, "row": 2, "value": "a"}})
+      with self.assertRaises(TransformsReader.TransformsFormatError) as context:
+        list(TransformsReader.iterTableColumns(rows, ["Time", "X", "Label"], ["Label"], {}))
+      self.assertEqual((context.exception.row, context.exception.column), (2, "Label"))
+
+      # The offending row and column are reported
+      with open(csvPath, "w", encoding="cp1252") as f:
+        f.write("X,Y,Z\n1,2,3\n4,five,6\n")
+      with self.assertRaises(TransformsReader.TransformsFormatError) as context:
+        TransformsReader.readColumns(csvPath, ["X", "Y", "Z"])
+      self.assertEqual(context.exception.row, 3)
+      self.assertEqual(context.exception.column, "Y")
+
+      # The file is read in chunks, and reading stops once enough rows are read
+      with open(csvPath, "w") as f:
+        f.write("X,Y,Z\n" + "".join(f"{row},0,0\n" for row in range(9)) + "x,0,0\n")
+      transforms = TransformsReader.readColumns(csvPath, ["Z", "X"], maxRows=5)
+      self.assertEqual(transforms[:, 1].tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+      chunks = TransformsReader.iterColumns(csvPath, ["X"], chunkRows=4)
+      self.assertEqual([chunk[:, 0].tolist() for chunk in itertools.islice(chunks, 2)],
+                       [[0.0, 1.0, 2.0, 3.0], [4.0, 5.0, 6.0, 7.0]])
+      with self.assertRaises(TransformsReader.TransformsFormatError) as context:
+        next(chunks)
+      self.assertEqual(context.exception.row, 11)
+
+  def test_alignTransformsToFrames(self):
+    import tempfile
+    with tempfile.TemporaryDirectory() as tempDir:
+      # Transforms logged every 10 ms, starting 1 s before the first image
+      csvPath = os.path.join(tempDir, "transforms.csv")
+      with open(csvPath, "w") as f:
+        f.write("Time,X,Y,Z\n")
+        for row in range(301):
+          f.write(f"{1000 + row * 10},{row},{2 * row},0\n")
+      frameTimes = [36000.0, 36000.25, 36000.5, 36000.755]
+      transforms = self.logic.validateTransformsInput(csvPath, 4, ["X", "Y", "Z"], timeHeader="Time",
+                                                      frameTimes=frameTimes, timeOffset=2.0, timeScale=0.001,
+                                                      asArray=True)
+      self.assertEqual(transforms.shape, (4, 3))
+      np.testing.assert_allclose(transforms[:, 0], [100.0, 125.0, 150.0, 175.5])
+      np.testing.assert_allclose(transforms[:, 1], 2 * transforms[:, 0])
+      # Images after the last row get the last transform
+      transforms = self.logic.validateTransformsInput(csvPath, 4, ["X", "Y", "Z"], timeHeader="Time",
+                                                      frameTimes=[0, 1, 2, 10], timeScale=0.001, asArray=True)
+      np.testing.assert_allclose(transforms[:, 0], [0.0, 100.0, 200.0, 300.0])
+      # Images without an acquisition time cannot be aligned
+      errors = []
+      self.assertIsNone(self.logic.validateTransformsInput(csvPath, 4, ["X", "Y", "Z"], timeHeader="Time",
+                                                           errorCallback=lambda message, title: errors.append(title)))
+      self.assertEqual(errors, ["Validation Error"])
+
+  def test_transformLayouts(self):
+    import tempfile
+    # A rotation of 90 degrees around Z, and a translation
+    expected = np.array([[0, -1, 0, 1], [1, 0, 0, 2], [0, 0, 1, 3], [0, 0, 0, 1]], dtype=float)
+    euler = TransformMath.columnsToMatrices([[1, 2, 3, 0, 0, 90]], "euler")
+    np.testing.assert_allclose(euler[0], expected, atol=1e-12)
+    quaternion = TransformMath.columnsToMatrices([[1, 2, 3, np.sqrt(0.5), 0, 0, np.sqrt(0.5)]], "quaternion")
+    np.testing.assert_allclose(quaternion[0], expected, atol=1e-12)
+    np.testing.assert_allclose(TransformMath.columnsToMatrices([expected.ravel()], "matrix")[0], expected)
+    # Rotations are applied in order around the fixed axes
+    rotations = TransformMath.eulerToMatrices([[90, 90, 0]])
+    np.testing.assert_allclose(rotations[0], TransformMath.eulerToMatrices([[0, 90, 0]])[0] @
+                               TransformMath.eulerToMatrices([[90, 0, 0]])[0], atol=1e-12)
+    # Quaternions of opposite signs are the same rotation, and are interpolated along the shortest path
+    continuous = TransformMath.makeContinuous([[0, 0, 0, 1, 0, 0, 0], [0, 0, 0, -1, 0, 0, 0]], "quaternion")
+    self.assertEqual(continuous[1, 3], 1.0)
+
+    with tempfile.TemporaryDirectory() as tempDir:
+      csvPath = os.path.join(tempDir, "transforms.csv")
+      with open(csvPath, "w") as f:
+        f.write("X,Y,Z,RX,RY,RZ\n1,2,3,0,0,90\n4,5,6,0,0,0\n")
+      transforms = self.logic.validateTransformsInput(csvPath, 2, ["X", "Y", "Z", "RX", "RY", "RZ"],
+                                                      layout="euler", asArray=True)
+      self.assertEqual(transforms.shape, (2, 4, 4))
+      transformNode = self.logic.createTransformTableFromTransformData(transforms, 2)
+      # The rotation around the IS axis is the same in LPS and RAS, the translation is converted
+      matrix = slicer.util.arrayFromTransformMatrix(transformNode)
+      np.testing.assert_allclose(matrix[:3, :3], expected[:3, :3], atol=1e-12)
+      np.testing.assert_allclose(matrix[:3, 3], [-1.0, -2.0, 3.0])
+      self.logic.clearTransformTable()
+      # The number of columns must match the layout
+      errors = []
+      self.assertIsNone(self.logic.validateTransformsInput(csvPath, 2, ["X", "Y", "Z"], layout="quaternion",
+                                                           errorCallback=lambda message, title: errors.append(title)))
+      self.assertEqual(errors, ["Validation Error"])
+
+  def test_transformsCache(self):
+    import tempfile
+    from utils import TransformsReader
+    from utils.TransformsCache import TransformsTableCache
+    transformsCache = self.logic.transformsCache
+    with tempfile.TemporaryDirectory() as tempDir:
+      self.logic.transformsCache = TransformsTableCache(os.path.join(tempDir, "cache"), 2**20)
+      try:
+        csvPath = os.path.join(tempDir, "transforms.csv")
+        with open(csvPath, "w") as f:
+          f.write("Time,X,Y,Z,Label\n0,1,2,3,a\n\n1,4,5,6,b\n")
+        # Reading the header only caches the header
+        headers = self.logic.getColumnNamesFromTransformsInput(csvPath)
+        self.assertEqual(headers, ["Time", "X", "Y", "Z", "Label"])
+        self.assertEqual(self.logic.transformsCache.readHeader(csvPath), headers)
+        self.assertIsNone(self.logic.transformsCache.readColumns(csvPath, ["X"]))
+        # The columns read are cached, and only serve reads of at most as many rows when partial
+        self.assertEqual(self.logic.readTransformsArray(csvPath, ["X", "Y"], maxRows=1).tolist(), [[1.0, 2.0]])
+        self.assertEqual(self.logic.transformsCache.readColumns(csvPath, ["Y"], maxRows=1).tolist(), [[2.0]])
+        self.assertIsNone(self.logic.transformsCache.readColumns(csvPath, ["Y"]))
+        self.assertEqual(self.logic.validateTransformsInput(csvPath, 2, ["X", "Y", "Z"]), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        # A file read to the end gets every column cached, so other columns are selected without
+        # opening the file again
+        self.assertEqual(self.logic.transformsCache.readColumns(csvPath, ["Z", "X"]).tolist(), [[3.0, 1.0], [6.0, 4.0]])
+        self.assertEqual(self.logic.transformsCache.readColumns(csvPath, ["Time"]).tolist(), [[0.0], [1.0]])
+        def openFile(*args, **kwargs):
+          raise AssertionError("The transforms file was opened again")
+        iterColumns = TransformsReader.iterColumns
+        self.logic._openTransformsRows = TransformsReader.iterColumns = openFile
+        try:
+          self.assertEqual(self.logic.validateTransformsInput(csvPath, 2, ["Time", "Z", "Y"]),
+                           [[0.0, 3.0, 2.0], [1.0, 6.0, 5.0]])
+          self.assertEqual(self.logic.getColumnNamesFromTransformsInput(csvPath), headers)
+          # A column holding text is reported from the cache, with its row
+          errors = []
+          self.assertIsNone(self.logic.readTransformsArray(csvPath, ["X", "Label"],
+                                                           errorCallback=lambda message, title: errors.append(message)))
+          self.assertEqual(len(errors), 1)
+          self.assertIn("Row 2, column 'Label': 'a'", errors[0])
+        finally:
+          del self.logic._openTransformsRows
+          TransformsReader.iterColumns = iterColumns
+        with self.assertRaises(TransformsReader.TransformsFormatError):
+          self.logic.transformsCache.readColumns(csvPath, ["Label"])
+        # Columns larger than the size cap are not cached
+        smallCache = TransformsTableCache(os.path.join(tempDir, "small"), 8)
+        self.assertFalse(smallCache.putColumns(csvPath, ["X"], [[1.0], [4.0]], True))
+        self.assertIsNone(smallCache.readColumns(csvPath, ["X"]))
+        # A modified file is parsed again
+        with open(csvPath, "w") as f:
+          f.write("X,Y,Z\n7,8,9\n")
+        self.assertIsNone(self.logic.transformsCache.readHeader(csvPath))
+        self.assertEqual(self.logic.validateTransformsInput(csvPath, 1, ["X", "Y", "Z"]), [[7.0, 8.0, 9.0]])
+      finally:
+        self.logic.transformsCache = transformsCache
+
+  def test_columnarTransforms(self):
+    import importlib.util
+    import tempfile
+    from utils import TransformsReader
+    with tempfile.TemporaryDirectory() as tempDir:
+      columns = {"Time": np.arange(3.0), "X": np.array([1.0, 4.0, 7.0]), "Y": np.array([2.0, 5.0, 8.0]),
+                 "Z": np.array([3.0, 6.0, 9.0])}
+      paths = []
+      # The optional packages are not installed by the tests
+      if importlib.util.find_spec("pyarrow") is not None:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+        table = pyarrow.table(columns)
+        paths.append(os.path.join(tempDir, "transforms.parquet"))
+        pyarrow.parquet.write_table(table, paths[-1])
+        paths.append(os.path.join(tempDir, "transforms.feather"))
+        pyarrow.feather.write_feather(table, paths[-1])
+      if importlib.util.find_spec("h5py") is not None:
+        import h5py
+        paths.append(os.path.join(tempDir, "transforms.h5"))
+        with h5py.File(paths[-1], "w") as f:
+          for name, values in columns.items():
+            f.create_dataset(name, data=values)
+      for path in paths:
+        self.assertEqual(sorted(self.logic.getColumnNamesFromTransformsInput(path)), sorted(columns))
+        self.assertEqual(self.logic.validateTransformsInput(path, 2, ["Z", "X", "Y"]), [[3.0, 1.0, 2.0], [6.0, 4.0, 5.0]])
+        readColumns = TransformsReader.readHDF5Columns if path.endswith(".h5") else TransformsReader.readArrowColumns
+        self.assertEqual(readColumns(path, ["X"], maxRows=1).tolist(), [[1.0]])
+        with self.assertRaises(KeyError):
+          readColumns(path, ["W"])
+
+  def test_transformTable(self):
+    transformNode = self.logic.createTransformTableFromTransformData([[1, 2, 3], [4, 5, 6], [7, 8, 9]], 2)
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLLinearTransformNode"), 1)
+    self.assertEqual(len(self.logic.transformTable), 2)
+    # The first frame is applied, converted from LPS to RAS
+    matrix = slicer.util.arrayFromTransformMatrix(transformNode)
+    self.assertEqual(matrix[:3, 3].tolist(), [-1.0, -2.0, 3.0])
+    self.logic.transformTable.setFrame(1)
+    matrix = slicer.util.arrayFromTransformMatrix(transformNode)
+    self.assertEqual(matrix[:3, 3].tolist(), [-4.0, -5.0, 6.0])
+    # The table is stored in the attributes of the node, so a copy of the node, such as the node of a
+    # saved scene once loaded, restores it
+    savedNode = slicer.vtkMRMLLinearTransformNode()
+    savedNode.Copy(transformNode)
+    restoredTable = self.logic.getTransformTable(savedNode)
+    self.assertIs(self.logic.transformTable, restoredTable)
+    self.assertEqual(restoredTable.transforms.tolist(), [[-1.0, -2.0, 3.0], [-4.0, -5.0, 6.0]])
+    self.assertIsNone(self.logic.getTransformTable(slicer.vtkMRMLLinearTransformNode()))
+    self.logic.getTransformTable(transformNode)
+    self.logic.clearTransformTable()
+    self.assertFalse(slicer.mrmlScene.IsNodePresent(transformNode))
+
+  def test_transformNodesSequence(self):
+    shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
+    transforms = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    sequenceNode = self.logic.createTransformNodesFromTransformData(shNode, transforms, 2)
+    self.assertEqual(sequenceNode.GetNumberOfDataNodes(), 2)
+    # The transform nodes are only stored in the sequence
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLLinearTransformNode"), 0)
+    matrix = slicer.util.arrayFromTransformMatrix(sequenceNode.GetNthDataNode(1))
+    self.assertEqual(matrix[:3, 3].tolist(), [-4.0, -5.0, 6.0])
+    slicer.mrmlScene.RemoveNode(sequenceNode)
+    # RAS transforms are not converted, and a custom pre-transform may be provided
+    transformNode = self.logic.createTransformTableFromTransformData(transforms, 3, convention="RAS")
+    self.assertEqual(slicer.util.arrayFromTransformMatrix(transformNode)[:3, 3].tolist(), [1.0, 2.0, 3.0])
+    swapXY = np.array([[0, 1, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+    transformNode = self.logic.createTransformTableFromTransformData(transforms, 3, convention=swapXY)
+    self.assertEqual(slicer.util.arrayFromTransformMatrix(transformNode)[:3, 3].tolist(), [2.0, 1.0, 3.0])
+    self.logic.clearTransformTable()
+    with self.assertRaises(ValueError):
+      self.logic.createTransformTableFromTransformData(transforms, 3, convention="XYZ")
+
   def test_validateTransformsInput(self):
     shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
     if  self.cine_files_paths is None or self.csv_file_path is None or self.csv_headers is None:
@@ -1991,4 +3219,21 @@ class TrackTest(ScriptedLoadableModuleTest):
     for transform in transformationList:
       self.assertTrue(isinstance(transform, list))
       for num in transform:
-        self.assertTrue(isinstance(num, (float)))
\ No newline at end of file
+        self.assertTrue(isinstance(num, (float)))
+
+  def test_loadSession(self):
+    if self.cine_files_paths is None or self.csv_file_path is None:
+        return
+    progress = []
+    errors = []
+    session = self.logic.loadSession(self.cine_files_paths, self.csv_file_path, self.csv_headers,
+                                     numWorkers=4,
+                                     progressCallback=lambda label, value, maximum: progress.append(value),
+                                     errorCallback=lambda message, title: errors.append(message))
+    self.assertFalse(session["cancelled"])
+    self.assertEqual(errors, [])
+    self.assertEqual(session["errors"], [])
+    self.assertEqual(session["numImages"], 71)
+    self.assertEqual(session["transformsSequenceNode"].GetNumberOfDataNodes(), 71)
+    self.assertEqual(session["sequenceBrowserNode"].GetNumberOfSynchronizedSequenceNodes(), 2)
+    self.assertTrue(len(progress) > 0)
@@ -0,0 +1,155 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# A cine pack is a single file holding a whole cine acquisition, laid out as:
+#   - the magic bytes and a little-endian uint64 with the offset of the JSON metadata
+#   - padding up to PIXEL_ALIGNMENT bytes
+#   - the voxels of every frame, frame after frame, each C-ordered [k, j, i] and starting on a
+#     multiple of FRAME_ALIGNMENT bytes
+#   - the JSON metadata, up to the end of the file: the name, original file, LPS geometry, shape,
+#     dtype, offset, acquisition time and index within the acquisition of each frame, and the
+#     number of frames of the acquisition
+# Frames may differ in shape and dtype, like the frames of a multi-plane acquisition. The metadata
+# follows the voxels so that it can hold the dtype of every frame, known once the frame is decoded.
+# The voxels are memory-mapped when the pack is read, so frames are paged in from disk on access
+# instead of being parsed and copied.
+CINE_PACK_MAGIC = b"CINEPACK2\n"
+CINE_PACK_EXTENSION = ".cinepack"
+PIXEL_ALIGNMENT = 4096
+FRAME_ALIGNMENT = 64
+
+
+def _alignOffset(offset, alignment):
+  return -(-offset // alignment) * alignment
+
+
+def writeCinePack(packPath, frameSource, imageFiles=None, progressCallback=None, frameTimes=None,
+                  frameSelection=None):
+  """
+  Writes every frame of a frame source into a cine pack file. Frames are streamed to disk one at a
+  time, so memory use does not depend on the number of frames.
+  :param packPath: path of the cine pack file to write
+  :param frameSource: object providing frameName, frameGeometry and readFrameArray
+  :param imageFiles: optional list with the original file of every frame, stored in the pack
+  :param progressCallback: optional function called with the number of frames written so far. If it
+  returns True, writing is cancelled, the partial file is removed and False is returned
+  :param frameTimes: optional list with the acquisition time of every frame, in seconds
+  :param frameSelection: optional (index within the acquisition of every frame, number of frames of
+  the acquisition), when only some frames of the acquisition are packed
+  """
+  numFrames = len(frameSource)
+  if numFrames == 0:
+    raise ValueError("A cine pack needs at least one frame")
+  if frameTimes is not None and len(frameTimes) != numFrames:
+    raise ValueError("A cine pack needs the time of every frame")
+  sourceFrameIndices, numSourceFrames = frameSelection or (range(numFrames), numFrames)
+  if len(sourceFrameIndices) != numFrames:
+    raise ValueError("A cine pack needs the index of every frame within the acquisition")
+
+  completed = False
+  try:
+    with open(packPath, "wb") as f:
+      f.write(CINE_PACK_MAGIC)
+      # The offset of the metadata is written once the voxels are
+      f.write(struct.pack("<Q", 0))
+      offset = PIXEL_ALIGNMENT
+      frames = []
+      for index in range(numFrames):
+        array = np.ascontiguousarray(frameSource.readFrameArray(index))
+        size, spacing, origin, direction = frameSource.frameGeometry(index)
+        f.write(b"\0" * (offset - f.tell()))
+        f.write(array.tobytes())
+        frames.append({
+          "name": frameSource.frameName(index),
+          "file": imageFiles[index] if imageFiles is not None else "",
+          "spacing": [float(value) for value in spacing],
+          "origin": [float(value) for value in origin],
+          "direction": [float(value) for value in direction],
+          "shape": list(array.shape),
+          "dtype": array.dtype.str,
+          "offset": offset,
+          "time": float(frameTimes[index]) if frameTimes is not None else None,
+          "sourceIndex": int(sourceFrameIndices[index]),
+        })
+        offset = _alignOffset(offset + array.nbytes, FRAME_ALIGNMENT)
+        if progressCallback is not None and progressCallback(index + 1):
+          return False
+      metadataOffset = f.tell()
+      f.write(json.dumps({"frames": frames, "sourceFrameCount": int(numSourceFrames)}).encode("utf-8"))
+      f.seek(len(CINE_PACK_MAGIC))
+      f.write(struct.pack("<Q", metadataOffset))
+    completed = True
+  finally:
+    if not completed and os.path.exists(packPath):
+      os.remove(packPath)
+  return True
+
+
+class CinePackFrameSource():
+  """
+  Frame source reading the frames of a cine pack through a memory map. readFrameArray returns a
+  view into the mapped file, without copying the voxels.
+  """
+
+  def __init__(self, packPath):
+    """
+    :param packPath: path of the cine pack file
+    """
+    self.packPath = packPath
+    with open(packPath, "rb") as f:
+      if f.read(len(CINE_PACK_MAGIC)) != CINE_PACK_MAGIC:
+        raise ValueError(f"{os.path.basename(packPath)} is not a cine pack")
+      metadataOffset = struct.unpack("<Q", f.read(8))[0]
+      if metadataOffset == 0:
+        raise ValueError(f"{os.path.basename(packPath)} was not completely written")
+      f.seek(metadataOffset)
+      metadata = json.loads(f.read().decode("utf-8"))
+
+    self.frames = metadata["frames"]
+    self.sourceFrameCount = metadata.get("sourceFrameCount", len(self.frames))
+    # Copy-on-write mapping: the pack on disk can never be modified through the frames
+    self._voxels = np.memmap(packPath, dtype=np.uint8, mode="c", shape=(metadataOffset,))
+
+  def __len__(self):
+    return len(self.frames)
+
+  @property
+  def imageFiles(self):
+    return [frame["file"] for frame in self.frames]
+
+  @property
+  def frameTimes(self):
+    """
+    Acquisition time of every frame, in seconds, or None if the frames do not all have a time.
+    """
+    frameTimes = [frame.get("time") for frame in self.frames]
+    return None if None in frameTimes else frameTimes
+
+  @property
+  def frameSelection(self):
+    """
+    (index within the acquisition of every frame, number of frames of the acquisition) if only
+    some frames of the acquisition were packed, None otherwise.
+    """
+    indices = [frame.get("sourceIndex", index) for index, frame in enumerate(self.frames)]
+    if indices == list(range(self.sourceFrameCount)):
+      return None
+    return indices, self.sourceFrameCount
+
+  def frameName(self, index):
+    return self.frames[index]["name"]
+
+  def frameGeometry(self, index):
+    frame = self.frames[index]
+    shape = frame["shape"]
+    size = [shape[2], shape[1], shape[0]]
+    return size, frame["spacing"], frame["origin"], frame["direction"]
+
+  def readFrameArray(self, index):
+    frame = self.frames[index]
+    dtype = np.dtype(frame["dtype"])
+    numBytes = int(np.prod(frame["shape"])) * dtype.itemsize
+    return self._voxels[frame["offset"]:frame["offset"] + numBytes].view(dtype).reshape(frame["shape"])
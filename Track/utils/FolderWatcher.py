@@ -0,0 +1,145 @@
+import concurrent.futures
+import os
+import re
+import time
+
+import qt
+
+from utils import FrameIO
+
+
+class CineFolderWatcher():
+  """
+  Watches a directory that a scanner writes cine images into, and appends each new image to an
+  image sequence node as soon as it can be read. The images are decoded on a worker thread, and
+  only the volume nodes are created on the main thread. Files still being written fail to decode and
+  are retried on a short timer, so a frame is appended within one poll interval of being complete.
+  A file that still cannot be read after maxWaitMs is skipped, so it does not hold back the
+  following frames.
+  """
+
+  def __init__(self, directory, imagesSequenceNode, fileFormats, maxFrames=0, pollIntervalMs=50,
+               onFramesAdded=None, maxWaitMs=5000, onFileSkipped=None):
+    """
+    :param directory: directory to watch
+    :param imagesSequenceNode: sequence node the new frames are appended to
+    :param fileFormats: list of regular expressions matching the accepted image files
+    :param maxFrames: if greater than 0, the sequence works as a ring buffer keeping only the most
+    recent maxFrames frames, so memory stays bounded during long sessions
+    :param pollIntervalMs: delay before retrying files that could not be read yet
+    :param onFramesAdded: optional function called with the number of frames appended
+    :param maxWaitMs: time after which a file that cannot be read is skipped
+    :param onFileSkipped: optional function called with (path, error message) of every skipped file
+    """
+    self.directory = directory
+    self.imagesSequenceNode = imagesSequenceNode
+    self.fileFormats = fileFormats
+    self.maxFrames = maxFrames
+    self.onFramesAdded = onFramesAdded
+    self.maxWaitMs = maxWaitMs
+    self.onFileSkipped = onFileSkipped
+    # Files present when watching starts are considered already loaded
+    self.knownFiles = set(self._listImageFiles())
+    self.pendingFiles = []
+    self.skippedFiles = []
+    # Decoding of the pending files, and when each pending file first failed to decode
+    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self._decoding = {}
+    self._firstFailure = {}
+    # Index values keep increasing, even when the oldest frames are dropped from the ring buffer
+    numFrames = imagesSequenceNode.GetNumberOfDataNodes()
+    self.nextIndexValue = int(imagesSequenceNode.GetNthIndexValue(numFrames - 1)) + 1 if numFrames else 0
+
+    self.retryTimer = qt.QTimer()
+    self.retryTimer.setSingleShot(True)
+    self.retryTimer.setInterval(pollIntervalMs)
+    self.retryTimer.connect("timeout()", self.scan)
+
+    self.fileSystemWatcher = qt.QFileSystemWatcher()
+    self.fileSystemWatcher.addPath(directory)
+    self.fileSystemWatcher.connect("directoryChanged(QString)", lambda path: self.scan())
+
+  def stop(self):
+    """
+    Stops watching the directory.
+    """
+    self.retryTimer.stop()
+    self.fileSystemWatcher.removePath(self.directory)
+    self._executor.shutdown(wait=False, cancel_futures=True)
+    self._decoding.clear()
+
+  def _listImageFiles(self):
+    try:
+      names = os.listdir(self.directory)
+    except OSError:
+      return []
+    return [os.path.join(self.directory, name) for name in names
+            if any(re.match(format, name) for format in self.fileFormats)]
+
+  @staticmethod
+  def _decode(filepath):
+    # Only numpy arrays are created on the worker thread
+    image = FrameIO.readImage(filepath)
+    return FrameIO.arrayFromImage(image), FrameIO.geometryFromImage(image)
+
+  def scan(self, wait=False):
+    """
+    Looks for new image files and appends those that can be read, in file name order.
+    :param wait: whether to wait for the files being decoded, instead of checking them again on the
+    next poll
+    """
+    newFiles = [filepath for filepath in self._listImageFiles() if filepath not in self.knownFiles]
+    self.knownFiles.update(newFiles)
+    self.pendingFiles = sorted(self.pendingFiles + newFiles)
+    for filepath in self.pendingFiles:
+      if filepath not in self._decoding:
+        self._decoding[filepath] = self._executor.submit(self._decode, filepath)
+
+    numAdded = 0
+    while self.pendingFiles:
+      filepath = self.pendingFiles[0]
+      future = self._decoding[filepath]
+      if wait:
+        concurrent.futures.wait([future])
+      if not future.done():
+        break
+      try:
+        array, geometry = future.result()
+      except RuntimeError as e:
+        # The file is most likely still being written. Frames are appended in order, so the
+        # following files wait for it, unless it cannot be read for too long.
+        del self._decoding[filepath]
+        firstFailure = self._firstFailure.setdefault(filepath, time.monotonic())
+        if (time.monotonic() - firstFailure) * 1000.0 < self.maxWaitMs:
+          break
+        self._skipFile(filepath, str(e))
+        continue
+      self.pendingFiles.pop(0)
+      del self._decoding[filepath]
+      self._firstFailure.pop(filepath, None)
+      self._appendFrame(array, geometry, filepath)
+      numAdded += 1
+
+    if self.pendingFiles:
+      self.retryTimer.start()
+    if numAdded and self.onFramesAdded is not None:
+      self.onFramesAdded(numAdded)
+
+  def _skipFile(self, filepath, message):
+    self.pendingFiles.pop(0)
+    self._firstFailure.pop(filepath, None)
+    self.skippedFiles.append(filepath)
+    if self.onFileSkipped is not None:
+      self.onFileSkipped(filepath, message)
+    else:
+      print(f"{os.path.basename(filepath)} could not be read and was skipped: {message}")
+
+  def _appendFrame(self, array, geometry, filepath):
+    nodeName = f"Image {self.nextIndexValue + 1} ({os.path.basename(filepath)})"
+    imageNode = FrameIO.volumeNodeFromArray(array, *geometry, nodeName)
+    self.imagesSequenceNode.SetDataNodeAtValue(imageNode, str(self.nextIndexValue))
+    self.nextIndexValue += 1
+
+    if self.maxFrames > 0:
+      while self.imagesSequenceNode.GetNumberOfDataNodes() > self.maxFrames:
+        self.imagesSequenceNode.RemoveDataNodeAtValue(self.imagesSequenceNode.GetNthIndexValue(0))
@@ -0,0 +1,184 @@
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from utils import FrameIO
+
+
+class FrameLRUCache():
+  """
+  Bounded, thread-safe, least-recently-used cache of decoded cine frames, keyed by frame index.
+  """
+
+  def __init__(self, capacity):
+    """
+    :param capacity: maximum number of frames kept in memory
+    """
+    self.capacity = max(1, int(capacity))
+    self._frames = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def __contains__(self, key):
+    with self._lock:
+      return key in self._frames
+
+  def __len__(self):
+    with self._lock:
+      return len(self._frames)
+
+  def get(self, key):
+    """
+    Returns the cached frame (marking it as most recently used), or None if it is not cached.
+    """
+    with self._lock:
+      frame = self._frames.get(key)
+      if frame is not None:
+        self._frames.move_to_end(key)
+      return frame
+
+  def put(self, key, frame):
+    """
+    Stores a frame, evicting the least recently used frames once the capacity is exceeded.
+    """
+    with self._lock:
+      self._frames[key] = frame
+      self._frames.move_to_end(key)
+      while len(self._frames) > self.capacity:
+        self._frames.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._frames.clear()
+
+
+class DiskFrameCache():
+  """
+  Persistent on-disk cache of decoded cine frames. Frames are keyed by the identity of their source
+  file (absolute path, size and modification time), so a modified file is decoded again. Once the
+  cache grows beyond its size cap, the least recently used frames are evicted. The order of use and
+  the size of the cached frames are kept in memory, so evicting does not scan the cache directory.
+  """
+
+  def __init__(self, directory, maxBytes):
+    """
+    :param directory: directory holding the cached frames (created if needed)
+    :param maxBytes: maximum total size of the cached frames
+    """
+    self.directory = directory
+    self.maxBytes = int(maxBytes)
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+    os.makedirs(directory, exist_ok=True)
+    # Size of every cached frame by file name, least recently used first. The modification time of
+    # a cached frame records when it was last used, in previous sessions.
+    self._entries = collections.OrderedDict()
+    entries = [(entry.stat(), entry.name) for entry in os.scandir(directory) if entry.name.endswith(".npy")]
+    for stat, name in sorted(entries, key=lambda entry: entry[0].st_mtime):
+      self._entries[name] = stat.st_size
+    self._totalBytes = sum(self._entries.values())
+
+  def _cachePath(self, filepath, region=None):
+    stat = os.stat(filepath)
+    identity = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}"
+    if region is not None:
+      identity += f"|{list(region[0])}|{list(region[1])}"
+    return os.path.join(self.directory, hashlib.sha1(identity.encode("utf-8")).hexdigest() + ".npy")
+
+  def get(self, filepath, region=None):
+    """
+    Returns the cached voxels of an image file, or None if the file is not cached or has changed.
+    :param filepath: path to the source image file
+    :param region: optional (index, size) of the cached region of the image
+    """
+    cachePath = self._cachePath(filepath, region)
+    try:
+      array = np.load(cachePath)
+      # The modification time of a cached frame records when it was last used
+      os.utime(cachePath)
+    except (OSError, ValueError):
+      with self._lock:
+        self.misses += 1
+      return None
+    with self._lock:
+      self.hits += 1
+      name = os.path.basename(cachePath)
+      if name in self._entries:
+        self._entries.move_to_end(name)
+    return array
+
+  def put(self, filepath, array, region=None):
+    """
+    Stores the voxels of an image file, then evicts the least recently used frames if needed.
+    :param filepath: path to the source image file
+    :param array: decoded voxels of the file
+    :param region: optional (index, size) of the region of the image the voxels were read from
+    """
+    cachePath = self._cachePath(filepath, region)
+    temporaryPath = f"{cachePath}.{threading.get_ident()}.tmp"
+    name = os.path.basename(cachePath)
+    try:
+      with open(temporaryPath, "wb") as f:
+        np.save(f, array)
+      size = os.path.getsize(temporaryPath)
+      with self._lock:
+        os.replace(temporaryPath, cachePath)
+        # A frame cached again replaces the previous file
+        self._totalBytes += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+        self._evict()
+    except OSError:
+      # A full or read-only disk only means the frame is decoded again next time
+      if os.path.exists(temporaryPath):
+        os.remove(temporaryPath)
+
+  def _evict(self):
+    while self._totalBytes > self.maxBytes and self._entries:
+      name, size = self._entries.popitem(last=False)
+      self._totalBytes -= size
+      try:
+        os.remove(os.path.join(self.directory, name))
+      except OSError:
+        pass
+
+  def clear(self):
+    """
+    Removes every cached frame and resets the statistics.
+    """
+    with self._lock:
+      for entry in os.scandir(self.directory):
+        if entry.name.endswith(".npy"):
+          os.remove(entry.path)
+      self._entries.clear()
+      self._totalBytes = 0
+      self.hits = 0
+      self.misses = 0
+
+  def statistics(self):
+    """
+    Returns a dictionary with the number of cache hits and misses, and the size of the cache.
+    """
+    with self._lock:
+      return {"hits": self.hits, "misses": self.misses,
+              "bytes": self._totalBytes, "maxBytes": self.maxBytes}
+
+
+def readFrameArray(filepath, diskCache=None, region=None):
+  """
+  Returns the decoded voxels of an image file as a [k, j, i] numpy array, served from the disk
+  cache when the file has not changed since it was cached.
+  :param filepath: path to the image file
+  :param diskCache: optional DiskFrameCache
+  :param region: optional (index, size) of the region of the image to read (see FrameIO.readImage)
+  """
+  if diskCache is not None:
+    array = diskCache.get(filepath, region)
+    if array is not None:
+      return array
+  array = FrameIO.arrayFromImage(FrameIO.readImage(filepath, region))
+  if diskCache is not None:
+    diskCache.put(filepath, array, region)
+  return array
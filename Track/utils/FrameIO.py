@@ -0,0 +1,365 @@
+import datetime
+import re
+
+import slicer
+import vtk
+from vtk.util import numpy_support
+
+import numpy as np
+import SimpleITK as sitk
+
+# 3D Slicer works in RAS while ITK/SimpleITK images are described in LPS. Flipping the first two
+# axes converts between them (see TrackLogic.createTransformNodesFromTransformData for details).
+LPS_TO_RAS = np.diag([-1.0, -1.0, 1.0])
+
+
+def readImage(filepath, region=None):
+  """
+  Decodes a single cine image file with SimpleITK. This is safe to call from worker threads since
+  SimpleITK releases the GIL while reading.
+  :param filepath: path to the image file
+  :param region: optional (index, size) of the region to read, 3 values each. Formats supporting
+  streaming (e.g. .mha, .nrrd) then only read that region from disk
+  """
+  if region is None:
+    return sitk.ReadImage(filepath)
+  reader = readImageInformation(filepath)
+  dimension = reader.GetDimension()
+  index, size = region
+  reader.SetExtractIndex([int(value) for value in index[:dimension]])
+  reader.SetExtractSize([int(value) for value in size[:dimension]])
+  return reader.Execute()
+
+
+def geometryFromImage(image):
+  """
+  Returns the (spacing, origin, direction) of a SimpleITK image, in LPS, always expressed in 3D.
+  2D images are treated as a single slice volume, which is how 3D Slicer loads them.
+  :param image: SimpleITK image
+  """
+  spacing = list(image.GetSpacing())
+  origin = list(image.GetOrigin())
+  direction = list(image.GetDirection())
+  if image.GetDimension() == 2:
+    spacing.append(1.0)
+    origin.append(0.0)
+    direction = [direction[0], direction[1], 0.0,
+                 direction[2], direction[3], 0.0,
+                 0.0, 0.0, 1.0]
+  return spacing, origin, direction
+
+
+def arrayFromImage(image):
+  """
+  Returns the voxels of a SimpleITK image as a numpy array indexed [k, j, i] (the same layout
+  as slicer.util.arrayFromVolume). 2D images get a leading axis of size 1.
+  :param image: SimpleITK image
+  """
+  array = sitk.GetArrayFromImage(image)
+  if image.GetDimension() == 2:
+    array = array[np.newaxis, ...]
+  return array
+
+
+def ijkToRASMatrix(spacing, origin, direction):
+  """
+  Builds the IJK to RAS vtkMatrix4x4 of a volume from its LPS geometry.
+  :param spacing: voxel spacing (3 values)
+  :param origin: LPS origin (3 values)
+  :param direction: row-major 3x3 LPS direction cosines (9 values)
+  """
+  matrix = np.eye(4)
+  matrix[:3, :3] = LPS_TO_RAS @ np.array(direction, dtype=float).reshape(3, 3) @ np.diag(spacing)
+  matrix[:3, 3] = LPS_TO_RAS @ np.array(origin, dtype=float)
+  return slicer.util.vtkMatrixFromArray(matrix)
+
+
+def imageDataFromArray(array):
+  """
+  Wraps a [k, j, i] numpy array as vtkImageData without copying the voxels. The numpy array is
+  kept alive by the returned object.
+  :param array: numpy array of shape (k, j, i) or (k, j, i, components)
+  """
+  array = np.ascontiguousarray(array)
+  components = array.shape[3] if array.ndim == 4 else 1
+  imageData = vtk.vtkImageData()
+  imageData.SetDimensions(array.shape[2], array.shape[1], array.shape[0])
+  vtkArray = numpy_support.numpy_to_vtk(array.reshape(-1, components) if components > 1 else array.ravel(),
+                                        deep=False)
+  imageData.GetPointData().SetScalars(vtkArray)
+  return imageData
+
+
+def volumeNodeFromArray(array, spacing, origin, direction, name):
+  """
+  Creates a scalar volume node, outside of the MRML scene, holding the provided voxels.
+  The node has no display or storage nodes, which is all a sequence node needs to store a frame.
+  :param array: numpy array indexed [k, j, i]
+  :param spacing: voxel spacing (3 values)
+  :param origin: LPS origin (3 values)
+  :param direction: row-major 3x3 LPS direction cosines (9 values)
+  :param name: name of the created node
+  """
+  volumeNode = slicer.vtkMRMLScalarVolumeNode()
+  volumeNode.SetName(name)
+  volumeNode.SetIJKToRASMatrix(ijkToRASMatrix(spacing, origin, direction))
+  volumeNode.SetAndObserveImageData(imageDataFromArray(array))
+  return volumeNode
+
+
+def volumeNodeFromImage(image, name):
+  """
+  Creates a scalar volume node, outside of the MRML scene, holding the provided SimpleITK image.
+  :param image: SimpleITK image
+  :param name: name of the created node
+  """
+  spacing, origin, direction = geometryFromImage(image)
+  return volumeNodeFromArray(arrayFromImage(image), spacing, origin, direction, name)
+
+
+# Candidate types when narrowing integer voxels, from the smallest
+NARROW_INTEGER_DTYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32]
+
+
+def narrowestDtype(array):
+  """
+  Returns the smallest numpy dtype able to hold every voxel of the array exactly. Integer voxels are
+  checked against the range of each candidate type. Floating point voxels are narrowed to an integer
+  type only if they all hold integer values, and from double to single precision only if the
+  conversion is exact. The dtype of the array is returned if nothing smaller fits.
+  :param array: numpy array
+  """
+  if array.size == 0 or array.dtype.kind not in "iuf":
+    return array.dtype
+
+  isIntegral = array.dtype.kind in "iu"
+  if array.dtype.kind == "f" and np.isfinite(array).all():
+    isIntegral = np.array_equal(array, np.trunc(array))
+
+  if isIntegral:
+    minimum, maximum = array.min(), array.max()
+    for dtype in NARROW_INTEGER_DTYPES:
+      if np.dtype(dtype).itemsize >= array.dtype.itemsize:
+        break
+      if np.iinfo(dtype).min <= minimum and maximum <= np.iinfo(dtype).max:
+        return np.dtype(dtype)
+  elif array.dtype == np.float64 and np.array_equal(array.astype(np.float32), array, equal_nan=True):
+    return np.dtype(np.float32)
+  return array.dtype
+
+
+def narrowArray(array):
+  """
+  Returns the array converted to its narrowest dtype (see narrowestDtype), without any loss.
+  :param array: numpy array
+  """
+  dtype = narrowestDtype(array)
+  return array if dtype == array.dtype else array.astype(dtype)
+
+
+def readImageInformation(filepath):
+  """
+  Reads only the header of an image file (no pixel data) and returns the SimpleITK reader, which
+  exposes GetSize(), GetSpacing(), GetOrigin(), GetDirection() and the metadata dictionary.
+  :param filepath: path to the image file
+  """
+  reader = sitk.ImageFileReader()
+  reader.SetFileName(filepath)
+  reader.ReadImageInformation()
+  return reader
+
+
+def isMultiFrameImage(filepath):
+  """
+  Returns True if a single image file holds a whole cine: a multi-frame DICOM or a 3D image whose
+  third axis is time (2D+t), or a 4D image whose fourth axis is time. Only the header is read.
+  :param filepath: path to the image file
+  """
+  try:
+    reader = readImageInformation(filepath)
+  except RuntimeError:
+    return False
+  size = reader.GetSize()
+  return (reader.GetDimension() == 3 and size[2] > 1) or (reader.GetDimension() == 4 and size[3] > 1)
+
+
+def regionFromRASBounds(bounds, size, spacing, origin, direction):
+  """
+  Returns the (index, size) of the voxels of a frame lying within RAS bounds, or None if the bounds
+  cover the whole frame or do not intersect it. Only the in-plane axes of 2D frames are cropped.
+  :param bounds: RAS bounds [xmin, xmax, ymin, ymax, zmin, zmax]
+  :param size: frame size (3 values)
+  :param spacing: voxel spacing (3 values)
+  :param origin: LPS origin (3 values)
+  :param direction: row-major 3x3 LPS direction cosines (9 values)
+  """
+  # Continuous indices of the 8 corners of the bounds
+  corners = np.array([[x, y, z] for x in bounds[0:2] for y in bounds[2:4] for z in bounds[4:6]])
+  cornersLPS = corners @ LPS_TO_RAS
+  indexToLPS = np.array(direction, dtype=float).reshape(3, 3) @ np.diag(spacing)
+  indices = (cornersLPS - np.array(origin, dtype=float)) @ np.linalg.inv(indexToLPS).T
+
+  size = list(size)
+  start = np.clip(np.floor(indices.min(axis=0) + 0.5), 0, size).astype(int)
+  end = np.clip(np.ceil(indices.max(axis=0) + 0.5), 0, size).astype(int)
+  for axis in range(3):
+    if size[axis] == 1:
+      start[axis], end[axis] = 0, 1
+  if np.any(end <= start):
+    return None
+  regionSize = (end - start).tolist()
+  if regionSize == size:
+    return None
+  return start.tolist(), regionSize
+
+
+def croppedGeometry(region, spacing, origin, direction):
+  """
+  Returns the (size, spacing, origin, direction) of a region of a frame, in LPS.
+  :param region: (index, size) of the region, 3 values each
+  :param spacing: voxel spacing (3 values)
+  :param origin: LPS origin (3 values)
+  :param direction: row-major 3x3 LPS direction cosines (9 values)
+  """
+  index, size = region
+  indexToLPS = np.array(direction, dtype=float).reshape(3, 3) @ np.diag(spacing)
+  croppedOrigin = (np.array(origin, dtype=float) + indexToLPS @ np.array(index, dtype=float)).tolist()
+  return list(size), list(spacing), croppedOrigin, list(direction)
+
+
+def placeholderVolumeNode(size, spacing, origin, direction, name):
+  """
+  Creates a scalar volume node, outside of the MRML scene, with the geometry of a frame but without
+  any voxels allocated. It stands in for a frame whose pixels are decoded on demand.
+  :param size: image size (2 or 3 values)
+  :param spacing: voxel spacing (3 values)
+  :param origin: LPS origin (3 values)
+  :param direction: row-major 3x3 LPS direction cosines (9 values)
+  :param name: name of the created node
+  """
+  size = list(size) + [1] * (3 - len(size))
+  imageData = vtk.vtkImageData()
+  imageData.SetDimensions(*size)
+  volumeNode = slicer.vtkMRMLScalarVolumeNode()
+  volumeNode.SetName(name)
+  volumeNode.SetIJKToRASMatrix(ijkToRASMatrix(spacing, origin, direction))
+  volumeNode.SetAndObserveImageData(imageData)
+  return volumeNode
+
+
+# Slice view orientation showing the images whose normal is along the R, A or S axis
+SLICE_ORIENTATIONS = ("Sagittal", "Coronal", "Axial")
+
+
+def sliceOrientation(size, direction):
+  """
+  Returns the orientation of the slice view showing a frame ("Sagittal", "Coronal" or "Axial"),
+  from its geometry only. The normal of the frame is its single-voxel axis, or the K axis if it
+  has none, and the orientation is given by the anatomical axis the normal is closest to.
+  :param size: image size (3 values)
+  :param direction: row-major 3x3 direction cosines (9 values), in LPS or RAS
+  """
+  normalAxis = 2
+  if size[2] != 1:
+    if size[0] == 1:
+      normalAxis = 0
+    elif size[1] == 1:
+      normalAxis = 1
+  normal = np.abs(np.array(direction, dtype=float).reshape(3, 3)[:, normalAxis])
+  return SLICE_ORIENTATIONS[int(np.argmax(normal))]
+
+
+# DICOM tags used to order the frames of a cine acquisition
+DICOM_ACQUISITION_DATE = "0008|0022"
+DICOM_ACQUISITION_TIME = "0008|0032"
+DICOM_CONTENT_TIME = "0008|0033"
+DICOM_TRIGGER_TIME = "0018|1060"
+DICOM_INSTANCE_NUMBER = "0020|0013"
+
+
+def _dicomTimeToSeconds(value):
+  """
+  Converts a DICOM TM value (HHMMSS.FFFFFF) into seconds since midnight. Returns None if invalid.
+  """
+  value = value.strip().replace(":", "")
+  try:
+    hours = int(value[0:2])
+    minutes = int(value[2:4]) if len(value) >= 4 else 0
+    seconds = float(value[4:]) if len(value) > 4 else 0.0
+  except ValueError:
+    return None
+  return hours * 3600 + minutes * 60 + seconds
+
+
+def _metaData(reader, key):
+  return reader.GetMetaData(key).strip() if reader.HasMetaDataKey(key) else ""
+
+
+def readFrameHeader(filepath):
+  """
+  Reads the header of a cine image file (no pixel data) into a compact dictionary holding its
+  geometry (in LPS), pixel type, the number of bytes its voxels need and, for DICOM files, its
+  acquisition time (in seconds) and instance number.
+  :param filepath: path to the image file
+  """
+  reader = readImageInformation(filepath)
+  spacing, origin, direction = geometryFromImage(reader)
+  size = list(reader.GetSize()) + [1] * (3 - reader.GetDimension())
+
+  pixelType = sitk.GetPixelIDValueAsString(reader.GetPixelID())
+  bits = re.search("([0-9]+)-bit", pixelType)
+  bytesPerComponent = int(bits.group(1)) // 8 if bits else 1
+  numBytes = size[0] * size[1] * size[2] * reader.GetNumberOfComponents() * bytesPerComponent
+
+  # The acquisition time is preferred, then the content time. The trigger time (in ms) is relative
+  # to the R-wave and only used when neither is available.
+  acquisitionTime = None
+  for key in (DICOM_ACQUISITION_TIME, DICOM_CONTENT_TIME):
+    if _metaData(reader, key):
+      acquisitionTime = _dicomTimeToSeconds(_metaData(reader, key))
+      if acquisitionTime is not None:
+        break
+  if acquisitionTime is not None and _metaData(reader, DICOM_ACQUISITION_DATE):
+    try:
+      date = _metaData(reader, DICOM_ACQUISITION_DATE)
+      days = datetime.date(int(date[0:4]), int(date[4:6]), int(date[6:8])).toordinal()
+      acquisitionTime += days * 86400
+    except ValueError:
+      pass
+  if acquisitionTime is None and _metaData(reader, DICOM_TRIGGER_TIME):
+    try:
+      acquisitionTime = float(_metaData(reader, DICOM_TRIGGER_TIME)) / 1000.0
+    except ValueError:
+      pass
+
+  try:
+    instanceNumber = int(_metaData(reader, DICOM_INSTANCE_NUMBER))
+  except ValueError:
+    instanceNumber = None
+
+  return {
+    "path": filepath,
+    "size": size,
+    "spacing": spacing,
+    "origin": origin,
+    "direction": direction,
+    "pixelType": pixelType,
+    "components": reader.GetNumberOfComponents(),
+    "bytes": numBytes,
+    "acquisitionTime": acquisitionTime,
+    "instanceNumber": instanceNumber,
+  }
+
+
+def geometryFromVolumeNode(volumeNode):
+  """
+  Returns the (size, spacing, origin, direction) of a volume node, converted to LPS so that it
+  matches the geometry read from image files.
+  :param volumeNode: scalar volume node
+  """
+  directionsRAS = np.zeros((3, 3))
+  volumeNode.GetIJKToRASDirections(directionsRAS)
+  direction = (LPS_TO_RAS @ directionsRAS).ravel().tolist()
+  origin = (LPS_TO_RAS @ np.array(volumeNode.GetOrigin())).tolist()
+  size = list(volumeNode.GetImageData().GetDimensions())
+  return size, list(volumeNode.GetSpacing()), origin, direction
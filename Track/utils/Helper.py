@@ -41,4 +41,48 @@ class SpinBox(qt.QSpinBox):
         if steps > 0:
             self.upButtonClicked.emit() # emit upButtonClicked if value on QSpinBox increased
         elif steps < 0:
-            self.downButtonClicked.emit() # emit downButtonClicked if value on QSpinBox decreased
\ No newline at end of file
+            self.downButtonClicked.emit() # emit downButtonClicked if value on QSpinBox decreased
+
+class ProgressReporter():
+    """
+    Reports the progress of a long operation, either through a progress dialog or, for scripted and
+    batch use, through a callback. The callback is called with (labelText, value, maximum) and may
+    return True to cancel the operation. Nothing is shown or rendered when a callback is used.
+    """
+    def __init__(self, labelText, maximum, progressCallback=None, renderScheduler=None):
+        self.labelText = labelText
+        self.maximum = maximum
+        self.progressCallback = progressCallback
+        # Coalesces the renders requested with each step (see RenderScheduler)
+        self.renderScheduler = renderScheduler
+        self.canceled = False
+        self.progressDialog = None
+        if progressCallback is None:
+            self.progressDialog = qt.QProgressDialog(labelText, "Cancel", 0, maximum)
+            self.progressDialog.minimumDuration = 0
+
+    @property
+    def wasCanceled(self):
+        if self.progressDialog is not None:
+            return self.progressDialog.wasCanceled
+        return self.canceled
+
+    def setValue(self, value, render=False):
+        """
+        :param value: number of steps completed
+        :param render: whether to render all views, so the progress dialog visually updates in the GUI
+        """
+        if self.progressDialog is not None:
+            self.progressDialog.setValue(value)
+            if render and self.renderScheduler is not None:
+                self.renderScheduler.requestRender()
+            elif render:
+                slicer.util.forceRenderAllViews()
+            slicer.app.processEvents()
+        elif self.progressCallback(self.labelText, value, self.maximum):
+            self.canceled = True
+
+    def processEvents(self):
+        # Keeps the progress dialog (and its 'Cancel' button) responsive while waiting
+        if self.progressDialog is not None:
+            slicer.app.processEvents()
@@ -0,0 +1,266 @@
+import os
+import concurrent.futures
+import threading
+
+import slicer
+
+import numpy as np
+import SimpleITK as sitk
+
+from utils import FrameIO
+from utils.FrameCache import FrameLRUCache, readFrameArray
+
+
+class FileFrameSource():
+  """
+  Frame source backed by one image file per frame. Frame sources provide the geometry of every
+  frame without decoding it, and decode the voxels of a single frame on request.
+  """
+
+  def __init__(self, imageFiles, headers=None, diskCache=None, cropBox=None):
+    """
+    :param imageFiles: ordered list of image file paths, one per frame
+    :param headers: optional list of frame headers (see FrameIO.readFrameHeader) matching imageFiles,
+    so the files do not need to be opened again to get their geometry
+    :param diskCache: optional DiskFrameCache serving frames decoded in previous sessions
+    :param cropBox: optional RAS bounds [xmin, xmax, ymin, ymax, zmin, zmax]. Only the voxels of each
+    frame within the bounds are read and kept
+    """
+    self.imageFiles = list(imageFiles)
+    self.headers = headers
+    self.diskCache = diskCache
+    self.cropBox = cropBox
+    self._regions = {}
+
+  def __len__(self):
+    return len(self.imageFiles)
+
+  def frameName(self, index):
+    return f"Image {index + 1} ({os.path.basename(self.imageFiles[index])})"
+
+  def _fileGeometry(self, index):
+    if self.headers is not None:
+      header = self.headers[index]
+      return header["size"], header["spacing"], header["origin"], header["direction"]
+    reader = FrameIO.readImageInformation(self.imageFiles[index])
+    spacing, origin, direction = FrameIO.geometryFromImage(reader)
+    return list(reader.GetSize()) + [1] * (3 - reader.GetDimension()), spacing, origin, direction
+
+  def _region(self, index):
+    """
+    Returns the (index, size) of the region of a frame within the crop box, or None to read it all.
+    """
+    if self.cropBox is None:
+      return None
+    if index not in self._regions:
+      self._regions[index] = FrameIO.regionFromRASBounds(self.cropBox, *self._fileGeometry(index))
+    return self._regions[index]
+
+  def frameGeometry(self, index):
+    """
+    Returns the (size, spacing, origin, direction) of a frame, in LPS, read from the file header.
+    """
+    size, spacing, origin, direction = self._fileGeometry(index)
+    region = self._region(index)
+    if region is None:
+      return size, spacing, origin, direction
+    return FrameIO.croppedGeometry(region, spacing, origin, direction)
+
+  def readFrameArray(self, index):
+    """
+    Decodes a frame and returns its voxels as a [k, j, i] numpy array. Called from worker threads.
+    """
+    return readFrameArray(self.imageFiles[index], self.diskCache, self._region(index))
+
+
+class MultiFrameFrameSource():
+  """
+  Frame source backed by a single file holding the whole cine (see FrameIO.isMultiFrameImage). The
+  file is decoded once and readFrameArray returns views into the decoded buffer, so there is no
+  per-frame file I/O. Only frames loaded on demand stay views into the buffer: frames loaded eagerly
+  are copied by the sequence node, like the frames of any other source.
+  """
+
+  def __init__(self, filepath, cropBox=None):
+    """
+    :param filepath: path to the multi-frame DICOM, 2D+t or 3D+t image file
+    :param cropBox: optional RAS bounds [xmin, xmax, ymin, ymax, zmin, zmax]. Only the voxels within
+    the bounds are kept once the file is decoded
+    """
+    self.filepath = filepath
+    image = FrameIO.readImage(filepath)
+    dimension = image.GetDimension()
+    self.timeAxis = dimension - 1
+    # Indexed [t, j, i] for a 2D+t image and [t, k, j, i] for a 3D+t image
+    self.pixels = sitk.GetArrayFromImage(image)
+    spacing = list(image.GetSpacing())
+    origin = list(image.GetOrigin())
+    direction = list(image.GetDirection())
+    if dimension == 3:
+      self.size = [image.GetSize()[0], image.GetSize()[1], 1]
+      # Every frame is a single slice at the origin of the acquisition plane
+      self.spacing = spacing[:2] + [1.0]
+      self.origin = origin
+      self.direction = direction
+    else:
+      self.size = list(image.GetSize()[:3])
+      self.spacing = spacing[:3]
+      self.origin = origin[:3]
+      self.direction = [direction[row * 4 + column] for row in range(3) for column in range(3)]
+    # The spacing along the time axis, when the file provides one
+    self.frameInterval = spacing[self.timeAxis]
+    # Index of every frame within the file
+    self.frameNumbers = list(range(self.pixels.shape[0]))
+
+    region = FrameIO.regionFromRASBounds(cropBox, self.size, self.spacing, self.origin,
+                                         self.direction) if cropBox is not None else None
+    if region is not None:
+      (i, j, k), (sizeI, sizeJ, sizeK) = region
+      if self.timeAxis == 2:
+        pixels = self.pixels[:, j:j + sizeJ, i:i + sizeI]
+      else:
+        pixels = self.pixels[:, k:k + sizeK, j:j + sizeJ, i:i + sizeI]
+      # Copy the region so the buffer holding the whole frames is released
+      self.pixels = np.ascontiguousarray(pixels)
+      self.size, self.spacing, self.origin, self.direction = \
+        FrameIO.croppedGeometry(region, self.spacing, self.origin, self.direction)
+
+  def __len__(self):
+    return self.pixels.shape[0]
+
+  def selectFrames(self, frameIndices):
+    """
+    Only keeps some of the frames, releasing the others.
+    :param frameIndices: indices of the frames to keep, in order
+    """
+    if list(frameIndices) == list(range(len(self))):
+      return
+    self.frameNumbers = [self.frameNumbers[index] for index in frameIndices]
+    self.pixels = np.ascontiguousarray(self.pixels[list(frameIndices)])
+
+  @property
+  def imageFiles(self):
+    return [self.filepath] * len(self)
+
+  def frameName(self, index):
+    return f"Image {index + 1} ({os.path.basename(self.filepath)} frame {self.frameNumbers[index] + 1})"
+
+  def frameGeometry(self, index):
+    return self.size, self.spacing, self.origin, self.direction
+
+  def readFrameArray(self, index):
+    # Frames of a 2D+t image get a leading axis of size 1, like FrameIO.arrayFromImage
+    return self.pixels[index][None, ...] if self.timeAxis == 2 else self.pixels[index]
+
+
+class SequenceFrameSource():
+  """
+  Frame source reading the frames already decoded within an image sequence node.
+  """
+
+  def __init__(self, sequenceNode):
+    """
+    :param sequenceNode: sequence node containing fully loaded image nodes
+    """
+    self.sequenceNode = sequenceNode
+
+  def __len__(self):
+    return self.sequenceNode.GetNumberOfDataNodes()
+
+  def frameName(self, index):
+    return self.sequenceNode.GetNthDataNode(index).GetName()
+
+  def frameGeometry(self, index):
+    return FrameIO.geometryFromVolumeNode(self.sequenceNode.GetNthDataNode(index))
+
+  def readFrameArray(self, index):
+    return slicer.util.arrayFromVolume(self.sequenceNode.GetNthDataNode(index))
+
+
+class LazyFrameSequence():
+  """
+  Keeps only a bounded window of decoded frames in memory for an image sequence node whose items
+  are placeholders (geometry only). The selected frame is decoded when the sequence browser selects
+  it, and the frames ahead of the playhead are prefetched on worker threads. The worker threads only
+  decode numpy arrays: the vtkImageData wrapping them is created on the main thread, since VTK
+  objects must not be created from other threads.
+  """
+
+  # Number of vtkImageData kept for the most recently requested frames, so requesting a frame again
+  # returns the same object
+  IMAGE_DATA_CACHE_SIZE = 4
+
+  def __init__(self, sequenceNode, frameSource, cacheSize=64, numWorkers=2):
+    """
+    :param sequenceNode: sequence node holding the placeholder frames
+    :param frameSource: object providing frameName, frameGeometry and readFrameArray
+    :param cacheSize: maximum number of decoded frames kept in memory
+    :param numWorkers: number of threads used to prefetch frames
+    """
+    self.sequenceNode = sequenceNode
+    self.frameSource = frameSource
+    # Decoded voxels, shared with the worker threads
+    self.cache = FrameLRUCache(cacheSize)
+    # (voxels, vtkImageData wrapping them) of the most recently requested frames, main thread only
+    self._imageData = FrameLRUCache(self.IMAGE_DATA_CACHE_SIZE)
+    # Prefetch at most half of the cache ahead of the playhead, so recently shown frames survive
+    self.prefetchCount = max(0, self.cache.capacity // 2 - 1)
+    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, numWorkers))
+    self._pending = {}
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self.frameSource)
+
+  def shutdown(self):
+    """
+    Stops prefetching and releases the decoded frames.
+    """
+    self._executor.shutdown(wait=False, cancel_futures=True)
+    self._pending.clear()
+    self.cache.clear()
+    self._imageData.clear()
+
+  def _decode(self, index):
+    try:
+      array = self.frameSource.readFrameArray(index)
+      self.cache.put(index, array)
+      return array
+    finally:
+      with self._lock:
+        self._pending.pop(index, None)
+
+  def _prefetch(self, index):
+    with self._lock:
+      if index in self._pending or index in self.cache:
+        return
+      self._pending[index] = self._executor.submit(self._decode, index)
+
+  def getImageData(self, index):
+    """
+    Returns the decoded vtkImageData of a frame, decoding it now if it is not already cached, and
+    schedules the decoding of the following frames. Must be called from the main thread.
+    :param index: index of the frame within the sequence
+    """
+    array = self.cache.get(index)
+    if array is None:
+      with self._lock:
+        future = self._pending.get(index)
+        # A prefetch may have finished since the cache was checked
+        if future is None:
+          array = self.cache.get(index)
+      # The decoded voxels are used even if the frame was evicted from the cache in the meantime
+      if future is not None:
+        array = future.result()
+      elif array is None:
+        array = self._decode(index)
+
+    wrapped = self._imageData.get(index)
+    if wrapped is None or wrapped[0] is not array:
+      wrapped = (array, FrameIO.imageDataFromArray(array))
+      self._imageData.put(index, wrapped)
+    imageData = wrapped[1]
+
+    for nextIndex in range(index + 1, min(index + 1 + self.prefetchCount, len(self))):
+      self._prefetch(nextIndex)
+    return imageData
@@ -0,0 +1,120 @@
+import concurrent.futures
+
+import numpy as np
+
+
+def overlayMask(labelArray, rasToLabelIJK, frameIJKToRAS, frameShape):
+  """
+  Returns the intersection of a label map with the plane of a frame, as a boolean mask on the voxel
+  grid of the frame. Every voxel of the frame takes the value of the nearest voxel of the label
+  map, the way slice views reslice label maps. The voxel coordinates are computed for the whole
+  frame at once, by broadcasting along its axes.
+  :param labelArray: voxels of the label map, indexed [k, j, i]
+  :param rasToLabelIJK: 4x4 matrix mapping RAS coordinates to the voxel coordinates of the label map,
+  through the transform applied to the label map
+  :param frameIJKToRAS: 4x4 IJK to RAS matrix of the frame
+  :param frameShape: shape of the voxels of the frame, indexed [k, j, i]
+  """
+  frameToLabel = rasToLabelIJK @ frameIJKToRAS
+  axes = [np.arange(size, dtype=np.float64) for size in frameShape[::-1]]
+  i = axes[0][np.newaxis, np.newaxis, :]
+  j = axes[1][np.newaxis, :, np.newaxis]
+  k = axes[2][:, np.newaxis, np.newaxis]
+  mask = np.ones(frameShape, dtype=bool)
+  indices = []
+  for axis in range(3):
+    coordinates = np.rint(frameToLabel[axis, 0] * i + frameToLabel[axis, 1] * j + frameToLabel[axis, 2] * k +
+                          frameToLabel[axis, 3])
+    # The label map is indexed [k, j, i]
+    mask &= (coordinates >= 0) & (coordinates < labelArray.shape[2 - axis])
+    indices.append(coordinates)
+  inside = np.nonzero(mask)
+  mask[inside] = labelArray[indices[2][inside].astype(np.intp), indices[1][inside].astype(np.intp),
+                            indices[0][inside].astype(np.intp)] != 0
+  return mask
+
+
+class OverlayMasks():
+  """
+  Holds the overlay mask of every frame of a cine (see overlayMask), bit-packed, along with the
+  geometry of the frame it applies to. Frames sharing a geometry share its entry.
+  """
+
+  def __init__(self, key, packedMasks, frameGeometries, geometryIndices):
+    """
+    :param key: identifies the images, label map and transforms the masks were computed from
+    :param packedMasks: bit-packed mask of every frame
+    :param frameGeometries: list of distinct (IJK to RAS matrix, shape) of the frames
+    :param geometryIndices: index of the geometry of every frame in frameGeometries
+    """
+    self.key = key
+    self.packedMasks = packedMasks
+    self.frameGeometries = frameGeometries
+    self.geometryIndices = geometryIndices
+
+  def __len__(self):
+    return len(self.packedMasks)
+
+  @property
+  def nbytes(self):
+    """
+    Memory used by the masks.
+    """
+    return sum(packedMask.nbytes for packedMask in self.packedMasks)
+
+  def geometry(self, frameIndex):
+    """
+    Returns the (IJK to RAS matrix, shape) of the mask of a frame.
+    """
+    return self.frameGeometries[self.geometryIndices[frameIndex]]
+
+  def mask(self, frameIndex):
+    """
+    Returns the mask of a frame as a uint8 array of its shape, indexed [k, j, i].
+    """
+    shape = self.geometry(frameIndex)[1]
+    count = shape[0] * shape[1] * shape[2]
+    return np.unpackbits(self.packedMasks[frameIndex], count=count).reshape(shape)
+
+
+def computeOverlayMasks(key, labelArray, labelIJKToRAS, frameGeometries, transforms, numWorkers=1,
+                        progressCallback=None):
+  """
+  Computes the overlay mask of every frame of a cine (see overlayMask) on a pool of worker threads.
+  Returns an OverlayMasks, or None if cancelled.
+  :param key: identifies the images, label map and transforms (see OverlayMasks)
+  :param labelArray: voxels of the label map, indexed [k, j, i]
+  :param labelIJKToRAS: 4x4 IJK to RAS matrix of the label map
+  :param frameGeometries: (IJK to RAS matrix, shape) of every frame
+  :param transforms: Nx4x4 RAS transforms applied to the label map for every frame
+  :param numWorkers: number of threads computing masks
+  :param progressCallback: optional function called with the number of masks computed. Returning
+  True cancels the computation
+  """
+  labelArray = np.ascontiguousarray(labelArray)
+  labelRASToIJK = np.linalg.inv(labelIJKToRAS)
+  # Frames sharing a geometry share its entry
+  distinctGeometries = []
+  geometryIndices = []
+  indexByGeometry = {}
+  for frameIJKToRAS, shape in frameGeometries:
+    geometryKey = (np.asarray(frameIJKToRAS).round(6).tobytes(), tuple(shape))
+    if geometryKey not in indexByGeometry:
+      indexByGeometry[geometryKey] = len(distinctGeometries)
+      distinctGeometries.append((np.asarray(frameIJKToRAS, dtype=np.float64), tuple(shape)))
+    geometryIndices.append(indexByGeometry[geometryKey])
+  # The label map is sampled through the inverse of the transform of every frame
+  rasToLabelIJK = labelRASToIJK @ np.linalg.inv(np.asarray(transforms, dtype=np.float64))
+
+  def computeMask(frameIndex):
+    frameIJKToRAS, shape = distinctGeometries[geometryIndices[frameIndex]]
+    return np.packbits(overlayMask(labelArray, rasToLabelIJK[frameIndex], frameIJKToRAS, shape))
+
+  packedMasks = []
+  with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, numWorkers or 1)) as executor:
+    for packedMask in executor.map(computeMask, range(len(geometryIndices))):
+      packedMasks.append(packedMask)
+      if progressCallback is not None and progressCallback(len(packedMasks)):
+        executor.shutdown(wait=True, cancel_futures=True)
+        return None
+  return OverlayMasks(key, packedMasks, distinctGeometries, geometryIndices)
@@ -0,0 +1,109 @@
+import time
+
+import qt
+import slicer
+
+
+class RenderScheduler():
+  """
+  Coalesces render requests so that each view is rendered at most once per display frame, and only
+  if it was marked dirty since it was last rendered. The 3D views are rendered at a lower,
+  configurable rate than the slice views, since they are much slower to render without a GPU.
+  Renders happen from the event loop, so marking views dirty returns immediately.
+  """
+
+  def __init__(self, frameIntervalMs=16, threeDRate=10.0):
+    """
+    :param frameIntervalMs: minimum time between two renders of a slice view
+    :param threeDRate: maximum number of renders of the 3D views per second
+    """
+    self.frameIntervalMs = frameIntervalMs
+    self._dirtySliceViews = set()
+    self._threeDDirty = False
+    self._lastRender = 0.0
+    self._lastThreeDRender = 0.0
+    self._timer = qt.QTimer()
+    self._timer.setSingleShot(True)
+    self._timer.connect("timeout()", self._render)
+    self.setThreeDRate(threeDRate)
+
+  def setThreeDRate(self, threeDRate):
+    """
+    Sets the maximum number of renders of the 3D views per second. It also caps the renders the 3D
+    views request themselves when the scene is modified.
+    :param threeDRate: renders per second, 0 to render the 3D views as often as the slice views
+    """
+    self.threeDRate = float(threeDRate)
+    self.threeDIntervalMs = 1000.0 / self.threeDRate if self.threeDRate > 0 else self.frameIntervalMs
+    for threeDView in self._threeDViews():
+      threeDView.maximumUpdateRate = self.threeDRate if self.threeDRate > 0 else 60.0
+
+  def requestRender(self, sliceViewNames=None, threeD=True):
+    """
+    Marks views as needing a render.
+    :param sliceViewNames: names of the slice views to render, None for every slice view
+    :param threeD: whether to render the 3D views as well
+    """
+    layoutManager = slicer.app.layoutManager()
+    # There are no views when running without a main window (e.g. batch processing)
+    if layoutManager is None:
+      return
+    if sliceViewNames is None:
+      sliceViewNames = layoutManager.sliceViewNames()
+    self._dirtySliceViews.update(sliceViewNames)
+    self._threeDDirty = self._threeDDirty or threeD
+    if not self._timer.isActive():
+      self._start()
+
+  def flush(self):
+    """
+    Renders the dirty views now, regardless of the render rates.
+    """
+    self._timer.stop()
+    self._render(force=True)
+
+  def clear(self):
+    """
+    Drops the pending render requests.
+    """
+    self._timer.stop()
+    self._dirtySliceViews.clear()
+    self._threeDDirty = False
+
+  def _start(self):
+    now = time.monotonic()
+    delays = []
+    if self._dirtySliceViews:
+      delays.append(self.frameIntervalMs - (now - self._lastRender) * 1000.0)
+    if self._threeDDirty:
+      delays.append(self.threeDIntervalMs - (now - self._lastThreeDRender) * 1000.0)
+    if delays:
+      self._timer.start(max(0, int(min(delays))))
+
+  def _threeDViews(self):
+    layoutManager = slicer.app.layoutManager()
+    if layoutManager is None:
+      return []
+    return [layoutManager.threeDWidget(index).threeDView() for index in range(layoutManager.threeDViewCount)]
+
+  def _render(self, force=False):
+    layoutManager = slicer.app.layoutManager()
+    if layoutManager is None:
+      self.clear()
+      return
+    now = time.monotonic()
+    if self._dirtySliceViews:
+      for name in self._dirtySliceViews:
+        sliceWidget = layoutManager.sliceWidget(name)
+        if sliceWidget is not None:
+          sliceWidget.sliceView().forceRender()
+      self._dirtySliceViews.clear()
+      self._lastRender = now
+    if self._threeDDirty and (force or (now - self._lastThreeDRender) * 1000.0 >= self.threeDIntervalMs):
+      for threeDView in self._threeDViews():
+        threeDView.forceRender()
+      self._threeDDirty = False
+      self._lastThreeDRender = now
+    # The 3D views wait for their next turn
+    if self._threeDDirty:
+      self._start()
@@ -3,9 +3,22 @@ import slicer
 from slicer.ScriptedLoadableModule import *
 import qt, vtk, ctk
 
-import os, csv, re
-import SimpleITK as sitk
-import sitkUtils
+import os, re
+import collections
+import concurrent.futures
+import numpy as np
+
+from utils import FrameIO
+from utils.CinePack import CINE_PACK_EXTENSION, CinePackFrameSource, writeCinePack
+from utils.FolderWatcher import CineFolderWatcher
+from utils.FrameCache import DiskFrameCache
+from utils.TransformsCache import TransformsTableCache
+from utils.Helper import ProgressReporter
+from utils.OverlayMasks import computeOverlayMasks
+from utils.RenderScheduler import RenderScheduler
+from utils import TransformMath, TransformsReader
+from utils.TransformTable import TransformTable
+from utils.LazyFrames import FileFrameSource, LazyFrameSequence, MultiFrameFrameSource, SequenceFrameSource
 
 class TrackLogic(ScriptedLoadableModuleLogic):
   """This class should implement all the actual
@@ -17,11 +30,17 @@ class TrackLogic(ScriptedLoadableModuleLogic):
   https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
   """
 
+  # Only accept valid file formats
+  imageFileFormats = ['.*\\.mha', '.*\\.dcm', '.*\\.nrrd', '.*\\.nii', '.*\\.hdr', '.*\\.nhdr', '.*\\.mhd']
+  transformsFileFormat = '.*\\.(csv|xls|xlsx|txt|parquet|feather|arrow|h5|hdf5)$'
+
   def __init__(self):
     """
     Called when the logic class is instantiated. Can be used for initializing member variables.
     """
-    slicer.app.pythonConsole().clear()
+    # There is no Python console when running without a main window (e.g. batch processing)
+    if slicer.util.mainWindow() is not None:
+      slicer.app.pythonConsole().clear()
     ScriptedLoadableModuleLogic.__init__(self)
     self.timer = qt.QTimer()
     self.redBackground = None 
@@ -32,6 +51,85 @@ class TrackLogic(ScriptedLoadableModuleLogic):
       "Green": self.greenBackground,
       "Yellow": self.yellowBackground
     }
+    # Name of the frame kept by each of the backgrounds above (see updateFrame)
+    self.backgroundFrameNames = {}
+    # Set when the images are loaded on demand (see loadImagesIntoSequenceNode)
+    self.lazyFrames = None
+    # Memory used by the frames of the last images loaded with compact storage
+    # (see loadImagesIntoSequenceNode)
+    self.frameMemoryReport = None
+    # Renders the views modified by the playback (see updateFrame)
+    self.renderScheduler = RenderScheduler(threeDRate=float(qt.QSettings().value("Track/ThreeDRenderRate", 10)))
+    # Precomputed overlay of every 2D frame, and the label map node showing it in each slice view
+    # (see precomputeOverlayMasks)
+    self.overlayMasks = None
+    self.overlayMaskNodes = {}
+    self.overlayMemoryReport = None
+    # Wiring of the views done once for the playback (see setupVisualization)
+    self.visualizationState = None
+    # Slice view orientation of every frame, by sequence node ID and index value (see getFrameOrientation)
+    self.frameOrientations = {}
+    # Set when the transforms are held in a single array (see createTransformTableFromTransformData)
+    self.transformTable = None
+    # Set while a directory is watched for new cine images (see startFolderWatch)
+    self.folderWatcher = None
+    # Persistent cache of decoded frames, shared across sessions. It is disabled unless a size was
+    # set (see setFrameCacheSize).
+    self.frameCache = None
+    self.setFrameCacheSize(int(qt.QSettings().value("Track/FrameCacheSizeMB", 0)), saveSetting=False)
+    # Persistent cache of parsed transforms files (see setTransformsCacheSize)
+    self.transformsCache = None
+    self.setTransformsCacheSize(int(qt.QSettings().value("Track/TransformsCacheSizeMB", 512)), saveSetting=False)
+
+  def setFrameCacheSize(self, sizeMB, directory=None, saveSetting=True):
+    """
+    Configures the persistent cache of decoded frames, used when loading with more than one worker or
+    on demand. Frames of unchanged image files are then read from the cache instead of being decoded.
+    The cache is disabled by default.
+    :param sizeMB: maximum size of the cache in megabytes, 0 disables the cache
+    :param directory: directory of the cache, defaults to a folder within the 3D Slicer cache
+    :param saveSetting: whether to store the size in the application settings
+    """
+    if saveSetting:
+      qt.QSettings().setValue("Track/FrameCacheSizeMB", sizeMB)
+    if sizeMB <= 0:
+      self.frameCache = None
+      return
+    if directory is None:
+      directory = os.path.join(slicer.app.cachePath, "Track", "Frames")
+    try:
+      self.frameCache = DiskFrameCache(directory, sizeMB * 2**20)
+    except OSError as e:
+      print(f"The frame cache could not be created in {directory}: {e}")
+      self.frameCache = None
+
+  def setTransformsCacheSize(self, sizeMB, directory=None, saveSetting=True):
+    """
+    Configures the persistent cache of parsed transforms files. Every column of a transforms file is
+    then parsed once, the first time it is read, and its values are read from the cache afterwards.
+    :param sizeMB: maximum size of the cache in megabytes, 0 disables the cache
+    :param directory: directory of the cache, defaults to a folder within the 3D Slicer cache
+    :param saveSetting: whether to store the size in the application settings
+    """
+    if saveSetting:
+      qt.QSettings().setValue("Track/TransformsCacheSizeMB", sizeMB)
+    if sizeMB <= 0:
+      self.transformsCache = None
+      return
+    if directory is None:
+      directory = os.path.join(slicer.app.cachePath, "Track", "Transforms")
+    try:
+      self.transformsCache = TransformsTableCache(directory, sizeMB * 2**20)
+    except OSError as e:
+      print(f"The transforms cache could not be created in {directory}: {e}")
+      self.transformsCache = None
+
+  def getFrameCacheStatistics(self):
+    """
+    Returns the number of hits and misses of the frame cache and its size (see
+    DiskFrameCache.statistics), or None if the cache is disabled.
+    """
+    return self.frameCache.statistics() if self.frameCache is not None else None
 
   def setDefaultParameters(self, customParameterNode):
     """
@@ -43,62 +141,323 @@ class TrackLogic(ScriptedLoadableModuleLogic):
     customParameterNode.overlayAsOutline = True
     customParameterNode.overlayColor = [0, 0.7, 0]
 
-  def loadImagesIntoSequenceNode(self, shNode, paths):
+  def getImageFilesFromPaths(self, paths):
+    """
+    Returns the sorted list of cine image files found within the provided paths.
+    :param paths: list of paths to the 2D images to be imported
+    """
+    imageFiles = []
+    for path in paths:
+      validFormat = any(re.match(format, path) for format in self.imageFileFormats)
+      if validFormat:
+        imageFiles.append(path)
+    imageFiles.sort()
+    return imageFiles
+
+  def scanImageHeaders(self, imageFiles, numWorkers=1):
+    """
+    Reads the headers of the provided image files (no pixel data) and returns a dictionary with:
+      - "frames": the headers of the accepted frames (see FrameIO.readFrameHeader), in playback order
+      - "rejected": list of (path, reason) for the frames whose geometry does not match the others
+      - "totalBytes": memory needed by the voxels of the accepted frames
+    Frames are ordered by DICOM acquisition time, then instance number, when every frame has them,
+    and by file name otherwise. Since a cine acquisition may interleave several imaging planes,
+    frames are compared with the other frames sharing their orientation: a frame is rejected if its
+    dimension does not match most frames, or if its size or spacing differs from most frames of its
+    orientation.
+    :param imageFiles: list of paths to the image files
+    :param numWorkers: number of threads used to read the headers
+    """
+    frames = []
+    rejected = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, numWorkers or 1)) as executor:
+      futures = [executor.submit(FrameIO.readFrameHeader, filepath) for filepath in imageFiles]
+      for filepath, future in zip(imageFiles, futures):
+        try:
+          frames.append(future.result())
+        except Exception as e:
+          rejected.append((filepath, f"unreadable header ({e})"))
+
+    # Order the frames
+    if frames and all(frame["acquisitionTime"] is not None for frame in frames):
+      frames.sort(key=lambda frame: (frame["acquisitionTime"], frame["instanceNumber"] or 0, frame["path"]))
+    elif frames and all(frame["instanceNumber"] is not None for frame in frames):
+      frames.sort(key=lambda frame: (frame["instanceNumber"], frame["path"]))
+    else:
+      frames.sort(key=lambda frame: frame["path"])
+
+    # Validate the geometry against the most common one
+    def dataDimension(frame):
+      return sum(1 for size in frame["size"] if size > 1)
+
+    def orientationKey(frame):
+      return tuple(round(value, 3) for value in frame["direction"])
+
+    def shapeKey(frame):
+      return (tuple(frame["size"]), tuple(round(value, 4) for value in frame["spacing"]), frame["components"])
+
+    if frames:
+      mostCommonDimension = collections.Counter(dataDimension(frame) for frame in frames).most_common(1)[0][0]
+      shapesByOrientation = collections.defaultdict(collections.Counter)
+      for frame in frames:
+        shapesByOrientation[orientationKey(frame)][shapeKey(frame)] += 1
+
+      acceptedFrames = []
+      for frame in frames:
+        if dataDimension(frame) != mostCommonDimension:
+          rejected.append((frame["path"], f"{dataDimension(frame)}D image among {mostCommonDimension}D images"))
+        elif shapeKey(frame) != shapesByOrientation[orientationKey(frame)].most_common(1)[0][0]:
+          rejected.append((frame["path"], f"size {frame['size']} / spacing {frame['spacing']} differs "
+                                          "from the other images with the same orientation"))
+        else:
+          acceptedFrames.append(frame)
+      frames = acceptedFrames
+
+    return {
+      "frames": frames,
+      "rejected": rejected,
+      "totalBytes": sum(frame["bytes"] for frame in frames),
+    }
+
+  def computeCropBox(self, segmentationNode, transforms=None, margin=10.0, convention="LPS"):
+    """
+    Returns the RAS bounds [xmin, xmax, ymin, ymax, zmin, zmax] of the region the tracked target can
+    reach: the bounds of the non-zero voxels of the segmentation, extended by the excursion of the
+    transforms and by a margin. Returns None if the segmentation is empty.
+    :param segmentationNode: 3D segmentation (or label map) volume node
+    :param transforms: optional [X, Y, Z] translations or 4x4 matrices (see validateTransformsInput)
+    :param margin: margin added on every side, in mm
+    :param convention: coordinate system the transforms were generated in (see
+    createTransformNodesFromTransformData)
+    """
+    voxels = np.nonzero(slicer.util.arrayFromVolume(segmentationNode))
+    if len(voxels[0]) == 0:
+      return None
+    # Corners of the non-zero voxels, in IJK, extended by half a voxel to cover the whole voxels
+    kMin, jMin, iMin = [axis.min() - 0.5 for axis in voxels]
+    kMax, jMax, iMax = [axis.max() + 0.5 for axis in voxels]
+    matrix = vtk.vtkMatrix4x4()
+    segmentationNode.GetIJKToRASMatrix(matrix)
+    ijkToRAS = slicer.util.arrayFromVTKMatrix(matrix)
+    corners = np.array([[i, j, k, 1.0] for i in (iMin, iMax) for j in (jMin, jMax) for k in (kMin, kMax)])
+    cornersRAS = corners @ ijkToRAS.T
+    lower = cornersRAS[:, :3].min(axis=0)
+    upper = cornersRAS[:, :3].max(axis=0)
+
+    if transforms is not None and len(transforms):
+      # The label map is moved by the transform of each frame (see visualize)
+      matrices = TransformMath.transformMatrices(transforms)
+      if TransformMath.isTranslationOnly(matrices):
+        translations = TransformMath.translationsToRAS(matrices[:, :3, 3], convention)
+        lower = lower + translations.min(axis=0)
+        upper = upper + translations.max(axis=0)
+      else:
+        # The corners are moved by the transform of every frame at once
+        movedCorners = TransformMath.matricesToRAS(matrices, convention) @ cornersRAS.T
+        lower = movedCorners[:, :3, :].min(axis=(0, 2))
+        upper = movedCorners[:, :3, :].max(axis=(0, 2))
+
+    lower -= margin
+    upper += margin
+    return [float(lower[0]), float(upper[0]), float(lower[1]), float(upper[1]), float(lower[2]), float(upper[2])]
+
+  def selectFrameIndices(self, numFrames, stride=1, startIndex=0, endIndex=None, startTime=None, endTime=None,
+                         frameTimes=None):
+    """
+    Returns the indices of the frames of an acquisition to load: the frames within the time window,
+    then within the index range, then every stride-th of them.
+    :param numFrames: number of frames of the acquisition
+    :param stride: only load every stride-th frame
+    :param startIndex: index of the first frame to load
+    :param endIndex: index after the last frame to load, None for the last frame
+    :param startTime: time of the first frame to load, in seconds since the first frame
+    :param endTime: time of the last frame to load, in seconds since the first frame
+    :param frameTimes: time of every frame, needed when startTime or endTime is provided
+    """
+    indices = list(range(numFrames))
+    if (startTime is not None or endTime is not None) and frameTimes is not None:
+      firstTime = frameTimes[0] if frameTimes else 0
+      indices = [index for index in indices
+                 if (startTime is None or frameTimes[index] - firstTime >= startTime) and
+                    (endTime is None or frameTimes[index] - firstTime <= endTime)]
+    indices = [index for index in indices if index >= startIndex and (endIndex is None or index < endIndex)]
+    return indices[::max(1, int(stride))]
+
+  def getFrameSelection(self, imagesSequenceNode):
+    """
+    Returns (frame indices, number of frames of the acquisition) if only some frames of the
+    acquisition were loaded into the sequence node (see loadImagesIntoSequenceNode), None otherwise.
+    :param imagesSequenceNode: sequence node containing the 2D images
+    """
+    indices = imagesSequenceNode.GetAttribute("Track.SourceFrameIndices") if imagesSequenceNode else None
+    if not indices:
+      return None
+    return [int(index) for index in indices.split(",")], int(imagesSequenceNode.GetAttribute("Track.SourceFrameCount"))
+
+  def getFrameTimes(self, imagesSequenceNode):
+    """
+    Returns the time, in seconds, of every image of the sequence node, or None if the images do not
+    all have a time (see loadImagesIntoSequenceNode).
+    :param imagesSequenceNode: sequence node containing the 2D images
+    """
+    frameTimes = imagesSequenceNode.GetAttribute("Track.FrameTimes") if imagesSequenceNode else None
+    if not frameTimes:
+      return None
+    return [float(time) for time in frameTimes.split(",")]
+
+  def setFrameSelection(self, imagesSequenceNode, frameIndices, numSourceFrames, frameTimes=None):
+    """
+    Stores in the sequence node which frames of the acquisition it holds and their time, so that
+    the matching transforms are used (see getFrameSelection and getFrameTimes).
+    :param imagesSequenceNode: sequence node containing the 2D images
+    :param frameIndices: index within the acquisition of every image of the sequence node
+    :param numSourceFrames: number of frames of the acquisition
+    :param frameTimes: time of every image of the sequence node, in seconds, None if unknown
+    """
+    if len(frameIndices) != numSourceFrames:
+      imagesSequenceNode.SetAttribute("Track.SourceFrameIndices", ",".join(str(index) for index in frameIndices))
+      imagesSequenceNode.SetAttribute("Track.SourceFrameCount", str(numSourceFrames))
+    if frameTimes is not None:
+      imagesSequenceNode.SetAttribute("Track.FrameTimes", ",".join(repr(float(time)) for time in frameTimes))
+
+  def loadImagesIntoSequenceNode(self, shNode, paths, numWorkers=1, lazy=False, cacheSize=64,
+                                 compact=False, cropBox=None, stride=1, startIndex=0, endIndex=None,
+                                 startTime=None, endTime=None, progressCallback=None, errorCallback=None):
     """
     Loads the cine images located in the provided paths into 3D Slicer. They are
     placed within a sequence node and the loaded image nodes are deleted thereafter.
     :param shNode: node representing the subject hierarchy
-    :param paths: list of paths to the 2D images to be imported
+    :param paths: list of paths to the 2D images to be imported. A single multi-frame DICOM, 2D+t or
+    3D+t image file is loaded as a whole cine (see MultiFrameFrameSource)
+    :param numWorkers: number of threads used to decode the images. When greater than 1, the
+    images are decoded in parallel and then inserted into the sequence, in order, on the main thread.
+    Unless the frame cache is enabled, a single worker loads the images with slicer.util.loadVolume
+    :param lazy: if True, only the image headers are read now. The sequence holds geometry-only
+    frames and the pixels are decoded when a frame is visualized (see ensureFrameResident)
+    :param cacheSize: maximum number of decoded frames kept in memory when loading lazily
+    :param compact: if True (and not loading lazily), the voxels are stored with the narrowest pixel
+    type holding them exactly, and no display or storage node is created per frame. The memory used
+    per frame before and after is printed and kept in frameMemoryReport
+    :param cropBox: optional RAS bounds [xmin, xmax, ymin, ymax, zmin, zmax] (see computeCropBox).
+    Only the voxels of each frame within the bounds are read from disk and kept
+    :param stride, startIndex, endIndex, startTime, endTime: only load some of the frames, in
+    playback order (see selectFrameIndices). Frames are selected before anything is decoded, and the
+    selection is stored in the sequence node so that the matching transforms are used. The time of
+    the loaded frames, when known, is stored as well (see getFrameTimes)
+    :param progressCallback: optional function called with (labelText, value, maximum) instead of
+    showing a progress dialog. Returning True cancels the loading
+    :param errorCallback: optional function called with (message, title) instead of showing a
+    warning dialog
     """
+    # A cine pack holds a whole acquisition, which is always loaded on demand straight from the pack
+    packFiles = [path for path in paths if path.endswith(CINE_PACK_EXTENSION)]
+    if packFiles:
+      return self.loadCinePackIntoSequenceNode(packFiles[0], cacheSize, progressCallback, errorCallback)
+
     # NOTE: This represents a node within the MRML scene, not within the subject hierarchy
     imagesSequenceNode = None
 
     # Find all the image file names within the provided paths
-    imageFiles = []
-    # Only accept valid file formats
-    fileFormats = ['.*\\.mha', '.*\\.dcm', '.*\\.nrrd', '.*\\.nii', '.*\\.hdr', '.*\\.nhdr', '.*\\.mhd']
-    for path in paths:
-      validFormat = any(re.match(format, path) for format in fileFormats)
-      if validFormat:
-        imageFiles.append(path)
-    imageFiles.sort()
+    imageFiles = self.getImageFilesFromPaths(paths)
+
+    # A single file holding the whole cine is decoded once. Its frames are views into the decoded
+    # buffer, which the sequence node copies unless the frames are loaded on demand.
+    frameSource = None
+    if len(imageFiles) == 1 and FrameIO.isMultiFrameImage(imageFiles[0]):
+      try:
+        frameSource = MultiFrameFrameSource(imageFiles[0], cropBox)
+      except RuntimeError as e:
+        self.reportError(f"{os.path.basename(imageFiles[0])} could not be read.\n{e}",
+                         "Failed to Load File", errorCallback)
+        return None, False
+      numSourceFrames = len(frameSource)
+      frameTimes = [index * frameSource.frameInterval for index in range(numSourceFrames)]
+      frameIndices = self.selectFrameIndices(numSourceFrames, stride, startIndex, endIndex, startTime, endTime,
+                                             frameTimes)
+      frameSource.selectFrames(frameIndices)
+      print(f"{len(frameSource)} cine images found in {os.path.basename(imageFiles[0])}, using "
+            f"{frameSource.pixels.nbytes / 2**20:.1f} MB once decoded")
+
+    # Read the image headers first, to order the frames and reject the ones that do not match the
+    # geometry of the acquisition before any pixel data is decoded
+    headers = []
+    if len(imageFiles) != 0 and frameSource is None:
+      scan = self.scanImageHeaders(imageFiles, numWorkers)
+      headers = scan["frames"]
+      numSourceFrames = len(headers)
+      frameTimes = None
+      if headers and all(header["acquisitionTime"] is not None for header in headers):
+        frameTimes = [header["acquisitionTime"] for header in headers]
+      if (startTime is not None or endTime is not None) and frameTimes is None:
+        self.reportError("The images do not all have an acquisition time. The time range was ignored.",
+                         "Input Error", errorCallback)
+      frameIndices = self.selectFrameIndices(numSourceFrames, stride, startIndex, endIndex, startTime, endTime,
+                                             frameTimes)
+      headers = [headers[index] for index in frameIndices]
+      scan["totalBytes"] = sum(header["bytes"] for header in headers)
+      imageFiles = [header["path"] for header in headers]
+      print(f"{len(imageFiles)} cine images found, requiring {scan['totalBytes'] / 2**20:.1f} MB "
+            "once decoded")
+      if scan["rejected"]:
+        rejectedText = "\n".join(f"{os.path.basename(path)}: {reason}"
+                                  for path, reason in scan["rejected"][:10])
+        if len(scan["rejected"]) > 10:
+          rejectedText += f"\n... and {len(scan['rejected']) - 10} more"
+        self.reportError(f"{len(scan['rejected'])} image files do not match the geometry of the "
+                         f"other images and were not loaded:\n{rejectedText}", "Input Error", errorCallback)
 
     # We only want to create a sequence node if image files were found within the provided paths
     if len(imageFiles) != 0:
       imagesSequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode",
                                                               "Image Nodes Sequence")
 
-      # Create a progress/loading bar to display the progress of the images loading process
-      progressDialog = qt.QProgressDialog("Loading cine images", "Cancel",
-                                          0, len(imageFiles))
-      progressDialog.minimumDuration = 0
+      if self.lazyFrames is not None:
+        self.lazyFrames.shutdown()
+        self.lazyFrames = None
 
-      for fileIndex in range(len(imageFiles)):
-        # If the 'Cancel' button was pressed, we want to return to a default state
-        if progressDialog.wasCanceled:
-          # Remove sequence node
-          slicer.mrmlScene.RemoveNode(imagesSequenceNode)
-          return None, True
+      multiFrame = frameSource is not None
+      if not multiFrame:
+        frameSource = FileFrameSource(imageFiles, headers, self.frameCache, cropBox)
+      cacheStatistics = self.getFrameCacheStatistics() if not multiFrame else None
 
-        filepath = imageFiles[fileIndex]
-        nodeName = (f"Image {fileIndex + 1} ({os.path.basename(filepath)})")
+      # Create a progress/loading bar to display the progress of the images loading process
+      progressDialog = ProgressReporter("Loading cine images", len(frameSource), progressCallback,
+                                        self.renderScheduler)
+
+      if lazy:
+        loaded = self._loadPlaceholderFrames(imagesSequenceNode, frameSource, progressDialog)
+        if loaded:
+          # The frames of a multi-frame file are already decoded, there is nothing to prefetch
+          self.lazyFrames = LazyFrameSequence(imagesSequenceNode, frameSource, cacheSize,
+                                              1 if multiFrame else max(1, numWorkers or 1))
+      elif multiFrame:
+        loaded = self._loadFramesInParallel(imagesSequenceNode, frameSource, 1, progressDialog, compact,
+                                            errorCallback)
+      elif (numWorkers is not None and numWorkers > 1) or self.frameCache is not None or compact or \
+           cropBox is not None:
+        # Frames served by the frame cache are never decoded, even with a single worker
+        loaded = self._loadFramesInParallel(imagesSequenceNode, frameSource, max(1, numWorkers or 1),
+                                            progressDialog, compact, errorCallback)
+      else:
+        loaded = self._loadImagesSerially(shNode, imagesSequenceNode, imageFiles, progressDialog)
 
-        loadedImageNode = slicer.util.loadVolume(filepath, {"singleFile": True, "show": False})
-        loadedImageNode.SetName(nodeName)
-        # Place image node into sequence
-        imagesSequenceNode.SetDataNodeAtValue(loadedImageNode, str(fileIndex))
-        # Remove loaded image node
-        imageID = shNode.GetItemByDataNode(loadedImageNode)
-        shNode.RemoveItem(imageID)
+      if not loaded:
+        # Remove sequence node
+        slicer.mrmlScene.RemoveNode(imagesSequenceNode)
+        return None, True
 
-        #  Update how far we are in the progress bar
-        progressDialog.setValue(fileIndex + 1)
+      # Remember which frames of the acquisition were loaded, to select the matching transforms
+      self.setFrameSelection(imagesSequenceNode, frameIndices, numSourceFrames,
+                             [frameTimes[index] for index in frameIndices] if frameTimes is not None else None)
 
-        # This render step is needed for the progress bar to visually update in the GUI
-        slicer.util.forceRenderAllViews()
-        slicer.app.processEvents()
+      self.indexFrameOrientations(imagesSequenceNode)
 
-      print(f"{len(imageFiles)} cine images were loaded into 3D Slicer")
+      print(f"{len(frameSource)} cine images were loaded into 3D Slicer")
+      if cacheStatistics is not None and not lazy:
+        statistics = self.getFrameCacheStatistics()
+        print(f"Frame cache: {statistics['hits'] - cacheStatistics['hits']} hits, "
+              f"{statistics['misses'] - cacheStatistics['misses']} misses, "
+              f"{statistics['bytes'] / 2**20:.0f} of {statistics['maxBytes'] / 2**20:.0f} MB used")
 
       # We do the following to clear the view of the slices. I expected {"show": False} to
       # prevent anything from being shown at all, but the first loaded image will appear in the
@@ -107,314 +466,911 @@ class TrackLogic(ScriptedLoadableModuleLogic):
 
     return imagesSequenceNode, False
 
-  def getColumnNamesFromTransformsInput(self, filepath):
-      
+  def loadCinePackIntoSequenceNode(self, packPath, cacheSize=64, progressCallback=None, errorCallback=None):
+    """
+    Loads a cine pack (see saveCinePack) into a sequence node. The pack is memory-mapped and the
+    frames are placed into the proxy node on demand, as views into the mapped file, so no image
+    file is parsed and no voxels are copied. The frame times and frame selection stored in the pack
+    are set on the sequence node again (see setFrameSelection).
+    :param packPath: path of the cine pack file
+    :param cacheSize: maximum number of frames kept referenced at a time
+    :param progressCallback: optional progress callback (see loadImagesIntoSequenceNode)
+    :param errorCallback: optional error callback (see loadImagesIntoSequenceNode)
+    """
+    try:
+      frameSource = CinePackFrameSource(packPath)
+    except (OSError, ValueError) as e:
+      self.reportError(f"{os.path.basename(packPath)} could not be read.\n{e}", "Failed to Load File", errorCallback)
+      return None, False
+
+    if self.lazyFrames is not None:
+      self.lazyFrames.shutdown()
+      self.lazyFrames = None
+
+    imagesSequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode", "Image Nodes Sequence")
+    progressDialog = ProgressReporter("Loading cine pack", len(frameSource), progressCallback)
+    if not self._loadPlaceholderFrames(imagesSequenceNode, frameSource, progressDialog):
+      slicer.mrmlScene.RemoveNode(imagesSequenceNode)
+      return None, True
+    # Views into a memory map are created instantly, there is nothing to prefetch
+    self.lazyFrames = LazyFrameSequence(imagesSequenceNode, frameSource, cacheSize, numWorkers=1)
+
+    frameIndices, numSourceFrames = frameSource.frameSelection or (range(len(frameSource)), len(frameSource))
+    self.setFrameSelection(imagesSequenceNode, frameIndices, numSourceFrames, frameSource.frameTimes)
+
+    self.indexFrameOrientations(imagesSequenceNode)
+
+    print(f"{len(frameSource)} cine images were mapped from {os.path.basename(packPath)}")
+    self.clearSliceForegrounds()
+    return imagesSequenceNode, False
+
+  def saveCinePack(self, imagesSequenceNode, packPath, progressCallback=None, errorCallback=None):
+    """
+    Writes the frames of an image sequence node into a single cine pack file, holding the voxels of
+    every frame contiguously along with their geometry, original file names, times and frame
+    selection. Loading the pack later (see loadCinePackIntoSequenceNode) skips parsing the
+    individual image files.
+    Returns True if the pack was written.
+    :param imagesSequenceNode: sequence node containing the 2D images
+    :param packPath: path of the cine pack file to write
+    :param progressCallback: optional progress callback (see loadImagesIntoSequenceNode)
+    :param errorCallback: optional error callback (see loadImagesIntoSequenceNode)
+    """
+    if self.lazyFrames is not None and self.lazyFrames.sequenceNode is imagesSequenceNode:
+      frameSource = self.lazyFrames.frameSource
+    else:
+      frameSource = SequenceFrameSource(imagesSequenceNode)
+    imageFiles = getattr(frameSource, "imageFiles", None)
+    # Frames appended since the images were loaded (see startFolderWatch) have no stored time or
+    # index within the acquisition
+    frameTimes = self.getFrameTimes(imagesSequenceNode)
+    if frameTimes is not None and len(frameTimes) != len(frameSource):
+      frameTimes = None
+    frameSelection = self.getFrameSelection(imagesSequenceNode)
+    if frameSelection is not None and len(frameSelection[0]) != len(frameSource):
+      frameSelection = None
+
+    progressDialog = ProgressReporter("Writing cine pack", len(frameSource), progressCallback)
+
+    def onProgress(numWritten):
+      progressDialog.setValue(numWritten)
+      return progressDialog.wasCanceled
+
+    try:
+      written = writeCinePack(packPath, frameSource, imageFiles, onProgress, frameTimes, frameSelection)
+    except (OSError, ValueError) as e:
+      self.reportError(f"The cine pack could not be written.\n{e}", "Failed to Save File", errorCallback)
+      return False
+    if written:
+      print(f"{len(frameSource)} cine images were written to {packPath}")
+    return written
+
+  def startFolderWatch(self, directory, imagesSequenceNode=None, maxFrames=0, onFramesAdded=None,
+                       errorCallback=None):
+    """
+    Starts appending the cine images written into a directory to an image sequence node, as they
+    land on disk. Images already in the directory are not appended. Images that cannot be read are
+    skipped and reported. Returns the sequence node, which is created if none is provided.
+    :param directory: directory the scanner writes the cine images into
+    :param imagesSequenceNode: sequence node the new frames are appended to
+    :param maxFrames: if greater than 0, only the most recent maxFrames frames are kept
+    :param onFramesAdded: optional function called with the number of frames appended
+    :param errorCallback: optional function called with (message, title) instead of showing dialogs
+    """
+    self.stopFolderWatch()
+    if imagesSequenceNode is None:
+      imagesSequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode", "Image Nodes Sequence")
+    def onFileSkipped(filepath, message):
+      self.reportError(f"{os.path.basename(filepath)} could not be read and was skipped.\n{message}",
+                       "Failed to Load File", errorCallback)
+    self.folderWatcher = CineFolderWatcher(directory, imagesSequenceNode, self.imageFileFormats,
+                                           maxFrames, onFramesAdded=onFramesAdded, onFileSkipped=onFileSkipped)
+    return imagesSequenceNode
+
+  def stopFolderWatch(self):
+    """
+    Stops appending new cine images (see startFolderWatch).
+    """
+    if self.folderWatcher is not None:
+      self.folderWatcher.stop()
+      self.folderWatcher = None
+
+  def _loadImagesSerially(self, shNode, imagesSequenceNode, imageFiles, progressDialog):
+    """
+    Loads the image files one at a time with slicer.util.loadVolume. Returns False if cancelled.
+    """
+    for fileIndex in range(len(imageFiles)):
+      # If the 'Cancel' button was pressed, we want to return to a default state
+      if progressDialog.wasCanceled:
+        return False
+
+      filepath = imageFiles[fileIndex]
+      nodeName = (f"Image {fileIndex + 1} ({os.path.basename(filepath)})")
+
+      loadedImageNode = slicer.util.loadVolume(filepath, {"singleFile": True, "show": False})
+      loadedImageNode.SetName(nodeName)
+      # Place image node into sequence
+      imagesSequenceNode.SetDataNodeAtValue(loadedImageNode, str(fileIndex))
+      # Remove loaded image node
+      imageID = shNode.GetItemByDataNode(loadedImageNode)
+      shNode.RemoveItem(imageID)
+
+      #  Update how far we are in the progress bar
+      # This render step is needed for the progress bar to visually update in the GUI
+      progressDialog.setValue(fileIndex + 1, render=True)
+
+    return True
+
+  def _loadFramesInParallel(self, imagesSequenceNode, frameSource, numWorkers, progressDialog, compact=False,
+                            errorCallback=None):
+    """
+    Decodes the frames of a frame source on a pool of worker threads and places them into the
+    sequence node in order. With compact storage, the worker threads also narrow the pixel type of
+    every frame, and all the frames are stored with a common pixel type. Returns False if cancelled,
+    or if a frame could not be decoded, after reporting the error.
+    """
+    def readFrame(frameIndex):
+      array = frameSource.readFrameArray(frameIndex)
+      # Returns the size and type of the decoded voxels along with the voxels to store
+      return array.nbytes, array.dtype, FrameIO.narrowArray(array) if compact else array
+
+    decodedBytes = 0
+    decodedDtypes = set()
+    # Pixel type common to all the frames stored so far, and the frames stored with each pixel type
+    storedDtype = None
+    framesByDtype = collections.defaultdict(list)
+    # The IJK to RAS matrix is only built once per geometry. SetIJKToRASMatrix copies it into every
+    # frame, so the frames do not share it.
+    matrices = {}
+
+    # Only keep a bounded number of decoded images waiting to be inserted, so that memory does not
+    # grow with the number of files when decoding is faster than insertion
+    maxPending = numWorkers * 2
+    pending = collections.deque()
+    nextToSubmit = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=numWorkers) as executor:
+      for frameIndex in range(len(frameSource)):
+        while nextToSubmit < len(frameSource) and len(pending) < maxPending:
+          pending.append(executor.submit(readFrame, nextToSubmit))
+          nextToSubmit += 1
+
+        # Wait for the next image in order, while keeping the GUI (and the 'Cancel' button) responsive
+        future = pending.popleft()
+        while not future.done():
+          progressDialog.processEvents()
+          if progressDialog.wasCanceled:
+            break
+          concurrent.futures.wait([future], timeout=0.05)
+
+        # If the 'Cancel' button was pressed, we want to return to a default state
+        if progressDialog.wasCanceled:
+          future.cancel()
+          for remaining in pending:
+            remaining.cancel()
+          return False
+
+        try:
+          numBytes, dtype, array = future.result()
+        except (RuntimeError, OSError, ValueError) as e:
+          # Stop loading, the frames decoded so far are removed along with the sequence node
+          for remaining in pending:
+            remaining.cancel()
+          self.reportError(f"{frameSource.frameName(frameIndex)} could not be read.\n{e}",
+                           "Failed to Load File", errorCallback)
+          return False
+        decodedBytes += numBytes
+        decodedDtypes.add(dtype.name)
+        if compact:
+          # A frame needing a wider type than the previous ones widens the common type
+          storedDtype = array.dtype if storedDtype is None else np.promote_types(storedDtype, array.dtype)
+          framesByDtype[array.dtype].append(frameIndex)
+
+        # Place image node into sequence. The node is never added to the scene, the sequence node
+        # stores its own copy.
+        size, spacing, origin, direction = frameSource.frameGeometry(frameIndex)
+        geometryKey = (tuple(spacing), tuple(origin), tuple(direction))
+        if geometryKey not in matrices:
+          matrices[geometryKey] = FrameIO.ijkToRASMatrix(spacing, origin, direction)
+        imageNode = slicer.vtkMRMLScalarVolumeNode()
+        imageNode.SetName(frameSource.frameName(frameIndex))
+        imageNode.SetIJKToRASMatrix(matrices[geometryKey])
+        imageNode.SetAndObserveImageData(FrameIO.imageDataFromArray(array))
+        imagesSequenceNode.SetDataNodeAtValue(imageNode, str(frameIndex))
+
+        #  Update how far we are in the progress bar
+        progressDialog.setValue(frameIndex + 1)
+
+    if compact:
+      # Convert the frames stored before the common type was widened, so all frames share one type
+      for dtype, frameIndices in framesByDtype.items():
+        if dtype != storedDtype:
+          for frameIndex in frameIndices:
+            frameNode = imagesSequenceNode.GetNthDataNode(frameIndex)
+            slicer.util.updateVolumeFromArray(frameNode, slicer.util.arrayFromVolume(frameNode).astype(storedDtype))
+
+      numFrames = len(frameSource)
+      storedBytes = sum(slicer.util.arrayFromVolume(imagesSequenceNode.GetNthDataNode(frameIndex)).nbytes
+                        for frameIndex in range(numFrames))
+      self.frameMemoryReport = {
+        "numFrames": numFrames,
+        "decodedBytes": decodedBytes,
+        "storedBytes": storedBytes,
+        "decodedDtypes": sorted(decodedDtypes),
+        "storedDtype": np.dtype(storedDtype).name,
+      }
+      print(f"Compact storage: {numFrames} frames, {decodedBytes / numFrames / 2**10:.1f} KB -> "
+            f"{storedBytes / numFrames / 2**10:.1f} KB per frame ({', '.join(sorted(decodedDtypes))} -> "
+            f"{np.dtype(storedDtype).name}), {decodedBytes / 2**20:.1f} MB -> {storedBytes / 2**20:.1f} MB in total")
+
+    return True
+
+  def _loadPlaceholderFrames(self, imagesSequenceNode, frameSource, progressDialog):
+    """
+    Places a geometry-only node for every frame of the frame source into the sequence node, reading
+    only the image headers. Returns False if cancelled.
+    """
+    for frameIndex in range(len(frameSource)):
+      # If the 'Cancel' button was pressed, we want to return to a default state
+      if progressDialog.wasCanceled:
+        return False
+
+      size, spacing, origin, direction = frameSource.frameGeometry(frameIndex)
+      placeholderNode = FrameIO.placeholderVolumeNode(size, spacing, origin, direction,
+                                                      frameSource.frameName(frameIndex))
+      imagesSequenceNode.SetDataNodeAtValue(placeholderNode, str(frameIndex))
+
+      # Updating the GUI for every header would dominate the loading time
+      if frameIndex % 50 == 0 or frameIndex == len(frameSource) - 1:
+        progressDialog.setValue(frameIndex + 1)
+
+    return True
+
+  def ensureFrameResident(self, sequenceBrowser, sequenceNode2DImages):
+    """
+    When the images were loaded lazily, decodes the frame currently selected by the sequence browser
+    (or takes it from the cache) and places its voxels into the proxy image node.
+    :param sequenceBrowser: sequence browser node used to control the playback operation
+    :param sequenceNode2DImages: sequence node containing the 2D images
+    """
+    if self.lazyFrames is None or self.lazyFrames.sequenceNode is not sequenceNode2DImages:
+      return
+    proxy2DImageNode = sequenceBrowser.GetProxyNode(sequenceNode2DImages)
+    if proxy2DImageNode is None:
+      return
+    # Lazy frames are stored at their frame index. Frames appended afterwards (see startFolderWatch)
+    # are fully loaded and have larger index values.
+    frameIndex = int(sequenceNode2DImages.GetNthIndexValue(sequenceBrowser.GetSelectedItemNumber()))
+    if frameIndex >= len(self.lazyFrames):
+      return
+    imageData = self.lazyFrames.getImageData(frameIndex)
+    if proxy2DImageNode.GetImageData() is not imageData:
+      proxy2DImageNode.SetAndObserveImageData(imageData)
+
+  def reportError(self, message, title, errorCallback=None):
+    """
+    Reports an error to the user with a warning dialog or, when provided, to an error callback.
+    :param message: error message
+    :param title: title of the warning dialog
+    :param errorCallback: optional function called with (message, title) instead of showing a dialog
+    """
+    if errorCallback is not None:
+      errorCallback(message, title)
+    else:
+      slicer.util.warningDisplay(message, title)
+
+  def importOptionalPackage(self, packageName, fileName, errorCallback=None):
+    """
+    Imports an optional Python package needed to read a file. When the package is missing, the user
+    is offered to install it. Nothing is installed when an error callback is provided (scripted
+    use), the error is reported instead. Returns the module, or None if it is not available.
+    :param packageName: name of the Python package
+    :param fileName: name of the file that needs the package, used in the messages
+    :param errorCallback: optional function called with (message, title) instead of showing dialogs
+    """
+    try:
+      return __import__(packageName)
+    except ModuleNotFoundError:
+      pass
+
+    errorMessage = f"{fileName} file failed to load.\nPlease load a .csv or .txt file instead. "
+    if errorCallback is not None or \
+       not slicer.util.confirmOkCancelDisplay(f"To load {fileName}, install the '{packageName}' Python package. Click OK to install now."):
+      self.reportError(errorMessage, "Failed to Load File", errorCallback)
+      return None
+
+    try:
+      # Create a loading popup
+      messageBox = qt.QMessageBox()
+      messageBox.setIcon(qt.QMessageBox.Information)
+      messageBox.setWindowTitle("Package Installation")
+      messageBox.setText(f"Installing '{packageName}' package...")
+      messageBox.setStandardButtons(qt.QMessageBox.NoButton)
+      messageBox.show()
+      slicer.app.processEvents()
+
+      slicer.util.pip_install(packageName)
+      module = __import__(packageName)
+
+      messageBox.setText(f"'{packageName}' package installed successfully. {fileName} will now load.")
+      slicer.app.processEvents()  # Process events to allow the dialog to update
+      qt.QTimer.singleShot(3000, messageBox.accept)
+
+      # Wait for user interaction
+      while messageBox.isVisible():
+        slicer.app.processEvents()
+
+      messageBox.hide()  # Hide the message box
+      return module
+    except:
+      self.reportError(errorMessage, "Failed to Load File", errorCallback)
+      return None
+
+  def getColumnNamesFromTransformsInput(self, filepath, errorCallback=None):
+    """
+    Reads the header row of a transforms file. Only the header row is read, and it is kept in the
+    transforms cache when it is enabled (see setTransformsCacheSize). Only the schema of a columnar
+    file (Parquet, Feather/Arrow, HDF5) is read, and it is not cached.
+    :param filepath: path to the transforms file (.csv, .txt, .xlsx, .xls, .parquet, .feather,
+    .arrow, .h5 or .hdf5)
+    :param errorCallback: optional function called with (message, title) instead of showing dialogs
+    """
     fileName = os.path.basename(filepath)
-    fileExtension = os.path.splitext(filepath)[1]
 
-    if re.match('.*\\.(csv|xls|xlsx|txt)', filepath):
-      # Check that the transforms file is a .csv type
-      if filepath.endswith('.csv'):
-        encodings = ["utf-8-sig", "cp1252", "iso-8859-1", "latin1"]
-        for encoding in encodings:
-          try:
-            with open(filepath, "r", encoding = encoding) as f:
-              reader = csv.reader(f)
-              headers = next(reader)
-              # if we can read without error, break of the encoding loop
-              break
-          except:
-            print(f"Encoding {encoding} failed, trying next encoding")
+    if filepath.endswith(TransformsReader.ARROW_EXTENSIONS + TransformsReader.HDF5_EXTENSIONS):
+      # Columnar files are read with optional packages
+      hdf5 = filepath.endswith(TransformsReader.HDF5_EXTENSIONS)
+      if self.importOptionalPackage('h5py' if hdf5 else 'pyarrow', fileName, errorCallback) is None:
+        return
+      try:
+        return TransformsReader.readHDF5Header(filepath) if hdf5 else TransformsReader.readArrowHeader(filepath)
+      except (OSError, ValueError) as e:
+        print(e)
+    elif re.match(self.transformsFileFormat, filepath):
+      headers = self.transformsCache.readHeader(filepath) if self.transformsCache is not None else None
+      if headers is not None:
         return headers
-   
-      if filepath.endswith('.txt'):
-        with open(filepath, "r") as f:
-          headers = next(f).strip().split(',')
-          return headers
-      if filepath.endswith('.xlsx'):
-        try:
-          import openpyxl
-        except ModuleNotFoundError:
-          if slicer.util.confirmOkCancelDisplay(f"To load {fileName}, install the 'openpyxl' Python package. Click OK to install now."):
-            try:
-              # Create a loading popup
-              messageBox = qt.QMessageBox()
-              messageBox.setIcon(qt.QMessageBox.Information)
-              messageBox.setWindowTitle("Package Installation")
-              messageBox.setText("Installing 'openpyxl' package...")
-              messageBox.setStandardButtons(qt.QMessageBox.NoButton)
-              messageBox.show()
-              slicer.app.processEvents()
-
-              slicer.util.pip_install('openpyxl')
-              openpyxl = __import__('openpyxl')
-
-              messageBox.setText(f"'openpyxl' package installed successfully. {fileName} will now load.")
-              slicer.app.processEvents()  # Process events to allow the dialog to update
-              qt.QTimer.singleShot(3000, messageBox.accept)
-
-              # Wait for user interaction
-              while messageBox.isVisible():
-                slicer.app.processEvents()
-            except:
-              slicer.util.warningDisplay(f"{fileName} file failed to load.\nPlease load a .csv or .txt file instead. ",
-                                          "Failed to Load File")
-              return
-          else:
-            slicer.util.warningDisplay(f"{fileName} failed to load.\nPlease load a .csv or .txt file instead. ",
-                                      "Failed to Load File")
-            return
-        openpyxl = __import__('openpyxl')
-        wb = openpyxl.load_workbook(filepath)
-        sheet = wb.active
-        headers = next(sheet.iter_rows(values_only=True))
-        # print(headers)
+      # Workbooks are read with optional packages
+      if filepath.endswith('.xlsx') and self.importOptionalPackage('openpyxl', fileName, errorCallback) is None:
+        return
+      if filepath.endswith('.xls') and self.importOptionalPackage('xlrd', fileName, errorCallback) is None:
+        return
+      try:
+        headers, _, close = self._openTransformsRows(filepath)
+        close()
+        if self.transformsCache is not None:
+          self.transformsCache.putHeader(filepath, headers)
         return headers
-      elif filepath.endswith('.xls'):
-        try:
-          import xlrd
-        except ModuleNotFoundError:
-          if slicer.util.confirmOkCancelDisplay(f"To load {fileName}, install the 'xlrd' Python package. Click OK to install now."):
-            try:
-              # Create a loading popup
-              messageBox = qt.QMessageBox()
-              messageBox.setIcon(qt.QMessageBox.Information)
-              messageBox.setWindowTitle("Package Installation")
-              messageBox.setText("Installing 'xlrd' package...")
-              messageBox.setStandardButtons(qt.QMessageBox.NoButton)
-              messageBox.show()
-              slicer.app.processEvents()
-
-              slicer.util.pip_install('xlrd')
-              xlrd = __import__('xlrd')
-
-
-              messageBox.setText(f"'xlrd' package installed successfully. {fileName} will now load.")
-              slicer.app.processEvents()  # Process events to allow the dialog to update
-              qt.QTimer.singleShot(3000, messageBox.accept)
-
-              # Wait for user interaction
-              while messageBox.isVisible():
-                slicer.app.processEvents()
-
-              messageBox.hide()  # Hide the message box
-            except:
-              slicer.util.warningDisplay(f"{fileName} file not loaded.\nPlease load a .csv or .txt file instead. ",
-                              "Failed to Load File")
-              return
-          else:
-            slicer.util.warningDisplay(f"{fileName} file not loaded.\nPlease load a .csv or .txt file instead. ",
-                                      "Failed to Load File")
-            return 
-        xlrd = __import__('xlrd')
-        wb = xlrd.open_workbook(filepath)
-        sheet = wb.sheet_by_index(0)
-        return sheet.row_values(0)
+      except (OSError, IndexError, UnicodeDecodeError) as e:
+        print(e)
     
     # if we get here, we failed to read the the headers -> print out warning and return a empty list for headers   
-    slicer.util.warningDisplay(f"Cannot read header row from {fileName}.\nPlease load another file instead. ",
-                                  "Failed to Load File")
+    self.reportError(f"Cannot read header row from {fileName}.\nPlease load another file instead. ",
+                     "Failed to Load File", errorCallback)
     return []
 
-  def validateTransformsInput(self, filepath, numImages,headers):
+  def _openTransformsRows(self, filepath):
     """
-    Checks to ensure that the data in the provided transformation file is valid and matches the
-    number of 2D images that have been loaded into 3D Slicer.
-    :param filepath: path to the transforms file (which should be a .csv file)
-    :param numImages: the number of cine images that have already been loaded
+    Opens a transforms file and returns (header, iterator over the following rows, function closing
+    the file). The rows are read lazily: only the first row of a workbook is read here.
+    :param filepath: path to the transforms file (.csv, .txt, .xlsx or .xls)
+    """
+    if filepath.endswith('.csv') or filepath.endswith('.txt'):
+      encoding = TransformsReader.detectEncoding(filepath)
+      rows = TransformsReader.iterRows(filepath, encoding)
+      return TransformsReader.readHeader(filepath, encoding), rows, rows.close
+    if filepath.endswith('.xlsx'):
+      # A read-only workbook streams the rows of the sheet instead of loading all of them
+      openpyxl = __import__('openpyxl')
+      workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+      rows = workbook.active.iter_rows(values_only=True)
+      return list(next(rows, ())), rows, workbook.close
+    xlrd = __import__('xlrd')
+    workbook = xlrd.open_workbook(filepath, on_demand=True)
+    sheet = workbook.sheet_by_index(0)
+    # Start from the second row, assuming first row is header
+    rows = (sheet.row_values(rowIndex) for rowIndex in range(1, sheet.nrows))
+    return sheet.row_values(0), rows, workbook.release_resources
+
+  def readTransformsArray(self, filepath, headers, errorCallback=None, maxRows=None, stopAfter=None):
+    """
+    Reads some columns of a transforms file, usually the X, Y and Z columns, into an NxM float64
+    array. Only the requested columns of a columnar file (Parquet, Feather/Arrow, HDF5) are read.
+    Columns read before are read from the transforms cache when it is enabled (see
+    setTransformsCacheSize). Otherwise, the file is streamed in chunks of rows (see
+    TransformsReader.iterColumns), only the requested columns are kept, and reading stops as soon as
+    enough rows are read, so the memory used does not depend on the size of the file. When the
+    cache is enabled, every column of the file is parsed in the same pass (see
+    TransformsReader.iterTableColumns): a file read to the end is then cached whole, so selecting
+    other columns later does not open it again. A read stopping early only caches the rows of the
+    requested columns. Returns None if the file could not be read, after reporting the error.
+    :param filepath: path to the transforms file
+    :param headers: names of the columns to read
+    :param errorCallback: optional function called with (message, title) instead of showing dialogs
+    :param maxRows: only read the first maxRows rows, None to read every row
+    :param stopAfter: optional function called with every chunk of rows read, returning True once
+    enough rows are read (see TransformsReader.collectChunks). Ignored when the columns are cached in
+    full
     """
-    # NOTE: The current logic of this function will only ensure that the first {numImages}
-    # transformations found within the CSV file are valid, so playback can occur. The playback will
-    # still occur if later transformations after the first {numImages} transformations are corrupt.
-    transformationsList = []
     fileName = os.path.basename(filepath)
     fileExtension = os.path.splitext(filepath)[1]
-    headerX = headers[0]
-    headerY = headers[1]
-    headerZ = headers[2]
-    if re.match('.*\\.(csv|xls|xlsx|txt)', filepath):
-      # Check that the transforms file is a .csv type
-      if filepath.endswith('.csv'):
-        encodings = ["utf-8-sig", "cp1252", "iso-8859-1", "latin1"]
-        for encoding in encodings:
-          try:
-            with open(filepath, "r", encoding = encoding) as f:
-              # Using a DictReader allows us to recognize the CSV header
-              reader = csv.DictReader(f)
-              for row in reader:
-                # Extract floating point values from row
-                transformationsList.append([float(row[headerX]), float(row[headerY]), float(row[headerZ])])
-              
-              # if we can read the file without error, break the encoding loop
-              break
-          except:
-            print(f"Encoding {encoding} failed, trying next encoding")
-          
-      if len(transformationsList) == 0 and filepath.endswith('.csv'):
-        slicer.util.warningDisplay(f"{fileName} file failed to load.\nPlease load another file instead. ",
-                                  "Failed to Load File")
-        return
-      
-      # Check that the transforms file is a .txt type
-      elif filepath.endswith('.txt'):
-        with open(filepath, "r") as f:
-          next(f)
-          for line in f:
-            values = line.strip().split(',')
-            try:
-              x, y, z = map(float, values)
-              transformationsList.append([x, y, z])
-            except:
-              # If there was an error reading the values, break out because we can't/shouldn't
-              # perform the playback if the transformation data is corrupt or missing.
-              slicer.util.warningDisplay(f"An error was encountered while reading the {fileExtension} file: "
-                                   f"{fileName}",
-                                   "Validation Error")
-              break
-
-      # Check that the transforms file is a .xlsx type
-      elif filepath.endswith('.xlsx') or filepath.endswith('.xlsx'):
-        openpyxl = __import__('openpyxl')        
-        wb = openpyxl.load_workbook(filepath)
-        sheet = wb.active
-        rows = iter(sheet.iter_rows(values_only=True))
-        header_row = next(rows)
-        
-        x_index = header_row.index(headerX)
-        y_index = header_row.index(headerY)
-        z_index = header_row.index(headerZ)
-
-        for row in rows:
-          try:
-            x, y, z = map(float, [row[x_index], row[y_index], row[z_index]])
-            transformationsList.append([x,y,z])
-          except Exception as e:
-            print(e)
-            slicer.util.warningDisplay(f"{fileName} file failed to load.\nPlease load a .csv or .txt file instead. ",
-                                      "Failed to Load File")
-            break
-        
-      # Check that the transforms file is a .xls type
-      elif filepath.endswith('.xls'):
-        xlrd = __import__('xlrd')    
-        workbook = xlrd.open_workbook(filepath)
-        sheet = workbook.sheet_by_index(0)
-        header_row = sheet.row_values(0)
-        
-        x_index = header_row.index(headerX)
-        y_index = header_row.index(headerY)
-        z_index = header_row.index(headerZ)
-        
-        for row_idx in range(1, sheet.nrows):  # Start from the second row, assuming first row is header
-          values = sheet.row_values(row_idx)
-          try:
-            x, y, z = map(float, [values[x_index], values[y_index], values[z_index]])
-            transformationsList.append([x, y, z])
-          except:
-            # If there was an error reading the values, break out because we can't/shouldn't
-            # perform the playback if the transformation data is corrupt or missing.
-            slicer.util.warningDisplay(f"An error was encountered while reading the {fileExtension} file: "
-                                     f"{fileName}",
-                                     "Validation Error")
-            break
-
-
-      if len(transformationsList) == numImages:
-        return transformationsList
+    if not re.match(self.transformsFileFormat, filepath):
+      return None
+
+    headers = list(headers)
+    chunkRows = TransformsReader.chunkSize(maxRows)
+    close = None
+    try:
+      # Columnar files are read column by column, without parsing
+      if filepath.endswith(TransformsReader.HDF5_EXTENSIONS):
+        return TransformsReader.readHDF5Columns(filepath, headers, maxRows)
+      if filepath.endswith(TransformsReader.ARROW_EXTENSIONS):
+        return TransformsReader.readArrowColumns(filepath, headers, maxRows)
+      if self.transformsCache is not None:
+        transforms = self.transformsCache.readColumns(filepath, headers, maxRows)
+        if transforms is not None:
+          return transforms
+      # Columns of the whole file, parsed along the requested ones while they fit in the cache
+      table = {"chunks": [], "bytes": 0, "errors": {}}
+      if self.transformsCache is not None:
+        header, rows, close = self._openTransformsRows(filepath)
+        def iterRequestedColumns():
+          for chunk, tableChunk in TransformsReader.iterTableColumns(rows, header, headers, table["errors"],
+                                                                     chunkRows):
+            if table["chunks"] is not None:
+              table["bytes"] += tableChunk.nbytes
+              if table["bytes"] <= self.transformsCache.maxBytes:
+                table["chunks"].append(tableChunk)
+              else:
+                table["chunks"] = None
+            yield chunk
+        chunks = iterRequestedColumns()
+      elif filepath.endswith('.csv') or filepath.endswith('.txt'):
+        chunks = TransformsReader.iterColumns(filepath, headers, chunkRows=chunkRows)
       else:
-        # Extension will not create transforms nodes if the number of cine images and
-        # the number of rows in the transforms file are not equal
-        print(os.path.basename(filepath))
-        slicer.util.warningDisplay(f"Error loading transforms file. Ensure proper formatting and matching number of transforms to cine images",
-                           "Validation Error")
-        
-        return None
-
-  def createTransformNodesFromTransformData(self, shNode, transforms, numImages):
+        header, rows, close = self._openTransformsRows(filepath)
+        chunks = TransformsReader.iterRowColumns(rows, header, headers, chunkRows)
+      # Remember whether reading stopped before the end of the file
+      stopped = []
+      def stopReading(chunk):
+        if stopAfter is not None and stopAfter(chunk):
+          stopped.append(True)
+        return bool(stopped)
+      transforms = TransformsReader.collectChunks(chunks, len(headers), maxRows, stopReading)
+      if self.transformsCache is not None:
+        complete = not stopped and (maxRows is None or len(transforms) < maxRows)
+        if not (complete and table["chunks"] is not None and
+                self._cacheTransformsTable(filepath, header, table["chunks"], table["errors"])):
+          self.transformsCache.putColumns(filepath, headers, transforms, complete)
+      return transforms
+    except TransformsReader.TransformsFormatError as e:
+      # If a value cannot be read, we can't/shouldn't perform the playback since the
+      # transformation data is corrupt or missing
+      self.reportError(f"An error was encountered while reading the {fileExtension} file: "
+                       f"{fileName}\n{e}", "Validation Error", errorCallback)
+    except (OSError, ImportError, KeyError, IndexError, ValueError, UnicodeDecodeError) as e:
+      self.reportError(f"{fileName} file failed to load.\n{e}\nPlease load another file instead. ",
+                       "Failed to Load File", errorCallback)
+    finally:
+      if close is not None:
+        close()
+    return None
+
+  def _cacheTransformsTable(self, filepath, header, tableChunks, errors):
+    """
+    Caches every column of a transforms file read to the end (see readTransformsArray), along with
+    the first value of every column that is not a number. Returns False if they were not cached.
+    """
+    names = ["" if name is None else str(name) for name in header]
+    # Columns are looked up by name, only the first column of a name is ever read
+    positions = [position for position, name in enumerate(names) if names.index(name) == position]
+    if tableChunks:
+      values = np.concatenate(tableChunks)[:, positions]
+    else:
+      values = np.empty((0, len(positions)), dtype=np.float64)
+    columnErrors = {names[position]: errors[position] for position in positions if position in errors}
+    return self.transformsCache.putHeader(filepath, header) and \
+           self.transformsCache.putColumns(filepath, [names[position] for position in positions], values, True,
+                                           columnErrors)
+
+  def validateTransformsInput(self, filepath, numImages, headers, errorCallback=None, frameSelection=None,
+                              asArray=False, timeHeader=None, frameTimes=None, timeOffset=None, timeScale=1.0,
+                              layout="translation", eulerOrder="xyz"):
+    """
+    Checks to ensure that the data in the provided transformation file is valid and matches the
+    number of 2D images that have been loaded into 3D Slicer.
+    :param filepath: path to the transforms file (which should be a .csv file)
+    :param numImages: the number of cine images that have already been loaded, or None to accept any
+    number of transforms
+    :param headers: names of the columns of the layout, e.g. the X, Y and Z columns
+    :param errorCallback: optional function called with (message, title) instead of showing dialogs
+    :param frameSelection: optional (frame indices, number of frames of the acquisition) when only
+    some frames of the acquisition were loaded (see getFrameSelection). The file then holds a row per
+    frame of the acquisition, and only the rows of the loaded frames are returned
+    :param asArray: if True, the transforms are returned as a numpy array instead of nested lists
+    :param timeHeader: optional name of a timestamp column. The file may then hold any number of
+    rows, e.g. logged at a higher rate than the images, and every image gets the transform
+    interpolated at its time (see TransformMath.alignTransformsToFrames)
+    :param frameTimes: time of every loaded image, in seconds (see getFrameTimes). Needed with
+    timeHeader
+    :param timeOffset: timestamp of the first image on the clock of the timestamp column, in seconds.
+    If None, the first image is aligned with the first row
+    :param timeScale: factor converting the timestamps to seconds, e.g. 0.001 for milliseconds
+    :param layout: layout of the columns (see TransformMath.TRANSFORM_LAYOUTS). Translations are
+    returned as [X, Y, Z] rows, and the other layouts as 4x4 matrices built for all rows at once
+    :param eulerOrder: order in which Euler angles are applied (see TransformMath.eulerToMatrices)
+    """
+    if len(headers) != TransformMath.layoutColumnCount(layout):
+      self.reportError(f"The '{layout}' transforms layout needs {TransformMath.layoutColumnCount(layout)} "
+                       f"columns, {len(headers)} were selected.", "Validation Error", errorCallback)
+      return None
+
+    if timeHeader:
+      transforms = self._alignTransformsInput(filepath, numImages, headers, timeHeader, frameTimes, timeOffset,
+                                              timeScale, layout, errorCallback)
+      return self._transformsFromColumns(transforms, layout, eulerOrder, asArray)
+
+    # A single row past the ones needed is enough to detect that the file holds too many rows, the
+    # rest of the file is not read
+    maxRows = None
+    if numImages is not None:
+      maxRows = max(numImages, frameSelection[1] if frameSelection is not None else 0) + 1
+    transforms = self.readTransformsArray(filepath, headers, errorCallback, maxRows)
+    if transforms is None:
+      return None
+
+    if frameSelection is not None and len(transforms) == frameSelection[1]:
+      transforms = transforms[frameSelection[0]]
+
+    if numImages is not None and len(transforms) != numImages:
+      # Extension will not create transforms nodes if the number of cine images and
+      # the number of rows in the transforms file are not equal
+      print(os.path.basename(filepath))
+      self.reportError(f"Error loading transforms file. Ensure proper formatting and matching number of transforms to cine images",
+                       "Validation Error", errorCallback)
+      return None
+
+    return self._transformsFromColumns(transforms, layout, eulerOrder, asArray)
+
+  def _transformsFromColumns(self, columns, layout, eulerOrder, asArray):
+    if columns is None:
+      return None
+    transforms = columns if layout == "translation" else TransformMath.columnsToMatrices(columns, layout, eulerOrder)
+    return transforms if asArray else transforms.tolist()
+
+  def _alignTransformsInput(self, filepath, numImages, headers, timeHeader, frameTimes, timeOffset, timeScale,
+                            layout, errorCallback):
+    if frameTimes is None or (numImages is not None and len(frameTimes) != numImages):
+      self.reportError("The cine images do not all have an acquisition time, the transforms cannot be "
+                       f"aligned using the '{timeHeader}' column.", "Validation Error", errorCallback)
+      return None
+    frameTimes = np.asarray(frameTimes, dtype=np.float64)
+    # Frame times are relative to the first frame
+    frameTimes = frameTimes - frameTimes[0]
+
+    # Stop reading the file once a row is logged after the last frame. This only holds while the
+    # timestamps are increasing.
+    reading = {"previousTime": -np.inf, "sorted": True, "lastFrameTime": None}
+
+    def readPastLastFrame(chunk):
+      times = chunk[:, -1] * timeScale
+      if reading["lastFrameTime"] is None:
+        reading["lastFrameTime"] = frameTimes[-1] + (times[0] if timeOffset is None else timeOffset)
+      reading["sorted"] = reading["sorted"] and times[0] >= reading["previousTime"] and \
+                          bool(np.all(np.diff(times) >= 0))
+      reading["previousTime"] = times[-1]
+      return reading["sorted"] and times[-1] > reading["lastFrameTime"]
+
+    columns = self.readTransformsArray(filepath, list(headers) + [timeHeader], errorCallback,
+                                       stopAfter=readPastLastFrame)
+    if columns is None:
+      return None
+    if len(columns) == 0:
+      self.reportError(f"{os.path.basename(filepath)} does not hold any transform.", "Validation Error",
+                       errorCallback)
+      return None
+
+    transformTimes = columns[:, -1] * timeScale
+    frameTimes += transformTimes[0] if timeOffset is None else timeOffset
+    outside = np.count_nonzero((frameTimes < transformTimes.min()) | (frameTimes > transformTimes.max()))
+    if outside:
+      print(f"{outside} cine images are outside of the time range of {os.path.basename(filepath)}, "
+            "they use the first or last transform")
+    # Rotations are made continuous first, so that they are interpolated along the shortest path
+    transforms = TransformMath.alignTransformsToFrames(transformTimes,
+                                                       TransformMath.makeContinuous(columns[:, :-1], layout),
+                                                       frameTimes)
+    print(f"{len(columns)} transforms were aligned to {len(frameTimes)} cine images using the "
+          f"'{timeHeader}' column")
+    return transforms
+
+  def createTransformNodesFromTransformData(self, shNode, transforms, numImages, progressCallback=None,
+                                            convention="LPS"):
     """
     For every image and it's matching transformation, create a transform node which will hold
     the transformation data for that image wthin 3D Slicer. Place them in a sequence node.
     :param shNode: node representing the subject hierarchy
-    :param transforms: list of transforms extrapolated from the transforms .csv file
+    :param transforms: list or array of transforms extrapolated from the transforms .csv file, as
+    [X, Y, Z] translations or 4x4 matrices
     :param numImages: number of 2D images loaded into 3D Slicer
+    :param progressCallback: optional progress callback (see loadImagesIntoSequenceNode)
+    :param convention: coordinate system the transforms were generated in: "LPS", "RAS", or a
+    custom 4x4 matrix mapping it to RAS (see TransformMath.conventionMatrix)
     """
     # NOTE: This represents a node within the MRML scene, not within the subject hierarchy
     transformsSequenceNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceNode",
                                                                 "Transform Nodes Sequence")
 
     # Create a progress/loading bar to display the progress of the node creation process
-    progressDialog = qt.QProgressDialog("Creating Transform Nodes From Transformation Data", "Cancel",
-                                        0, numImages)
-    progressDialog.minimumDuration = 0
-
-    # 3D Slicer works with 4x4 transform matrices internally
-    LPSToRASMatrix = vtk.vtkMatrix4x4()
-    LPSToRASMatrix.SetElement(0, 0, -1)
-    LPSToRASMatrix.SetElement(1, 1, -1)
-
-    # NOTE: It is very important that we loop using the number of 2D images loaded, versus the size
-    # of the transforms array/list. This is because we may provide a CSV with more transforms than
-    # needed, but we only need to create as many transform nodes as there are 2D images.
+    progressDialog = ProgressReporter("Creating Transform Nodes From Transformation Data", numImages,
+                                      progressCallback)
+
+    # 3D Slicer uses the RAS (Right, Anterior, Superior) basis for their coordinate system.
+    # However, the transformation data we use was generated outside of 3D Slicer, using DICOM
+    # images, which corresponds to the LPS (Left, Prosterier, Superior) basis. In order to use
+    # this data, we must convert it from LPS to RAS, in order to correctly transform the images
+    # we load into 3D Slicer. See the following links for more detail:
+    # https://www.slicer.org/wiki/Coordinate_systems#Anatomical_coordinate_system
+    # https://github.com/Slicer/Slicer/blob/main/Libs/MRML/Core/vtkITKTransformConverter.h#L246
+    # This is a simple conversion. It can be mathematically represented as:
+    # /ΔLR\   /-1  0  0  0\   /X\
+    # |ΔPA| = | 0 -1  0  0| * |Y|
+    # |ΔIS|   | 0  0  1  0|   |Z|
+    # \ 0 /   \ 0  0  0  1/   \0/
+    # Where X, Y, and Z represent the transformation in LPS.
+    # NOTE: It is very important that we use the number of 2D images loaded, versus the size of the
+    # transforms array/list. This is because we may provide a CSV with more transforms than needed,
+    # but we only need to create as many transform nodes as there are 2D images.
+    # The matrices of all the images are converted at once.
+    transformMatrices = TransformMath.matricesToRAS(TransformMath.transformMatrices(transforms)[:numImages],
+                                                    convention)
+
     for i in range(numImages):
       # If the 'Cancel' button was pressed, we want to return to a default state
       if progressDialog.wasCanceled:
         # Remove sequence node
-        shNode.RemoveNode(transformsSequenceNode)
+        slicer.mrmlScene.RemoveNode(transformsSequenceNode)
         return None
 
-      # 3D Slicer uses the RAS (Right, Anterior, Superior) basis for their coordinate system.
-      # However, the transformation data we use was generated outside of 3D Slicer, using DICOM
-      # images, which corresponds to the LPS (Left, Prosterier, Superior) basis. In order to use
-      # this data, we must convert it from LPS to RAS, in order to correctly transform the images
-      # we load into 3D Slicer. See the following links for more detail:
-      # https://www.slicer.org/wiki/Coordinate_systems#Anatomical_coordinate_system
-      # https://github.com/Slicer/Slicer/blob/main/Libs/MRML/Core/vtkITKTransformConverter.h#L246
-      # This is a simple conversion. It can be mathematically represented as:
-      # /ΔLR\   /-1  0  0  0\   /X\
-      # |ΔPA| = | 0 -1  0  0| * |Y|
-      # |ΔIS|   | 0  0  1  0|   |Z|
-      # \ 0 /   \ 0  0  0  1/   \0/
-      # Where X, Y, and Z represent the transformation in LPS.
-
-      # Convert transform from LPS to RAS
-      currentTransform = transforms[i]
-      currentTransform.append(0) # Needs to be 4x1 to multiply with a 4x4
-      convertedTransform = [0, 0, 0, 0]
-      LPSToRASMatrix.MultiplyPoint(currentTransform, convertedTransform)
-
-      # Create a transform matrix from the converted transform
-      transformMatrix = vtk.vtkMatrix4x4()
-      transformMatrix.SetElement(0, 3, convertedTransform[0])  # LR translation
-      transformMatrix.SetElement(1, 3, convertedTransform[1])  # PA translation
-      transformMatrix.SetElement(2, 3, convertedTransform[2])  # IS translation
-
-      # Create a LinearTransform node to hold our transform matrix
-      transformNode = \
-             slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", f"Transform {i + 1}")
-      transformNode.ApplyTransformMatrix(transformMatrix)
+      # Create a LinearTransform node to hold our transform matrix. The node is never added to the
+      # scene, the sequence node stores its own copy.
+      transformNode = slicer.vtkMRMLLinearTransformNode()
+      transformNode.SetName(f"Transform {i + 1}")
+      transformNode.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(transformMatrices[i]))
 
       # Add the transform node to the transforms sequence node
       transformsSequenceNode.SetDataNodeAtValue(transformNode, str(i))
-      # Remove the transform node
-      transformNodeID = shNode.GetItemByDataNode(transformNode)
-      shNode.RemoveItem(transformNodeID)
-
-      # Update how far we are in the progress bar
-      progressDialog.setValue(i + 1)
 
-      # This render step is needed for the progress bar to visually update in the GUI
-      slicer.util.forceRenderAllViews()
-      slicer.app.processEvents()
+      # Updating the GUI for every transform would dominate the creation time
+      if i % 50 == 0 or i == numImages - 1:
+        progressDialog.setValue(i + 1)
 
     print(f"{numImages} transforms were loaded into 3D Slicer as transform nodes")
     return transformsSequenceNode
 
+  def loadSegmentation(self, filepath, errorCallback=None):
+    """
+    Loads a binary 3D segmentation and creates the label map used to define the mask overlayed on
+    the 2D images during playback. Returns the (segmentation node, label map node), or (None, None)
+    if the file could not be loaded or is not binary.
+    :param filepath: path to the segmentation file
+    :param errorCallback: optional function called with (message, title) instead of showing dialogs
+    """
+    try:
+      segmentationNode = slicer.util.loadVolume(filepath, {"singleFile": True, "show": False})
+    except RuntimeError as e:
+      self.reportError(f"{os.path.basename(filepath)} failed to load.\n{e}", "Failed to Load File",
+                       errorCallback)
+      return None, None
+
+    # Check if Segmentation file is a binary mask
+    if np.unique(slicer.util.arrayFromVolume(segmentationNode)).size != 2:
+      # If the segmentation file is not binary, remove the nodes created
+      self.reportError("The segmentation file is not binary. The file was not loaded into 3D Slicer.",
+                       "Input Error", errorCallback)
+      slicer.mrmlScene.RemoveNode(segmentationNode)
+      return None, None
+
+    self.clearSliceForegrounds()
+    segmentationNode.SetName("3D Segmentation")
+
+    # Create a label map of the 3D segmentation that will be used to define the mask overlayed
+    # on the 2D images during playback
+    volumesModuleLogic = slicer.modules.volumes.logic()
+    segmentationLabelMap = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode',
+                                                              "3D Segmentation Label Map")
+    volumesModuleLogic.CreateLabelVolumeFromVolume(slicer.mrmlScene, segmentationLabelMap,
+                                                   segmentationNode)
+    return segmentationNode, segmentationLabelMap
+
+  def loadSession(self, imagePaths, transformsPath=None, transformsHeaders=None, segmentationPath=None,
+                  numWorkers=1, lazy=False, compact=False, cropMargin=None, frameOptions=None,
+                  transformTable=False, transformsConvention="LPS", transformsTimeOptions=None,
+                  transformsLayout="translation", progressCallback=None, errorCallback=None):
+    """
+    Loads the cine images, and optionally the transforms and the 3D segmentation, without any
+    widget involved. This is the entry point for scripts and batch processing, e.g.:
+      errors = []
+      session = logic.loadSession(paths, "transforms.csv", ["X", "Y", "Z"], "mask.nrrd",
+                                  progressCallback=lambda label, value, maximum: False,
+                                  errorCallback=lambda message, title: errors.append(message))
+    Returns a dictionary holding the created nodes ("imagesSequenceNode", "transformsSequenceNode",
+    "sequenceBrowserNode", "segmentationNode", "segmentationLabelMapNode"), the number of images
+    ("numImages"), whether loading was cancelled ("cancelled") and the reported errors ("errors").
+    :param imagePaths: list of image files and/or directories holding the cine images
+    :param transformsPath: optional path to the transforms file
+    :param transformsHeaders: names of the columns of the transforms layout, e.g. the X, Y and Z
+    columns. The first columns of the file are used if not provided
+    :param segmentationPath: optional path to the 3D segmentation file
+    :param numWorkers: number of threads decoding the images
+    :param lazy: whether the frames are decoded on demand
+    :param compact: whether the frames are stored with the narrowest pixel type
+    :param cropMargin: if provided along with a segmentation, only the region of the frames the
+    segmentation can reach (see computeCropBox), extended by this margin in mm, is loaded
+    :param frameOptions: optional dictionary of frame selection options (stride, startIndex,
+    endIndex, startTime, endTime) passed to loadImagesIntoSequenceNode
+    :param transformTable: if True, the transforms are kept in a single transform table (see
+    createTransformTableFromTransformData) and "transformsSequenceNode" holds its transform node
+    :param transformsConvention: coordinate system the transforms were generated in: "LPS", "RAS",
+    or a custom 4x4 matrix mapping it to RAS
+    :param transformsTimeOptions: optional dictionary of timestamp alignment options (timeHeader,
+    timeOffset, timeScale) passed to validateTransformsInput, to interpolate the transform of every
+    image from a timestamp column instead of reading a row per image
+    :param transformsLayout: layout of the transforms columns (see TransformMath.TRANSFORM_LAYOUTS)
+    :param progressCallback: optional progress callback (see loadImagesIntoSequenceNode)
+    :param errorCallback: optional function called with (message, title). Errors are collected in
+    the returned dictionary in any case, and no dialog is shown
+    """
+    errors = []
+
+    def onError(message, title):
+      errors.append(message)
+      if errorCallback is not None:
+        errorCallback(message, title)
+
+    session = {
+      "imagesSequenceNode": None,
+      "transformsSequenceNode": None,
+      "sequenceBrowserNode": None,
+      "segmentationNode": None,
+      "segmentationLabelMapNode": None,
+      "numImages": 0,
+      "cancelled": False,
+      "errors": errors,
+    }
+    # Without a callback, progress is not reported at all
+    if progressCallback is None:
+      progressCallback = lambda labelText, value, maximum: False
+
+    # The segmentation and the transforms define the crop box, so they are read before the images
+    cropBox = None
+    if segmentationPath:
+      session["segmentationNode"], session["segmentationLabelMapNode"] = \
+        self.loadSegmentation(segmentationPath, onError)
+    numTransformsColumns = TransformMath.layoutColumnCount(transformsLayout)
+    if transformsPath and transformsHeaders is None:
+      transformsHeaders = \
+        (self.getColumnNamesFromTransformsInput(transformsPath, onError) or [])[:numTransformsColumns]
+    if cropMargin is not None and session["segmentationNode"] is not None:
+      transforms = None
+      if transformsPath and len(transformsHeaders) == numTransformsColumns:
+        transforms = self.validateTransformsInput(transformsPath, None, transformsHeaders, onError,
+                                                  asArray=True, layout=transformsLayout)
+      cropBox = self.computeCropBox(session["segmentationNode"], transforms, cropMargin, transformsConvention)
+
+    shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
+    imagesSequenceNode, cancelled = self.loadImagesIntoSequenceNode(shNode, imagePaths, numWorkers, lazy,
+                                                                    compact=compact, cropBox=cropBox,
+                                                                    **(frameOptions or {}),
+                                                                    progressCallback=progressCallback,
+                                                                    errorCallback=onError)
+    session["cancelled"] = cancelled
+    if cancelled:
+      return session
+    if imagesSequenceNode is None:
+      onError("No image files were found within the selected files.", "Input Error")
+      return session
+    session["imagesSequenceNode"] = imagesSequenceNode
+    session["numImages"] = imagesSequenceNode.GetNumberOfDataNodes()
+
+    sequenceBrowserNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSequenceBrowserNode", "Sequence Browser")
+    sequenceBrowserNode.AddSynchronizedSequenceNode(imagesSequenceNode)
+    session["sequenceBrowserNode"] = sequenceBrowserNode
+
+    if transformsPath:
+      transforms = None
+      if len(transformsHeaders) == numTransformsColumns:
+        transforms = self.validateTransformsInput(transformsPath, session["numImages"], transformsHeaders,
+                                                  onError, self.getFrameSelection(imagesSequenceNode),
+                                                  frameTimes=self.getFrameTimes(imagesSequenceNode),
+                                                  layout=transformsLayout, **(transformsTimeOptions or {}))
+      if transforms and transformTable:
+        session["transformsSequenceNode"] = self.createTransformTableFromTransformData(transforms,
+                                                                                       session["numImages"],
+                                                                                       transformsConvention)
+      elif transforms:
+        transformsSequenceNode = self.createTransformNodesFromTransformData(shNode, transforms,
+                                                                            session["numImages"],
+                                                                            progressCallback,
+                                                                            transformsConvention)
+        if transformsSequenceNode is None:
+          session["cancelled"] = True
+          return session
+        sequenceBrowserNode.AddSynchronizedSequenceNode(transformsSequenceNode)
+        session["transformsSequenceNode"] = transformsSequenceNode
+
+    return session
+
+  def createTransformTableFromTransformData(self, transforms, numImages, convention="LPS"):
+    """
+    Alternative to createTransformNodesFromTransformData keeping the transforms of all the images in
+    a single array. A single transform node is created, and the transform of the selected image is
+    applied to it in place during playback (see updateFrameTransform). Returns the transform node.
+    :param transforms: list or array of transforms extrapolated from the transforms file, as
+    [X, Y, Z] translations or 4x4 matrices
+    :param numImages: number of 2D images loaded into 3D Slicer
+    :param convention: coordinate system the transforms were generated in (see
+    createTransformNodesFromTransformData)
+    """
+    self.clearTransformTable()
+    # Convert every transform to RAS at once (see createTransformNodesFromTransformData). Translations
+    # are kept as an Nx3 array.
+    transforms = TransformMath.transformMatrices(transforms)[:numImages]
+    if TransformMath.isTranslationOnly(transforms):
+      transforms = TransformMath.translationsToRAS(transforms[:, :3, 3], convention)
+    else:
+      transforms = TransformMath.matricesToRAS(transforms, convention)
+    transformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Frame Transform")
+    self.transformTable = TransformTable(transformNode, transforms)
+    self.transformTable.setFrame(0)
+    print(f"{numImages} transforms were loaded into 3D Slicer as a transform table")
+    return transformNode
+
+  def getTransformTable(self, transformNode):
+    """
+    Returns the transform table applied to a transform node, restoring it from the attributes of
+    the node if needed (e.g. once a saved scene is loaded), or None if the node is not the node of a
+    transform table (see createTransformTableFromTransformData).
+    :param transformNode: transform node, or sequence node containing the transforms
+    """
+    if self.transformTable is not None and transformNode is self.transformTable.transformNode:
+      return self.transformTable
+    if transformNode is None or not transformNode.IsA("vtkMRMLLinearTransformNode"):
+      return None
+    transformTable = TransformTable.fromTransformNode(transformNode)
+    if transformTable is not None:
+      self.transformTable = transformTable
+    return transformTable
+
+  def clearTransformTable(self):
+    """
+    Removes the transform node created by createTransformTableFromTransformData, if any.
+    """
+    if self.transformTable is not None:
+      if slicer.mrmlScene.IsNodePresent(self.transformTable.transformNode):
+        slicer.mrmlScene.RemoveNode(self.transformTable.transformNode)
+      self.transformTable = None
+
+  def updateFrameTransform(self, sequenceBrowser):
+    """
+    Applies the transform of the image selected by the sequence browser to the transform node of
+    the transform table. Returns the transform node.
+    :param sequenceBrowser: sequence browser node used to control the playback operation
+    """
+    if self.transformTable is None:
+      return None
+    self.transformTable.setFrame(sequenceBrowser.GetSelectedItemNumber())
+    return self.transformTable.transformNode
+
   def clearSliceForegrounds(self):
     """
     Clear each slice view from having anything visible in the foreground. This often happens
     inadvertently when using loadVolume() with "show" set to False.
     """
     layoutManager = slicer.app.layoutManager()
+    # There are no slice views when running without a main window (e.g. batch processing)
+    if layoutManager is None:
+      return
     for viewName in layoutManager.sliceViewNames():
       layoutManager.sliceWidget(viewName).mrmlSliceCompositeNode().SetForegroundVolumeID("None")
 
@@ -423,317 +1379,433 @@ class TrackLogic(ScriptedLoadableModuleLogic):
     """
     Visualizes the image data (2D images and 3D segmentation overlay) within the slice views and
     enables the alignment of the 3D segmentation label map according to the transformation data.
+    Only the first call, and calls after the inputs or display options changed, wire the views (see
+    setupVisualization). Otherwise, only the image data, transform and annotation text of the
+    selected frame are updated (see updateFrame).
     :param sequenceBrowser: sequence browser node used to control the playback operation
     :param sequenceNode2DImages: sequence node containing the 2D images
     :param segmentationLabelMapID: subject hierarchy ID of the 3D segmentation label map
-    :param sequenceNodeTransforms: sequence node containing the transforms
+    :param sequenceNodeTransforms: sequence node containing the transforms, or the transform node of
+    the transform table (see createTransformTableFromTransformData)
     :param opacity: opacity value of overlay layer (3D segmentation label map layer)
     :param overlayAsOutline: whether to show the overlay as an outline or a filled region
+    :param overlayThickness: thickness of the slice intersections of the overlay
+    :param show: whether to display "Current Alignment" in the slice view of the frame
+    :param customParamNode: parameter node holding the overlay color
     """
-    shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
-    layoutManager = slicer.app.layoutManager()
+    # Frames loaded on demand only get their voxels once they are selected
+    self.ensureFrameResident(sequenceBrowser, sequenceNode2DImages)
 
-    # The proxy image node represents the current selected image within the sequence
-    proxy2DImageNode = sequenceBrowser.GetProxyNode(sequenceNode2DImages)
     # The proxy transform node represents the current selected transform within the sequence
-    proxyTransformNode = sequenceBrowser.GetProxyNode(sequenceNodeTransforms)
+    if self.getTransformTable(sequenceNodeTransforms) is not None:
+      proxyTransformNode = self.updateFrameTransform(sequenceBrowser)
+    else:
+      proxyTransformNode = sequenceBrowser.GetProxyNode(sequenceNodeTransforms)
+
+    overlayColor = None
+    if customParamNode and hasattr(customParamNode, 'overlayColor'):
+      overlayColor = tuple(customParamNode.overlayColor)
+    # Precomputed overlays are only used with the inputs they were computed from
+    overlayMasks = self.overlayMasks
+    if overlayMasks is not None and overlayMasks.key != self.getOverlayMasksKey(
+        sequenceNode2DImages, segmentationLabelMapID, sequenceNodeTransforms):
+      overlayMasks = None
+    setupKey = (sequenceBrowser.GetID(), sequenceNode2DImages.GetID(), segmentationLabelMapID,
+                proxyTransformNode.GetID() if proxyTransformNode is not None else None,
+                opacity, overlayAsOutline, overlayThickness, overlayColor, id(overlayMasks))
+    if self.visualizationState is None or self.visualizationState["key"] != setupKey:
+      self.setupVisualization(segmentationLabelMapID, proxyTransformNode, overlayThickness, overlayColor)
+      self.visualizationState["key"] = setupKey
+      self.visualizationState["overlayMasks"] = overlayMasks
+
+    self.updateFrame(sequenceBrowser, sequenceNode2DImages, opacity, overlayAsOutline, show)
+
+  def setupVisualization(self, segmentationLabelMapID, proxyTransformNode, overlayThickness, overlayColor=None):
+    """
+    Wires the scene for the playback: sets the color and slice intersection thickness of the 3D
+    segmentation label map, makes it follow the transform of the selected frame and shows it in the
+    3D view. The slice views are wired the first time they show a frame (see updateFrame).
+    :param segmentationLabelMapID: subject hierarchy ID of the 3D segmentation label map
+    :param proxyTransformNode: transform node holding the transform of the selected frame
+    :param overlayThickness: thickness of the slice intersections of the overlay
+    :param overlayColor: color of the overlay, None to keep the current color
+    """
+    shNode = slicer.mrmlScene.GetSubjectHierarchyNode()
     labelMapNode = shNode.GetItemDataNode(segmentationLabelMapID)
 
     displayNode = labelMapNode.GetDisplayNode()
     if displayNode:
       colorNode = displayNode.GetColorNode()
-      if colorNode and customParamNode and hasattr(customParamNode, 'overlayColor'):
-        colorNode.SetColor(1, *customParamNode.overlayColor)
+      if colorNode and overlayColor is not None:
+        colorNode.SetColor(1, *overlayColor)
         displayNode.SetAndObserveColorNodeID(colorNode.GetID())
 
       displayNode.SetSliceIntersectionThickness(overlayThickness)
 
-    if proxy2DImageNode.GetImageData().GetDataDimension() == 2:
-      sliceWidget = self.getSliceWidget(layoutManager, proxy2DImageNode)
+    # Enable alignment of the 3D segmentation label map according to the transform data so that
+    # the 3D segmentation label map overlays upon the ROI of the 2D images
+    if proxyTransformNode is not None:
+      labelMapNode.SetAndObserveTransformNodeID(proxyTransformNode.GetID())
+
+    # Make the 3D segmentation visible in the 3D view
+    tmpIdList = vtk.vtkIdList() # The nodes you want to display need to be in a vtkIdList
+    tmpIdList.InsertNextId(segmentationLabelMapID)
+    threeDViewNode = slicer.app.layoutManager().activeMRMLThreeDViewNode()
+    shNode.ShowItemsInView(tmpIdList, threeDViewNode)
+
+    self.visualizationState = {"key": None, "labelMapNode": labelMapNode}
+
+  def resetVisualization(self):
+    """
+    Forgets the wiring of the views, so that the next call to visualize sets them up again. Called
+    when the slice views are cleared.
+    """
+    self.visualizationState = None
+
+  def updateFrame(self, sequenceBrowser, sequenceNode2DImages, opacity, overlayAsOutline, show=False):
+    """
+    Displays the selected frame once the views are set up (see setupVisualization). The voxels of
+    the frame are swapped into the retained background volume of its slice view, and only the
+    state that differs from what is displayed is modified. A 3D frame is displayed in every slice
+    view. The modified views are rendered by the render scheduler (see RenderScheduler). When the
+    overlays of the 2D frames were precomputed (see precomputeOverlayMasks), the slice view shows
+    the overlay of the frame instead of reslicing the moved label map.
+    :param sequenceBrowser: sequence browser node used to control the playback operation
+    :param sequenceNode2DImages: sequence node containing the 2D images
+    :param opacity: opacity value of overlay layer (3D segmentation label map layer)
+    :param overlayAsOutline: whether to show the overlay as an outline or a filled region
+    :param show: whether to display "Current Alignment" in the slice view of the frame
+    """
+    layoutManager = slicer.app.layoutManager()
+    # The proxy image node represents the current selected image within the sequence
+    proxy2DImageNode = sequenceBrowser.GetProxyNode(sequenceNode2DImages)
+    labelMapNode = self.visualizationState["labelMapNode"]
+    overlayMasks = self.visualizationState["overlayMasks"]
 
-      name = None
-      fitSlice = None
-      if sliceWidget is not None:
-        name = sliceWidget.sliceViewName
-          
-        sliceCompositeNode = sliceWidget.mrmlSliceCompositeNode()
+    if proxy2DImageNode.GetImageData().GetDataDimension() == 2:
+      sliceWidgets = [self.getFrameSliceWidget(layoutManager, sequenceBrowser, sequenceNode2DImages)]
+    else:
+      sliceWidgets = self.getSliceWidgets(layoutManager, proxy2DImageNode)
+      show = False
+      overlayMasks = None
+
+    # The transform of a new frame moves the label map in the 3D view and, unless the overlays are
+    # precomputed, in every slice view showing it
+    itemNumber = sequenceBrowser.GetSelectedItemNumber()
+    dirtyViews = set()
+    frameChanged = self.visualizationState.get("itemNumber") != itemNumber
+    if frameChanged:
+      self.visualizationState["itemNumber"] = itemNumber
+      if overlayMasks is None:
+        dirtyViews.update(color for color in self.backgrounds if getattr(self, color.lower() + 'Background') is not None)
+
+    frameName = proxy2DImageNode.GetAttribute('Sequences.BaseName')
+    for sliceWidget in sliceWidgets:
+      if sliceWidget is None or sliceWidget.sliceViewName not in self.backgrounds:
+        continue
+      name = sliceWidget.sliceViewName
+      dirtyViews.add(name)
+      sliceCompositeNode = sliceWidget.mrmlSliceCompositeNode()
 
-        volumesLogic = slicer.modules.volumes.logic()
-        
+      # Preserve previous slices
+      # If a background node for the specified orientation exists, point it to the current slice
+      # Otherwise, create a new background node and set it as the background for the specified orientation
+      background = getattr(self, name.lower() + 'Background')
+      if background is None:
+        background = self.createRetainedBackground(name, proxy2DImageNode)
+        setattr(self, name.lower() + 'Background', background)
+      elif background.GetImageData() is not proxy2DImageNode.GetImageData():
+        # Background exists, just reference the voxels of the next image in the sequence
+        background.SetAndObserveImageData(proxy2DImageNode.GetImageData())
+      self.backgroundFrameNames[name] = frameName
+
+      overlayNode = labelMapNode
+      if overlayMasks is not None:
+        overlayNode = self.updateOverlayMaskNode(name, overlayMasks, itemNumber, labelMapNode)
+
+      # Wire a slice view the first time it shows a frame, or once it was cleared
+      if sliceCompositeNode.GetLabelVolumeID() != overlayNode.GetID():
         # Checks if the current slice node is not showing an image
-        fitSlice = False
-        if sliceCompositeNode.GetLabelVolumeID() is None:
-          fitSlice = True
-        
-        sliceCompositeNode.SetLabelVolumeID(labelMapNode.GetID())
+        fitSlice = sliceCompositeNode.GetLabelVolumeID() is None
+        sliceCompositeNode.SetLabelVolumeID(overlayNode.GetID())
         sliceCompositeNode.SetLabelOpacity(opacity)
-        
-        sliceCompositeNode.SetBackgroundVolumeID(labelMapNode.GetID())
-        
-        # Get the current slice node
         sliceNode = sliceWidget.mrmlSliceNode()
-
         # Display the label map overlay as an outline
         sliceNode.SetUseLabelOutline(overlayAsOutline)
+        sliceNode.SetSliceVisible(True)
+        sliceCompositeNode.SetBackgroundVolumeID(background.GetID())
+        # If the sliceNode is now showing an image, fit the slice view to the current background image
+        if fitSlice:
+          sliceWidget.fitSliceToBackground()
+      else:
+        if sliceCompositeNode.GetLabelOpacity() != opacity:
+          sliceCompositeNode.SetLabelOpacity(opacity)
+        if sliceWidget.mrmlSliceNode().GetUseLabelOutline() != bool(overlayAsOutline):
+          sliceWidget.mrmlSliceNode().SetUseLabelOutline(overlayAsOutline)
+        if sliceCompositeNode.GetBackgroundVolumeID() != background.GetID():
+          sliceCompositeNode.SetBackgroundVolumeID(background.GetID())
+
+    # Place the image names, and "Current Alignment" in the slice view of the frame when required
+    currentViewName = sliceWidgets[0].sliceViewName if show and sliceWidgets[0] is not None else None
+    for color in self.backgrounds:
+      cornerAnnotation = layoutManager.sliceWidget(color).sliceView().cornerAnnotation()
+      # Remove the observers preserving the text while paused (see Track.onPlayButton)
+      if cornerAnnotation.HasObserver(vtk.vtkCommand.ModifiedEvent):
+        cornerAnnotation.RemoveAllObservers()
+      texts = {
+        vtk.vtkCornerAnnotation.LowerLeft: self.backgroundFrameNames.get(color) or "",
+        vtk.vtkCornerAnnotation.UpperLeft: "Current Alignment" if color == currentViewName else "",
+      }
+      for corner, text in texts.items():
+        if (cornerAnnotation.GetText(corner) or "") != text:
+          cornerAnnotation.SetText(corner, text)
+          dirtyViews.add(color)
+
+    # Only the modified views are rendered, once the event loop runs again
+    self.renderScheduler.requestRender(dirtyViews, threeD=bool(dirtyViews))
+
+  def getOverlayMasksKey(self, sequenceNode2DImages, segmentationLabelMapID, sequenceNodeTransforms):
+    """
+    Identifies the images, label map and transforms overlay masks are computed from (see
+    precomputeOverlayMasks).
+    """
+    labelMapNode = slicer.mrmlScene.GetSubjectHierarchyNode().GetItemDataNode(segmentationLabelMapID)
+    if labelMapNode is None or sequenceNodeTransforms is None:
+      return None
+    transformTable = self.getTransformTable(sequenceNodeTransforms)
+    return (sequenceNode2DImages.GetID(), sequenceNode2DImages.GetNumberOfDataNodes(), labelMapNode.GetID(),
+            labelMapNode.GetImageData().GetMTime(), sequenceNodeTransforms.GetID(), id(transformTable))
+
+  def getFrameTransformMatrices(self, sequenceNodeTransforms, numFrames):
+    """
+    Returns the RAS transform applied to the label map for every frame, as an Nx4x4 array.
+    :param sequenceNodeTransforms: sequence node containing the transforms, or the transform node of
+    the transform table (see createTransformTableFromTransformData)
+    :param numFrames: number of frames
+    """
+    transformTable = self.getTransformTable(sequenceNodeTransforms)
+    if transformTable is not None:
+      matrices = TransformMath.transformMatrices(transformTable.transforms)
+    else:
+      matrices = np.stack([slicer.util.arrayFromTransformMatrix(sequenceNodeTransforms.GetNthDataNode(itemNumber))
+                           for itemNumber in range(sequenceNodeTransforms.GetNumberOfDataNodes())])
+    # Frames past the last transform get the last transform, as during playback
+    return matrices[np.minimum(np.arange(numFrames), len(matrices) - 1)]
 
-        # Set the background volume for the current slice view
-        sliceCompositeNode.SetBackgroundVolumeID(proxy2DImageNode.GetID())
+  def precomputeOverlayMasks(self, sequenceNode2DImages, segmentationLabelMapID, sequenceNodeTransforms,
+                             numWorkers=1, progressCallback=None):
+    """
+    Computes the overlay of the 3D segmentation label map on every 2D frame ahead of playback: the
+    intersection of the label map, moved by the transform of the frame, with the plane of the frame
+    (see OverlayMasks.overlayMask). During playback, the slice view of a frame then shows its
+    precomputed overlay instead of reslicing the moved label map (see updateFrame). The masks are
+    bit-packed, and the memory they use is printed and kept in overlayMemoryReport. Returns True if
+    the masks were computed.
+    :param sequenceNode2DImages: sequence node containing the 2D images
+    :param segmentationLabelMapID: subject hierarchy ID of the 3D segmentation label map
+    :param sequenceNodeTransforms: sequence node containing the transforms, or the transform node of
+    the transform table (see createTransformTableFromTransformData)
+    :param numWorkers: number of threads computing the masks
+    :param progressCallback: optional progress callback (see loadImagesIntoSequenceNode)
+    """
+    self.clearOverlayMasks()
+    labelMapNode = slicer.mrmlScene.GetSubjectHierarchyNode().GetItemDataNode(segmentationLabelMapID)
+    numFrames = sequenceNode2DImages.GetNumberOfDataNodes()
+    matrix = vtk.vtkMatrix4x4()
+    frameGeometries = []
+    for itemNumber in range(numFrames):
+      frameNode = sequenceNode2DImages.GetNthDataNode(itemNumber)
+      # Frames loaded on demand are placeholders, but have the geometry of the frame
+      if frameNode.GetImageData().GetDataDimension() == 3:
+        print("Overlays are only precomputed for 2D images")
+        return False
+      frameNode.GetIJKToRASMatrix(matrix)
+      frameGeometries.append((slicer.util.arrayFromVTKMatrix(matrix),
+                              tuple(frameNode.GetImageData().GetDimensions())[::-1]))
+    labelMapNode.GetIJKToRASMatrix(matrix)
+    labelIJKToRAS = slicer.util.arrayFromVTKMatrix(matrix)
+
+    progressDialog = ProgressReporter("Precomputing overlays", numFrames, progressCallback)
+    def onProgress(numComputed):
+      progressDialog.setValue(numComputed)
+      return progressDialog.wasCanceled
+
+    overlayMasks = computeOverlayMasks(
+      self.getOverlayMasksKey(sequenceNode2DImages, segmentationLabelMapID, sequenceNodeTransforms),
+      slicer.util.arrayFromVolume(labelMapNode), labelIJKToRAS, frameGeometries,
+      self.getFrameTransformMatrices(sequenceNodeTransforms, numFrames), numWorkers, onProgress)
+    if overlayMasks is None:
+      return False
+
+    self.overlayMasks = overlayMasks
+    self.overlayMemoryReport = {
+      "numFrames": len(overlayMasks),
+      "numGeometries": len(overlayMasks.frameGeometries),
+      "bytes": overlayMasks.nbytes,
+    }
+    print(f"Overlays of {len(overlayMasks)} frames were precomputed, using {overlayMasks.nbytes / 2**20:.1f} MB")
+    return True
 
-        # Translate the 3D segmentation label map using the transform data
-        if proxyTransformNode is not None:
-          labelMapNode.SetAndObserveTransformNodeID(proxyTransformNode.GetID())
-        
-        sliceNode.SetSliceVisible(True)
+  def clearOverlayMasks(self):
+    """
+    Removes the precomputed overlays (see precomputeOverlayMasks) and the label map nodes showing
+    them. The slice views reslice the label map again.
+    """
+    self.overlayMasks = None
+    self.overlayMemoryReport = None
+    for maskNode in self.overlayMaskNodes.values():
+      if slicer.mrmlScene.IsNodePresent(maskNode):
+        displayNode = maskNode.GetDisplayNode()
+        slicer.mrmlScene.RemoveNode(maskNode)
+        if displayNode is not None and slicer.mrmlScene.IsNodePresent(displayNode):
+          slicer.mrmlScene.RemoveNode(displayNode)
+    self.overlayMaskNodes = {}
+
+  def updateOverlayMaskNode(self, viewName, overlayMasks, frameIndex, labelMapNode):
+    """
+    Shows the precomputed overlay of a frame in the label map node of a slice view, created the
+    first time. The node has the geometry of the frame, and its own display node using the color
+    table of the label map. Its voxels are overwritten in place, and only reallocated when the
+    geometry changes.
+    Returns the label map node.
+    :param viewName: name of the slice view ("Red", "Green" or "Yellow")
+    :param overlayMasks: precomputed overlays (see precomputeOverlayMasks)
+    :param frameIndex: index of the frame
+    :param labelMapNode: 3D segmentation label map node
+    """
+    maskNode = self.overlayMaskNodes.get(viewName)
+    if maskNode is None or not slicer.mrmlScene.IsNodePresent(maskNode):
+      maskNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", f"{viewName} Overlay")
+      maskNode.CreateDefaultDisplayNodes()
+      self.overlayMaskNodes[viewName] = maskNode
+    # The overlay has the colors of the label map
+    labelMapDisplayNode = labelMapNode.GetDisplayNode()
+    maskDisplayNode = maskNode.GetDisplayNode()
+    if labelMapDisplayNode is not None and maskDisplayNode.GetColorNodeID() != labelMapDisplayNode.GetColorNodeID():
+      maskDisplayNode.SetAndObserveColorNodeID(labelMapDisplayNode.GetColorNodeID())
+    if maskNode.GetAttribute("Track.OverlayFrame") == str(frameIndex):
+      return maskNode
+
+    frameIJKToRAS, shape = overlayMasks.geometry(frameIndex)
+    geometryIndex = str(overlayMasks.geometryIndices[frameIndex])
+    if maskNode.GetAttribute("Track.OverlayGeometry") != geometryIndex:
+      maskNode.SetIJKToRASMatrix(slicer.util.vtkMatrixFromArray(frameIJKToRAS))
+      maskNode.SetAndObserveImageData(FrameIO.imageDataFromArray(np.zeros(shape, dtype=np.uint8)))
+      maskNode.SetAttribute("Track.OverlayGeometry", geometryIndex)
+    slicer.util.arrayFromVolume(maskNode)[:] = overlayMasks.mask(frameIndex)
+    maskNode.GetImageData().Modified()
+    maskNode.SetAttribute("Track.OverlayFrame", str(frameIndex))
+    return maskNode
+
+  def createRetainedBackground(self, viewName, proxy2DImageNode):
+    """
+    Creates the volume node keeping the last frame shown in a slice view once the sequence shows a
+    frame of another orientation. It references the voxels, geometry and display node of the frame,
+    so no voxels are copied, and keeping another frame only points it to other voxels.
+    :param viewName: name of the slice view ("Red", "Green" or "Yellow")
+    :param proxy2DImageNode: proxy node of the 2D images sequence, holding the current frame
+    """
+    background = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", f"{viewName} Background")
+    background.CopyOrientation(proxy2DImageNode)
+    background.SetAndObserveImageData(proxy2DImageNode.GetImageData())
+    # The display node of the frame is shared, so the window/level follows the sequence
+    if proxy2DImageNode.GetDisplayNode() is None:
+      proxy2DImageNode.CreateDefaultDisplayNodes()
+    background.SetAndObserveDisplayNodeID(proxy2DImageNode.GetDisplayNodeID())
+    return background
+
+  def removeRetainedBackgrounds(self, viewNames=None):
+    """
+    Removes the volume nodes keeping the last frame shown in the slice views (see
+    createRetainedBackground). The shared display nodes are kept.
+    :param viewNames: names of the slice views, None for every slice view
+    """
+    for name in (viewNames if viewNames is not None else self.backgrounds):
+      background = getattr(self, name.lower() + 'Background')
+      if background is not None and slicer.mrmlScene.IsNodePresent(background):
+        # Unreference the display node first, it belongs to the frames of the sequence
+        background.RemoveAllDisplayNodeIDs()
+        background.SetAndObserveImageData(None)
+        slicer.mrmlScene.RemoveNode(background)
+      setattr(self, name.lower() + 'Background', None)
+      self.backgroundFrameNames.pop(name, None)
+
+  def indexFrameOrientations(self, imagesSequenceNode):
+    """
+    Computes the slice view orientation of every image of the sequence node from its geometry (see
+    FrameIO.sliceOrientation), so that visualizing a frame only looks it up (see
+    getFrameOrientation). Called once the images are loaded.
+    :param imagesSequenceNode: sequence node containing the 2D images
+    """
+    orientations = {}
+    for itemNumber in range(imagesSequenceNode.GetNumberOfDataNodes()):
+      size, _, _, direction = FrameIO.geometryFromVolumeNode(imagesSequenceNode.GetNthDataNode(itemNumber))
+      orientations[imagesSequenceNode.GetNthIndexValue(itemNumber)] = FrameIO.sliceOrientation(size, direction)
+    self.frameOrientations[imagesSequenceNode.GetID()] = orientations
+    return orientations
+
+  def getFrameOrientation(self, imagesSequenceNode, itemNumber):
+    """
+    Returns the slice view orientation ("Sagittal", "Coronal" or "Axial") of an image of the
+    sequence node. Orientations are indexed by index value, so frames appended or dropped while
+    watching a folder (see startFolderWatch) keep theirs, and only new frames are computed.
+    :param imagesSequenceNode: sequence node containing the 2D images
+    :param itemNumber: position of the image in the sequence
+    """
+    orientations = self.frameOrientations.get(imagesSequenceNode.GetID())
+    if orientations is None:
+      orientations = self.indexFrameOrientations(imagesSequenceNode)
+    indexValue = imagesSequenceNode.GetNthIndexValue(itemNumber)
+    orientation = orientations.get(indexValue)
+    if orientation is None:
+      # Forget the frames dropped from a ring buffer sequence
+      if len(orientations) > 2 * imagesSequenceNode.GetNumberOfDataNodes():
+        orientations = self.indexFrameOrientations(imagesSequenceNode)
+      size, _, _, direction = FrameIO.geometryFromVolumeNode(imagesSequenceNode.GetNthDataNode(itemNumber))
+      orientation = orientations[indexValue] = FrameIO.sliceOrientation(size, direction)
+    return orientation
+
+  def getFrameSliceWidget(self, layoutManager, sequenceBrowser, sequenceNode2DImages):
+    """
+    Returns the slice widget displaying the selected image of the sequence, found from the
+    orientation index (see getFrameOrientation).
+    :param layoutManager: node representing the MRML layout manager
+    :param sequenceBrowser: sequence browser node
+    :param sequenceNode2DImages: sequence node containing the 2D images
+    """
+    imageOrientation = self.getFrameOrientation(sequenceNode2DImages, sequenceBrowser.GetSelectedItemNumber())
+    return self.getSliceWidgetByOrientation(layoutManager, imageOrientation)
 
-      # Make the 3D segmentation visible in the 3D view
-      tmpIdList = vtk.vtkIdList() # The nodes you want to display need to be in a vtkIdList
-      tmpIdList.InsertNextId(segmentationLabelMapID)
-      threeDViewNode = layoutManager.activeMRMLThreeDViewNode()
-      shNode.ShowItemsInView(tmpIdList, threeDViewNode)
+  def getSliceWidgetByOrientation(self, layoutManager, imageOrientation):
+    """
+    Returns the slice widget with the provided orientation.
+    :param layoutManager: node representing the MRML layout manager
+    :param imageOrientation: "Sagittal", "Coronal" or "Axial"
+    """
+    # Find the slice widget that has the same orientation as the image
+    sliceWidget = None
+    for name in layoutManager.sliceViewNames():
+      if layoutManager.sliceWidget(name).sliceOrientation == imageOrientation:
+        sliceWidget = layoutManager.sliceWidget(name)
 
-      # If the sliceNode is now showing an image, fit the slice view to the current background image   
-      if fitSlice:
-        sliceWidget.fitSliceToBackground()
-      
-      # Preserve previous slices
-      # If a background node for the specified orientation exists, update it with the current slice
-      # Otherwise, create a new background node and set it as the background for the specified orientation
-      
-      if name in self.backgrounds:
-        background = getattr(self, name.lower() + 'Background')
-        if background is None:
-          # Create a new background node for the orientation
-          setattr(self, name.lower() + 'Background', volumesLogic.CloneVolume(slicer.mrmlScene,
-                  proxy2DImageNode, f"{proxy2DImageNode.GetAttribute('Sequences.BaseName')}"))
-        else:
-          # Background exists, just replace the data to represent the next image in the sequence
-          background.SetAndObserveImageData(proxy2DImageNode.GetImageData())
-          background.SetAttribute("Sequences.BaseName", proxy2DImageNode.GetAttribute("Sequences.BaseName"))
-      
-      # Add the image name to the slice view background variable
-      if name is not None:
-        currentSlice = getattr(self, name.lower() + 'Background')
-        currentSlice.SetName(proxy2DImageNode.GetAttribute('Sequences.BaseName'))
-
-      # Set the background volumes for each orientation, if they exist
-      for color in self.backgrounds:
-        sliceViewWindow = slicer.app.layoutManager().sliceWidget(color).sliceView()
-        sliceViewWindow.cornerAnnotation().RemoveAllObservers()
-        currentSlice = getattr(self, color.lower() + 'Background')
-        sliceViewWindow.cornerAnnotation().ClearAllTexts()
-        # Add desired text to slice views that have a background node
-        if currentSlice is not None:
-          slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").SetBackgroundVolumeID(currentSlice.GetID())
-          imageFile = slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").GetNodeReference('backgroundVolume') is not None
-          if imageFile:
-            imageFileNameText = slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").GetNodeReference('backgroundVolume').GetAttribute('Sequences.BaseName')
-            # Place "Current Alignment" text in the slice view corner
-            sliceViewWindow = slicer.app.layoutManager().sliceWidget(color).sliceView()
-            sliceViewWindow.cornerAnnotation().SetText(0, imageFileNameText)
-      
-      for color in self.backgrounds:
-        sliceViewWindow = slicer.app.layoutManager().sliceWidget(color).sliceView()
-        if sliceViewWindow.cornerAnnotation().HasObserver(vtk.vtkCommand.ModifiedEvent):
-          sliceViewWindow.cornerAnnotation().RemoveAllObservers()
-        if sliceViewWindow.cornerAnnotation().HasObserver(vtk.vtkCornerAnnotation.UpperLeft):
-          sliceViewWindow.cornerAnnotation().RemoveAllObservers()
-
-      # Ensure "Current Alignment" text is displayed in the slice view corner only when required
-      if show:
-        if sliceWidget is not None:
-          sliceView = sliceWidget.sliceView()
-          sliceView.cornerAnnotation().SetText(vtk.vtkCornerAnnotation.UpperLeft, "Current Alignment")
-      # Enable alignment of the 3D segmentation label map according to the transform data so that
-      # the 3D segmentation label map overlays upon the ROI of the 2D images
-      if proxyTransformNode is not None:
-        labelMapNode.SetAndObserveTransformNodeID(proxyTransformNode.GetID())
-
-      # Render changes
-      slicer.util.forceRenderAllViews()
-      slicer.app.processEvents()
+    if not sliceWidget:
+      print(f"Error: A slice with the {imageOrientation} orientation was not found.")
+      exit(1)
+
+    return sliceWidget
 
-    else:
-      sliceWidgets = self.getSliceWidgets(layoutManager, proxy2DImageNode)
-      for sliceWidget in sliceWidgets: 
-        name = None
-        fitSlice = None
-        if sliceWidget is not None:
-          name = sliceWidget.sliceViewName
-            
-          sliceCompositeNode = sliceWidget.mrmlSliceCompositeNode()
-
-          volumesLogic = slicer.modules.volumes.logic()
-          
-          # Checks if the current slice node is not showing an image
-          fitSlice = False
-          if sliceCompositeNode.GetLabelVolumeID() is None:
-            fitSlice = True
-          
-          sliceCompositeNode.SetLabelVolumeID(labelMapNode.GetID())
-          sliceCompositeNode.SetLabelOpacity(opacity)
-          
-          sliceCompositeNode.SetBackgroundVolumeID(labelMapNode.GetID())
-          
-          # Get the current slice node
-          sliceNode = sliceWidget.mrmlSliceNode()
-
-          # Display the label map overlay as an outline
-          sliceNode.SetUseLabelOutline(overlayAsOutline)
-
-          # Set the background volume for the current slice view
-          sliceCompositeNode.SetBackgroundVolumeID(proxy2DImageNode.GetID())
-
-          # Translate the 3D segmentation label map using the transform data
-          if proxyTransformNode is not None:
-            labelMapNode.SetAndObserveTransformNodeID(proxyTransformNode.GetID())
-          
-          sliceNode.SetSliceVisible(True)
-
-        # Make the 3D segmentation visible in the 3D view
-        tmpIdList = vtk.vtkIdList() # The nodes you want to display need to be in a vtkIdList
-        tmpIdList.InsertNextId(segmentationLabelMapID)
-        threeDViewNode = layoutManager.activeMRMLThreeDViewNode()
-        shNode.ShowItemsInView(tmpIdList, threeDViewNode)
-
-        # If the sliceNode is now showing an image, fit the slice view to the current background image   
-        if fitSlice:
-          sliceWidget.fitSliceToBackground()
-        
-        # Preserve previous slices
-        # If a background node for the specified orientation exists, update it with the current slice
-        # Otherwise, create a new background node and set it as the background for the specified orientation
-        
-        if name in self.backgrounds:
-          background = getattr(self, name.lower() + 'Background')
-          if background is None:
-            # Create a new background node for the orientation
-            setattr(self, name.lower() + 'Background', volumesLogic.CloneVolume(slicer.mrmlScene,
-                    proxy2DImageNode, f"{proxy2DImageNode.GetAttribute('Sequences.BaseName')}"))
-          else:
-            # Background exists, just replace the data to represent the next image in the sequence
-            background.SetAndObserveImageData(proxy2DImageNode.GetImageData())
-            background.SetAttribute("Sequences.BaseName", proxy2DImageNode.GetAttribute("Sequences.BaseName"))
-        
-        # Add the image name to the slice view background variable
-        if name is not None:
-          currentSlice = getattr(self, name.lower() + 'Background')
-          currentSlice.SetName(proxy2DImageNode.GetAttribute('Sequences.BaseName'))
-
-        # Set the background volumes for each orientation, if they exist
-        for color in self.backgrounds:
-          sliceViewWindow = slicer.app.layoutManager().sliceWidget(color).sliceView()
-          sliceViewWindow.cornerAnnotation().RemoveAllObservers()
-          currentSlice = getattr(self, color.lower() + 'Background')
-          sliceViewWindow.cornerAnnotation().ClearAllTexts()
-          # Add desired text to slice views that have a background node
-          if currentSlice is not None:
-            slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").SetBackgroundVolumeID(currentSlice.GetID())
-            imageFile = slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").GetNodeReference('backgroundVolume') is not None
-            if imageFile:
-              imageFileNameText = slicer.mrmlScene.GetNodeByID(f"vtkMRMLSliceCompositeNode{color}").GetNodeReference('backgroundVolume').GetAttribute('Sequences.BaseName')
-              # Place "Current Alignment" text in the slice view corner
-              sliceViewWindow = slicer.app.layoutManager().sliceWidget(color).sliceView()
-              sliceViewWindow.cornerAnnotation().SetText(0, imageFileNameText)
-        
-        for color in self.backgrounds:
-          sliceViewWindow = slicer.app.layoutManager().sliceWidget(color).sliceView()
-          if sliceViewWindow.cornerAnnotation().HasObserver(vtk.vtkCommand.ModifiedEvent):
-            sliceViewWindow.cornerAnnotation().RemoveAllObservers()
-          if sliceViewWindow.cornerAnnotation().HasObserver(vtk.vtkCornerAnnotation.UpperLeft):
-            sliceViewWindow.cornerAnnotation().RemoveAllObservers()
-
-        # Enable alignment of the 3D segmentation label map according to the transform data so that
-        # the 3D segmentation label map overlays upon the ROI of the 2D images
-        if proxyTransformNode is not None:
-          labelMapNode.SetAndObserveTransformNodeID(proxyTransformNode.GetID())
-
-        # Render changes
-        slicer.util.forceRenderAllViews()
-        slicer.app.processEvents()
-  
   def getSliceWidget(self, layoutManager, imageNode):
     """
     This function helps to determine the slice widget that corresponds to the orientation of the
-    provided image. (i.e. the slice widget that would display the image)
+    provided image. (i.e. the slice widget that would display the image). The orientation is
+    computed from the geometry of the image node, prefer getFrameSliceWidget for the frames of a
+    sequence.
     :param layoutManager: node representing the MRML layout manager
     :param imageNode: node representing the 2D image
     """
-    
-    def get_anatomical_orientation(image):
-      """
-      Helper function for fixing images with incorrect anatomical orientation.
-      Determine the anatomical orientation of an image based on its direction cosines.
-      """
-      direction = image.GetDirection()
-      anatomical_labels = ['R', 'A', 'I', 'L', 'P', 'S']
-      orientation = []
-
-      # Determine the dominant direction for each axis
-      for axis in range(3):
-        # Extract the direction vector for the current axis
-        vector = direction[axis::3]
-        # Determine the index of the dominant direction
-        max_index = max(range(3), key=lambda i: abs(vector[i]))
-        # Append the corresponding anatomical label
-        orientation.append(anatomical_labels[max_index + (3 if vector[max_index] < 0 else 0)])
-
-      return ''.join(orientation)
-
-    def reorient_image(image, orientation):
-      """
-      Helper function for fixing images oritentation.
-      Reorient the image based on the anatomical orientation.
-      """
-      if image.GetSize()[0] == 1:
-        # Single-slice in x-direction, check for sagittal, coronal, or axial
-        if orientation[0] in ('L', 'R'):
-          return sitk.DICOMOrient(image, 'PIR')  # Sagittal
-        elif orientation[0] in ('A', 'P'):
-          return sitk.DICOMOrient(image, 'LIA')  # Coronal
-        else:
-          return sitk.DICOMOrient(image, 'LPS')  # Axial
-      elif image.GetSize()[1] == 1:
-        # Single-slice in y-direction, check for sagittal, coronal, or axial
-        if orientation[1] in ('L', 'R'):
-          return sitk.DICOMOrient(image, 'PIR')  # Sagittal
-        elif orientation[1] in ('A', 'P'):
-          return sitk.DICOMOrient(image, 'LIA')  # Coronal
-        else:
-          return sitk.DICOMOrient(image, 'LPS')  # Axial
-      return image
-  
-    # Determine the orientation of the image
-    sitk_image = sitkUtils.PullVolumeFromSlicer(imageNode)
-    if sitk_image.GetSize()[2] != 1:
-      orientation = get_anatomical_orientation(sitk_image)
-      reoriented_image = reorient_image(sitk_image, orientation)
-      imageNode = sitkUtils.PushVolumeToSlicer(reoriented_image, None, name=imageNode.GetName())
-    tmpMatrix = vtk.vtkMatrix4x4()
     if imageNode is not None:
-      imageNode.GetIJKToRASMatrix(tmpMatrix)
-      scanOrder = imageNode.ComputeScanOrderFromIJKToRAS(tmpMatrix)
-
-      if scanOrder == "LR" or scanOrder == "RL":
-        imageOrientation = "Sagittal"
-      elif scanOrder == "AP" or scanOrder == "PA":
-        imageOrientation = "Coronal"
-      elif scanOrder == "IS" or scanOrder == "SI":
-        imageOrientation = "Axial"
-      else:
-        print(f"Error: Unexpected image scan order {scanOrder}.")
-        exit(1)
-
-      # Find the slice widget that has the same orientation as the image
-      sliceWidget = None
-      for name in layoutManager.sliceViewNames():
-        if layoutManager.sliceWidget(name).sliceOrientation == imageOrientation:
-          sliceWidget = layoutManager.sliceWidget(name)
-
-      if not sliceWidget:
-        print(f"Error: A slice with the {imageOrientation} orientation was not found.")
-        exit(1)
-
-      return sliceWidget
+      size, _, _, direction = FrameIO.geometryFromVolumeNode(imageNode)
+      return self.getSliceWidgetByOrientation(layoutManager, FrameIO.sliceOrientation(size, direction))
 
   def getSliceWidgets(self, layoutManager, imageNode):
     """
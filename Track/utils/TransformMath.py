@@ -0,0 +1,211 @@
+import numpy as np
+
+# Pre-transforms mapping the coordinate system the transforms were generated in to RAS, the
+# coordinate system of 3D Slicer. LPS (DICOM) flips the first two axes.
+TRANSFORM_CONVENTIONS = {
+  "LPS": np.diag([-1.0, -1.0, 1.0, 1.0]),
+  "RAS": np.eye(4),
+}
+
+# Columns read from a transforms file for each layout, in order
+TRANSFORM_LAYOUTS = {
+  "translation": ["X", "Y", "Z"],
+  # Translation, then rotations around the X, Y and Z axes, in degrees
+  "euler": ["X", "Y", "Z", "RX", "RY", "RZ"],
+  # Translation, then unit quaternion
+  "quaternion": ["X", "Y", "Z", "QW", "QX", "QY", "QZ"],
+  # 4x4 matrix, row by row
+  "matrix": [f"M{row}{column}" for row in range(4) for column in range(4)],
+}
+
+
+def conventionMatrix(convention):
+  """
+  Returns the 4x4 matrix mapping the coordinates of a transforms convention to RAS.
+  :param convention: name of a convention of TRANSFORM_CONVENTIONS, or a custom 4x4 pre-transform
+  """
+  if isinstance(convention, str):
+    try:
+      return TRANSFORM_CONVENTIONS[convention.upper()]
+    except KeyError:
+      raise ValueError(f"Unknown transforms convention '{convention}', expected one of "
+                       f"{', '.join(TRANSFORM_CONVENTIONS)} or a 4x4 matrix")
+  matrix = np.asarray(convention, dtype=np.float64)
+  if matrix.shape != (4, 4):
+    raise ValueError(f"A custom transforms convention must be a 4x4 matrix, got shape {matrix.shape}")
+  return matrix
+
+
+def transformMatrices(transforms):
+  """
+  Returns the transforms as an Nx4x4 array of homogeneous matrices.
+  :param transforms: Nx3 array of translations, or Nx4x4 array of matrices
+  """
+  transforms = np.asarray(transforms, dtype=np.float64)
+  if transforms.ndim == 3 and transforms.shape[1:] == (4, 4):
+    return transforms
+  if transforms.ndim != 2 or transforms.shape[1] < 3:
+    raise ValueError(f"Expected Nx3 translations or Nx4x4 matrices, got an array of shape {transforms.shape}")
+  matrices = np.tile(np.eye(4), (len(transforms), 1, 1))
+  matrices[:, :3, 3] = transforms[:, :3]
+  return matrices
+
+
+def layoutColumnCount(layout):
+  """
+  Returns the number of columns read from a transforms file for a layout of TRANSFORM_LAYOUTS.
+  :param layout: name of the layout
+  """
+  try:
+    return len(TRANSFORM_LAYOUTS[layout])
+  except KeyError:
+    raise ValueError(f"Unknown transforms layout '{layout}', expected one of {', '.join(TRANSFORM_LAYOUTS)}")
+
+
+def axisRotations(axis, angles):
+  """
+  Returns the Nx3x3 matrices of rotations around a coordinate axis.
+  :param axis: "x", "y" or "z"
+  :param angles: rotation angles, in radians
+  """
+  angles = np.asarray(angles, dtype=np.float64)
+  cos, sin = np.cos(angles), np.sin(angles)
+  # Indices of the two coordinates mixed by the rotation, so that positive angles are counterclockwise
+  first, second = {"x": (1, 2), "y": (2, 0), "z": (0, 1)}[axis]
+  rotations = np.tile(np.eye(3), (len(angles), 1, 1))
+  rotations[:, first, first] = cos
+  rotations[:, first, second] = -sin
+  rotations[:, second, first] = sin
+  rotations[:, second, second] = cos
+  return rotations
+
+
+def eulerToMatrices(angles, order="xyz"):
+  """
+  Returns the Nx3x3 rotation matrices of Euler angles. The rotations are applied around the fixed
+  axes, in the given order, i.e. "xyz" is Rz @ Ry @ Rx.
+  :param angles: Nx3 array of the rotation angles around the X, Y and Z axes, in degrees
+  :param order: order in which the rotations are applied
+  """
+  angles = np.radians(np.asarray(angles, dtype=np.float64))
+  rotations = np.tile(np.eye(3), (len(angles), 1, 1))
+  for axis in order.lower():
+    rotations = axisRotations(axis, angles[:, "xyz".index(axis)]) @ rotations
+  return rotations
+
+
+def quaternionsToMatrices(quaternions):
+  """
+  Returns the Nx3x3 rotation matrices of quaternions, which are normalized first.
+  :param quaternions: Nx4 array of (W, X, Y, Z) quaternions
+  """
+  quaternions = np.asarray(quaternions, dtype=np.float64)
+  quaternions = quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+  w, x, y, z = quaternions.T
+  return np.stack([
+    np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+    np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+    np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+  ], axis=1)
+
+
+def columnsToMatrices(values, layout="translation", eulerOrder="xyz"):
+  """
+  Builds the Nx4x4 matrices of all the rows of a transforms file at once.
+  :param values: NxM array of the columns of a layout of TRANSFORM_LAYOUTS
+  :param layout: name of the layout
+  :param eulerOrder: order in which Euler angles are applied (see eulerToMatrices)
+  """
+  values = np.asarray(values, dtype=np.float64)
+  if values.ndim != 2 or values.shape[1] != layoutColumnCount(layout):
+    raise ValueError(f"Expected {layoutColumnCount(layout)} columns for the '{layout}' layout, got an array "
+                     f"of shape {values.shape}")
+  if layout == "matrix":
+    return values.reshape(-1, 4, 4)
+  matrices = transformMatrices(values[:, :3])
+  if layout == "euler":
+    matrices[:, :3, :3] = eulerToMatrices(values[:, 3:6], eulerOrder)
+  elif layout == "quaternion":
+    matrices[:, :3, :3] = quaternionsToMatrices(values[:, 3:7])
+  return matrices
+
+
+def makeContinuous(values, layout="translation"):
+  """
+  Returns the columns of a transforms file with the rotations made continuous from row to row, so
+  they can be interpolated: Euler angles are unwrapped, and quaternions are flipped to the
+  hemisphere of the previous row.
+  :param values: NxM array of the columns of a layout of TRANSFORM_LAYOUTS
+  :param layout: name of the layout
+  """
+  values = np.array(values, dtype=np.float64)
+  if layout == "euler" and len(values) > 1:
+    values[:, 3:6] = np.degrees(np.unwrap(np.radians(values[:, 3:6]), axis=0))
+  elif layout == "quaternion" and len(values) > 1:
+    quaternions = values[:, 3:7]
+    flips = np.cumprod(np.where(np.sum(quaternions[1:] * quaternions[:-1], axis=1) < 0, -1.0, 1.0))
+    quaternions[1:] *= flips[:, np.newaxis]
+  return values
+
+
+def matricesToRAS(transforms, convention="LPS"):
+  """
+  Converts a whole table of transforms to RAS at once: every matrix M becomes C @ M @ inverse(C),
+  where C is the pre-transform of the convention.
+  :param transforms: Nx3 array of translations, or Nx4x4 array of matrices
+  :param convention: name of a convention of TRANSFORM_CONVENTIONS, or a custom 4x4 pre-transform
+  """
+  preTransform = conventionMatrix(convention)
+  return preTransform @ transformMatrices(transforms) @ np.linalg.inv(preTransform)
+
+
+def translationsToRAS(translations, convention="LPS"):
+  """
+  Converts a table of translations to RAS at once. The translation part of the pre-transform does
+  not change a translation, only its linear part applies.
+  :param translations: Nx3 array of translations
+  :param convention: name of a convention of TRANSFORM_CONVENTIONS, or a custom 4x4 pre-transform
+  """
+  preTransform = conventionMatrix(convention)
+  return np.asarray(translations, dtype=np.float64)[:, :3] @ preTransform[:3, :3].T
+
+
+def isTranslationOnly(matrices, tolerance=1e-9):
+  """
+  Returns True if every matrix of an Nx4x4 array is a pure translation.
+  :param matrices: Nx4x4 array of matrices
+  """
+  return np.allclose(matrices[:, :3, :3], np.eye(3), atol=tolerance)
+
+
+def alignTransformsToFrames(transformTimes, transforms, frameTimes):
+  """
+  Returns the transform of every frame, linearly interpolated between the two transforms logged
+  closest before and after the frame time. The rows are located with a binary search over the
+  sorted timestamps, for all frames at once. Frames outside of the logged time range get the first
+  or last transform.
+  :param transformTimes: timestamp of every transform
+  :param transforms: Nx3 array of translations, or Nx4x4 array of matrices (interpolated element-wise)
+  :param frameTimes: time of every frame, on the clock of transformTimes
+  """
+  transformTimes = np.asarray(transformTimes, dtype=np.float64)
+  transforms = np.asarray(transforms, dtype=np.float64)
+  frameTimes = np.asarray(frameTimes, dtype=np.float64)
+  if len(transformTimes) != len(transforms) or len(transforms) == 0:
+    raise ValueError(f"Expected a timestamp for each of the {len(transforms)} transforms, got {len(transformTimes)}")
+  if np.any(np.diff(transformTimes) < 0):
+    order = np.argsort(transformTimes, kind="stable")
+    transformTimes = transformTimes[order]
+    transforms = transforms[order]
+
+  values = transforms.reshape(len(transforms), -1)
+  upper = np.clip(np.searchsorted(transformTimes, frameTimes, side="right"), 1, len(transformTimes) - 1)
+  lower = upper - 1
+  if len(transformTimes) == 1:
+    upper = lower = np.zeros(len(frameTimes), dtype=int)
+  interval = transformTimes[upper] - transformTimes[lower]
+  with np.errstate(divide="ignore", invalid="ignore"):
+    weight = np.where(interval > 0, (frameTimes - transformTimes[lower]) / interval, 0.0)
+  weight = np.clip(weight, 0.0, 1.0)[:, np.newaxis]
+  aligned = values[lower] * (1.0 - weight) + values[upper] * weight
+  return aligned.reshape((len(frameTimes),) + transforms.shape[1:])
@@ -0,0 +1,73 @@
+import base64
+
+import numpy as np
+
+import slicer
+import vtk
+
+
+class TransformTable():
+  """
+  Holds the transform of every frame in a single contiguous array, and applies the transform of the
+  selected frame to a single linear transform node, updated in place. Unlike a sequence of transform
+  nodes, the number of scene objects does not depend on the number of frames. The array is also
+  stored in attributes of the transform node, so it is saved along with the scene and can be restored
+  from the node (see fromTransformNode).
+  """
+
+  TRANSFORMS_ATTRIBUTE = "Track.TransformTable"
+  SHAPE_ATTRIBUTE = "Track.TransformTableShape"
+
+  def __init__(self, transformNode, transforms):
+    """
+    :param transformNode: linear transform node the transform of the selected frame is applied to
+    :param transforms: Nx3 array of RAS translations, or Nx4x4 array of RAS transform matrices
+    """
+    transforms = np.ascontiguousarray(transforms, dtype=np.float64)
+    if not (transforms.ndim == 2 and transforms.shape[1] == 3) and transforms.shape[1:] != (4, 4):
+      raise ValueError(f"Expected Nx3 translations or Nx4x4 matrices, got an array of shape {transforms.shape}")
+    self.transformNode = transformNode
+    self.transforms = transforms
+    self.currentFrame = None
+    self._matrix = vtk.vtkMatrix4x4()
+    if transformNode.GetAttribute(self.TRANSFORMS_ATTRIBUTE) is None:
+      transformNode.SetAttribute(self.SHAPE_ATTRIBUTE, ",".join(str(size) for size in transforms.shape))
+      transformNode.SetAttribute(self.TRANSFORMS_ATTRIBUTE,
+                                 base64.b64encode(transforms.astype("<f8").tobytes()).decode("ascii"))
+
+  @classmethod
+  def fromTransformNode(cls, transformNode):
+    """
+    Restores the transform table stored in the attributes of a transform node, e.g. once a saved
+    scene is loaded. Returns None if the node holds no transform table.
+    :param transformNode: linear transform node of a transform table
+    """
+    if transformNode is None:
+      return None
+    encoded = transformNode.GetAttribute(cls.TRANSFORMS_ATTRIBUTE)
+    shape = transformNode.GetAttribute(cls.SHAPE_ATTRIBUTE)
+    if not encoded or not shape:
+      return None
+    transforms = np.frombuffer(base64.b64decode(encoded), dtype="<f8")
+    return cls(transformNode, transforms.reshape([int(size) for size in shape.split(",")]))
+
+  def __len__(self):
+    return len(self.transforms)
+
+  def setFrame(self, frameIndex):
+    """
+    Applies the transform of a frame to the transform node. Nothing is modified if the frame is
+    already applied.
+    :param frameIndex: index of the frame
+    """
+    frameIndex = min(max(int(frameIndex), 0), len(self) - 1)
+    if frameIndex == self.currentFrame:
+      return
+    if self.transforms.ndim == 2:
+      self._matrix.SetElement(0, 3, self.transforms[frameIndex, 0])  # LR translation
+      self._matrix.SetElement(1, 3, self.transforms[frameIndex, 1])  # PA translation
+      self._matrix.SetElement(2, 3, self.transforms[frameIndex, 2])  # IS translation
+    else:
+      slicer.util.updateVTKMatrixFromArray(self._matrix, self.transforms[frameIndex])
+    self.transformNode.SetMatrixTransformToParent(self._matrix)
+    self.currentFrame = frameIndex
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from utils.TransformsReader import TransformsFormatError
+
+
+class TransformsTableCache():
+  """
+  Persistent columnar cache of parsed transforms files. Columns are cached as they are read (see
+  TrackLogic.readTransformsArray): a file read to the end gets every column of its header cached,
+  and a read stopping early only caches the rows of the requested columns it read. Every parsed
+  column is stored as a raw float64 file, along with a small JSON index holding the header, and the
+  number of rows of every column, whether it holds the whole column and its first value that is not
+  a number. Entries are keyed by the identity of the source file (absolute path, size and
+  modification time), so a modified file is parsed again. Reading cached columns afterwards maps
+  the stored columns, and the source file is never opened. Once the cache grows beyond its size
+  cap, the least recently used entries are evicted.
+  """
+
+  def __init__(self, directory, maxBytes):
+    """
+    :param directory: directory holding the cached tables (created if needed)
+    :param maxBytes: maximum total size of the cached tables
+    """
+    self.directory = directory
+    self.maxBytes = int(maxBytes)
+    self._lock = threading.Lock()
+    os.makedirs(directory, exist_ok=True)
+
+  def _entryPath(self, filepath):
+    stat = os.stat(filepath)
+    identity = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(self.directory, hashlib.sha1(identity.encode("utf-8")).hexdigest())
+
+  def _readIndex(self, filepath):
+    try:
+      entryPath = self._entryPath(filepath)
+      with open(os.path.join(entryPath, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+      # The modification time of an entry records when it was last used
+      os.utime(entryPath)
+    except (OSError, ValueError):
+      return None, None
+    return entryPath, index
+
+  def _writeIndex(self, entryPath, index):
+    temporaryPath = os.path.join(entryPath, f"index.json.{threading.get_ident()}.tmp")
+    with open(temporaryPath, "w", encoding="utf-8") as f:
+      json.dump(index, f)
+    os.replace(temporaryPath, os.path.join(entryPath, "index.json"))
+
+  def readHeader(self, filepath):
+    """
+    Returns the column names of a cached transforms file, or None if the header of the file is not
+    cached or the file has changed.
+    :param filepath: path to the source transforms file
+    """
+    index = self._readIndex(filepath)[1]
+    return index.get("header") if index is not None else None
+
+  def putHeader(self, filepath, header):
+    """
+    Stores the column names of a transforms file. Returns False if they could not be written.
+    :param filepath: path to the source transforms file
+    :param header: column names, found in the header row
+    """
+    header = ["" if name is None else str(name) for name in header]
+    try:
+      with self._lock:
+        entryPath = self._entryPath(filepath)
+        os.makedirs(entryPath, exist_ok=True)
+        index = self._readIndex(filepath)[1] or {"columns": {}}
+        index["header"] = header
+        self._writeIndex(entryPath, index)
+    except OSError:
+      return False
+    return True
+
+  def readColumns(self, filepath, columns, maxRows=None):
+    """
+    Returns the values of some columns of a cached transforms file as an NxM float64 array, or None
+    if the file has changed or one of the columns is not cached with enough rows. Raises a
+    TransformsFormatError if one of the returned values is not a number.
+    :param filepath: path to the source transforms file
+    :param columns: names of the columns to read
+    :param maxRows: only return the first maxRows rows, None to return every row
+    """
+    entryPath, index = self._readIndex(filepath)
+    if index is None:
+      return None
+    cached = [index["columns"].get(column) for column in columns]
+    # A partially read column only serves reads of at most as many rows
+    if any(entry is None or not (entry["complete"] or (maxRows is not None and entry["numRows"] >= maxRows))
+           for entry in cached):
+      return None
+
+    numRows = min((entry["numRows"] for entry in cached), default=0)
+    if maxRows is not None:
+      numRows = min(numRows, maxRows)
+    for column, entry in zip(columns, cached):
+      # Only the rows before the first value that is not a number are valid
+      error = entry.get("error")
+      if error is not None and error["position"] < numRows:
+        raise TransformsFormatError(error["row"], column, error["value"])
+    values = np.empty((numRows, len(columns)), dtype=np.float64)
+    try:
+      for position, entry in enumerate(cached):
+        if numRows:
+          values[:, position] = np.memmap(os.path.join(entryPath, entry["file"]), dtype=np.float64,
+                                          mode="r", shape=(entry["numRows"],))[:numRows]
+    except (OSError, ValueError):
+      return None
+    return values
+
+  def putColumns(self, filepath, columns, values, complete, errors=None):
+    """
+    Stores the values of some columns of a transforms file, then evicts the least recently used
+    entries if needed. A column already cached in full is kept, and so is a column cached with more
+    rows than partial values. Columns larger than the size cap are not cached. Returns False if the
+    columns were not cached.
+    :param filepath: path to the source transforms file
+    :param columns: names of the columns
+    :param values: NxM float64 array of the values of the columns
+    :param complete: whether the values hold every row of the file
+    :param errors: optional first value of some columns that is not a number, as {column:
+    {"position": row index within the values, "row": row number within the file, "value": value}}.
+    The values of such a column are NaN from there on
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.nbytes > self.maxBytes:
+      return False
+    try:
+      with self._lock:
+        entryPath = self._entryPath(filepath)
+        os.makedirs(entryPath, exist_ok=True)
+        index = self._readIndex(filepath)[1] or {"columns": {}}
+        for position, column in enumerate(columns):
+          entry = index["columns"].get(column)
+          if entry is not None and (entry["complete"] or (not complete and entry["numRows"] >= len(values))):
+            continue
+          fileName = hashlib.sha1(str(column).encode("utf-8")).hexdigest() + ".f64"
+          temporaryPath = os.path.join(entryPath, f"{fileName}.{threading.get_ident()}.tmp")
+          with open(temporaryPath, "wb") as f:
+            f.write(np.ascontiguousarray(values[:, position]).tobytes())
+          os.replace(temporaryPath, os.path.join(entryPath, fileName))
+          index["columns"][column] = {"file": fileName, "numRows": len(values), "complete": bool(complete)}
+          if errors and column in errors:
+            index["columns"][column]["error"] = errors[column]
+        self._writeIndex(entryPath, index)
+        return self._evict(entryPath)
+    except OSError:
+      # A full or read-only disk only means the file is parsed again next time
+      return False
+
+  @staticmethod
+  def _entrySize(entryPath):
+    return sum(item.stat().st_size for item in os.scandir(entryPath))
+
+  def _evict(self, keepPath):
+    entries = []
+    for entry in os.scandir(self.directory):
+      if entry.is_dir() and entry.path != keepPath:
+        entries.append((entry.stat().st_mtime, self._entrySize(entry.path), entry.path))
+    totalBytes = sum(size for _, size, _ in entries) + self._entrySize(keepPath)
+    for _, size, path in sorted(entries):
+      if totalBytes <= self.maxBytes:
+        break
+      shutil.rmtree(path, ignore_errors=True)
+      totalBytes -= size
+    # The entry just written counts against the cap as well
+    if totalBytes > self.maxBytes:
+      shutil.rmtree(keepPath, ignore_errors=True)
+      return False
+    return True
+
+  def clear(self):
+    """
+    Removes every cached table.
+    """
+    with self._lock:
+      for entry in os.scandir(self.directory):
+        shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,395 @@
+import codecs
+import csv
+import itertools
+
+import numpy as np
+
+# Encodings tried, in order, on a sample of the file. Latin-1 decodes any byte, so it always matches.
+TRANSFORMS_ENCODINGS = ["utf-8", "cp1252", "latin1"]
+ENCODING_SAMPLE_SIZE = 1 << 16
+# Number of rows of a transforms file parsed at a time
+CHUNK_ROWS = 1 << 16
+# Columnar transforms files, read with the optional pyarrow and h5py packages
+ARROW_EXTENSIONS = (".parquet", ".feather", ".arrow")
+HDF5_EXTENSIONS = (".h5", ".hdf5")
+
+
+class TransformsFormatError(ValueError):
+  """
+  Raised when a value of a transforms file is not a number. Holds the 1-based row number, within the
+  file, and the name of the column of the offending value.
+  """
+
+  def __init__(self, row, column, value):
+    self.row = row
+    self.column = column
+    self.value = value
+    super().__init__(f"Row {row}, column '{column}': '{value}' is not a number")
+
+
+def detectEncoding(filepath):
+  """
+  Detects the text encoding of a transforms file from a sample of its first bytes, so the file is
+  only decoded once.
+  :param filepath: path to the transforms file
+  """
+  with open(filepath, "rb") as f:
+    sample = f.read(ENCODING_SAMPLE_SIZE)
+  if sample.startswith(codecs.BOM_UTF8):
+    return "utf-8-sig"
+  for encoding in TRANSFORMS_ENCODINGS:
+    try:
+      # The sample may end in the middle of a multi-byte character
+      codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+      return encoding
+    except UnicodeDecodeError:
+      pass
+  return "latin1"
+
+
+def readHeader(filepath, encoding=None, delimiter=","):
+  """
+  Returns the column names found on the first line of a transforms file.
+  :param filepath: path to the transforms file
+  :param encoding: text encoding of the file, detected if not provided
+  :param delimiter: column delimiter
+  """
+  encoding = encoding or detectEncoding(filepath)
+  with open(filepath, "r", encoding=encoding, newline="") as f:
+    line = f.readline()
+  return [name.strip() for name in next(csv.reader([line], delimiter=delimiter), [])]
+
+
+def iterRows(filepath, encoding=None, delimiter=","):
+  """
+  Yields the rows following the header row of a delimited transforms file, as lists of strings.
+  :param filepath: path to the transforms file
+  :param encoding: text encoding of the file, detected if not provided
+  :param delimiter: column delimiter
+  """
+  encoding = encoding or detectEncoding(filepath)
+  with open(filepath, "r", encoding=encoding, newline="") as f:
+    f.readline()
+    yield from csv.reader(f, delimiter=delimiter)
+
+
+def iterColumns(filepath, columns, encoding=None, delimiter=",", chunkRows=CHUNK_ROWS):
+  """
+  Reads the values of some columns of a delimited transforms file, chunkRows lines at a time, and
+  yields them as float64 arrays. Only the requested columns of a single chunk are held in memory,
+  and the file is closed as soon as the caller stops iterating. Raises a TransformsFormatError
+  locating the first value that is not a number, and a KeyError if a column is missing.
+  :param filepath: path to the transforms file, whose first line holds the column names
+  :param columns: names of the columns to read
+  :param encoding: text encoding of the file, detected if not provided
+  :param delimiter: column delimiter
+  :param chunkRows: number of lines parsed at a time
+  """
+  encoding = encoding or detectEncoding(filepath)
+  usecols = _columnIndices(readHeader(filepath, encoding, delimiter), columns)
+
+  with open(filepath, "r", encoding=encoding, newline="") as f:
+    f.readline()
+    firstLine = 2
+    while True:
+      lines = list(itertools.islice(f, chunkRows))
+      if not lines:
+        return
+      if any(line.strip() for line in lines):
+        try:
+          yield np.loadtxt(lines, dtype=np.float64, delimiter=delimiter, usecols=usecols, ndmin=2,
+                           quotechar='"')
+        except ValueError:
+          # Only scan the chunk row by row to locate the error, which keeps the common case vectorized
+          _locateFormatError(lines, firstLine, columns, usecols, delimiter)
+          raise TransformsFormatError(firstLine, columns[0], "")
+      firstLine += len(lines)
+
+
+def iterRowColumns(rows, header, columns, chunkRows=CHUNK_ROWS):
+  """
+  Same as iterColumns for the rows of a spreadsheet, e.g. the rows of a read-only openpyxl
+  worksheet, which are consumed lazily. Empty rows are skipped.
+  :param rows: iterator over the rows following the header row, as sequences of values
+  :param header: column names, found in the header row
+  :param columns: names of the columns to read
+  :param chunkRows: number of rows converted at a time
+  """
+  usecols = _columnIndices(header, columns)
+  rows = iter(rows)
+  firstRow = 2
+  while True:
+    block = list(itertools.islice(rows, chunkRows))
+    if not block:
+      return
+    chunk = np.empty((len(block), len(usecols)), dtype=np.float64)
+    numRows = 0
+    for rowNumber, row in enumerate(block, firstRow):
+      values = [row[index] if index < len(row) else None for index in usecols]
+      if all(value is None or value == "" for value in values):
+        continue
+      for columnIndex, value in enumerate(values):
+        try:
+          chunk[numRows, columnIndex] = float(value)
+        except (TypeError, ValueError):
+          raise TransformsFormatError(rowNumber, columns[columnIndex], value)
+      numRows += 1
+    if numRows:
+      yield chunk[:numRows]
+    firstRow += len(block)
+
+
+def iterTableColumns(rows, header, columns, errors, chunkRows=CHUNK_ROWS):
+  """
+  Same as iterRowColumns, but every column of the header is parsed in the same pass, so that the
+  whole table can be cached (see TransformsCache.TransformsTableCache). Yields (values of the
+  requested columns, values of every column of the header) chunks. Rows where every value is empty
+  are skipped, as np.loadtxt does for a delimited file. Only the requested columns raise a
+  TransformsFormatError: the first value of another column that is not a number is recorded, and
+  the column is NaN from there on.
+  :param rows: iterator over the rows following the header row, as sequences of values
+  :param header: column names, found in the header row
+  :param columns: names of the columns to read
+  :param errors: dictionary filled with the first value of every column that is not a number, as
+  {column index: {"position": index among the rows yielded, "row": row number, "value": value}}
+  :param chunkRows: number of rows converted at a time
+  """
+  usecols = _columnIndices(header, columns)
+  rows = iter(rows)
+  firstRow = 2
+  numRows = 0
+  while True:
+    block = list(itertools.islice(rows, chunkRows))
+    if not block:
+      return
+    numberedRows = [(rowNumber, row) for rowNumber, row in enumerate(block, firstRow)
+                    if not all(value is None or str(value).strip() == "" for value in row)]
+    firstRow += len(block)
+    if not numberedRows:
+      continue
+    table = np.empty((len(numberedRows), len(header)), dtype=np.float64)
+    for columnIndex in range(len(header)):
+      table[:, columnIndex] = _parseTableColumn(numberedRows, columnIndex, numRows, errors)
+    # Report the first value of the requested columns that is not a number
+    failed = [(errors[index]["position"], position) for position, index in enumerate(usecols)
+              if index in errors and errors[index]["position"] >= numRows]
+    if failed:
+      position = min(failed)[1]
+      error = errors[usecols[position]]
+      raise TransformsFormatError(error["row"], columns[position], error["value"])
+    numRows += len(numberedRows)
+    yield table[:, usecols], table
+
+
+def _parseTableColumn(numberedRows, columnIndex, firstPosition, errors):
+  if columnIndex in errors:
+    return np.nan
+  values = [row[columnIndex] if columnIndex < len(row) else None for _, row in numberedRows]
+  if not any(value is None for value in values):
+    try:
+      return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+      pass
+  # Only scan the column value by value to locate the error, which keeps the common case vectorized
+  parsed = np.full(len(values), np.nan)
+  for position, value in enumerate(values):
+    try:
+      parsed[position] = float(value)
+    except (TypeError, ValueError):
+      errors[columnIndex] = {"position": firstPosition + position, "row": numberedRows[position][0],
+                             "value": "" if value is None else str(value)}
+      break
+  return parsed
+
+
+def collectChunks(chunks, numColumns, maxRows=None, stopAfter=None):
+  """
+  Concatenates chunks of values (see iterColumns) until maxRows rows are read or stopAfter returns
+  True, and stops iterating, so the rest of the file is never read.
+  :param chunks: iterator over float64 arrays of numColumns columns
+  :param numColumns: number of columns of the chunks
+  :param maxRows: maximum number of rows returned, None to read every row
+  :param stopAfter: optional function called with every chunk, returning True once enough rows are read
+  """
+  collected = []
+  numRows = 0
+  for chunk in chunks:
+    collected.append(chunk)
+    numRows += len(chunk)
+    if (maxRows is not None and numRows >= maxRows) or (stopAfter is not None and stopAfter(chunk)):
+      break
+  if hasattr(chunks, "close"):
+    chunks.close()
+  if not collected:
+    return np.empty((0, numColumns), dtype=np.float64)
+  return np.concatenate(collected)[:maxRows]
+
+
+def readColumns(filepath, columns, encoding=None, delimiter=",", maxRows=None):
+  """
+  Reads the values of some columns of a delimited transforms file into a float64 array (see
+  iterColumns).
+  :param filepath: path to the transforms file, whose first line holds the column names
+  :param columns: names of the columns to read
+  :param encoding: text encoding of the file, detected if not provided
+  :param delimiter: column delimiter
+  :param maxRows: only read the first maxRows rows, None to read every row
+  """
+  chunks = iterColumns(filepath, columns, encoding, delimiter, chunkSize(maxRows))
+  return collectChunks(chunks, len(columns), maxRows)
+
+
+def chunkSize(maxRows=None):
+  """
+  Returns the number of rows to parse at a time when only the first maxRows rows are needed, so the
+  rows past them are never parsed.
+  :param maxRows: number of rows needed, None for every row
+  """
+  return CHUNK_ROWS if maxRows is None else max(1, min(CHUNK_ROWS, maxRows))
+
+
+def _columnIndices(header, columns):
+  missing = [column for column in columns if column not in header]
+  if missing:
+    raise KeyError(f"Column(s) {', '.join(str(column) for column in missing)} not found")
+  return [header.index(column) for column in columns]
+
+
+def _locateFormatError(lines, firstLine, columns, usecols, delimiter):
+  reader = csv.reader(lines, delimiter=delimiter)
+  for row in reader:
+    if not row or all(not value.strip() for value in row):
+      continue
+    for column, index in zip(columns, usecols):
+      value = row[index] if index < len(row) else ""
+      try:
+        float(value)
+      except ValueError:
+        raise TransformsFormatError(firstLine + reader.line_num - 1, column, value)
+
+
+def readArrowHeader(filepath):
+  """
+  Returns the column names of a Parquet or Feather/Arrow transforms file. Only the schema is read.
+  Requires the pyarrow package.
+  :param filepath: path to the transforms file
+  """
+  import pyarrow
+  if filepath.endswith(".parquet"):
+    import pyarrow.parquet
+    return list(pyarrow.parquet.read_schema(filepath).names)
+  try:
+    with pyarrow.memory_map(filepath) as source:
+      return list(pyarrow.ipc.open_file(source).schema.names)
+  except pyarrow.ArrowInvalid:
+    # Feather version 1 files are not Arrow IPC files
+    import pyarrow.feather
+    return list(pyarrow.feather.read_table(filepath, memory_map=True).schema.names)
+
+
+def readArrowColumns(filepath, columns, maxRows=None):
+  """
+  Reads some columns of a Parquet or Feather/Arrow transforms file into a float64 array. Only the
+  requested columns are read. A Feather/Arrow file is memory-mapped, and its columns are viewed
+  without copy until they are gathered into the returned array. Raises a TransformsFormatError
+  locating the first value that is missing or not a number (rows are numbered from 1), and a
+  KeyError if a column is missing.
+  Requires the pyarrow package.
+  :param filepath: path to the transforms file
+  :param columns: names of the columns to read
+  :param maxRows: only read the first maxRows rows, None to read every row
+  """
+  import pyarrow
+  _columnIndices(readArrowHeader(filepath), columns)
+  if filepath.endswith(".parquet"):
+    import pyarrow.parquet
+    parquetFile = pyarrow.parquet.ParquetFile(filepath, memory_map=True)
+    if maxRows is None:
+      table = parquetFile.read(columns=list(columns))
+    else:
+      # Only the row groups holding the first rows are decoded
+      batches = []
+      numRows = 0
+      for batch in parquetFile.iter_batches(batch_size=chunkSize(maxRows), columns=list(columns)):
+        batches.append(batch)
+        numRows += batch.num_rows
+        if numRows >= maxRows:
+          break
+      table = pyarrow.Table.from_batches(batches, schema=parquetFile.schema_arrow.select(list(columns)))
+  else:
+    import pyarrow.feather
+    table = pyarrow.feather.read_table(filepath, columns=list(columns), memory_map=True)
+  if maxRows is not None:
+    table = table.slice(0, maxRows)
+
+  values = np.empty((table.num_rows, len(columns)), dtype=np.float64)
+  for position, column in enumerate(columns):
+    values[:, position] = _arrowColumnToNumpy(table.column(column), column)
+  return values
+
+
+def _arrowColumnToNumpy(column, name):
+  import pyarrow
+  if column.null_count:
+    row = next(index for index, value in enumerate(column.is_null().to_pylist()) if value)
+    raise TransformsFormatError(row + 1, name, "")
+  if not (pyarrow.types.is_floating(column.type) or pyarrow.types.is_integer(column.type)):
+    for row, value in enumerate(column.to_pylist()):
+      try:
+        float(value)
+      except (TypeError, ValueError):
+        raise TransformsFormatError(row + 1, name, value)
+    return np.asarray(column.to_pylist(), dtype=np.float64)
+  if column.num_chunks == 1:
+    # A numeric chunk without missing values is viewed without copy
+    return column.chunk(0).to_numpy(zero_copy_only=True)
+  return column.to_numpy()
+
+
+def _hdf5Columns(hdf5File):
+  """
+  Returns {column name: (dataset, field name or None)} for the columns of an HDF5 file: the fields
+  of its first compound dataset, or otherwise its one-dimensional numeric datasets.
+  """
+  datasets = [hdf5File[name] for name in hdf5File.keys() if hasattr(hdf5File[name], "dtype")]
+  for dataset in datasets:
+    if dataset.dtype.names:
+      return {field: (dataset, field) for field in dataset.dtype.names}
+  return {dataset.name.lstrip("/"): (dataset, None) for dataset in datasets
+          if dataset.ndim == 1 and dataset.dtype.kind in "biuf"}
+
+
+def readHDF5Header(filepath):
+  """
+  Returns the column names of an HDF5 transforms file (see readHDF5Columns). Only the metadata of
+  the file is read. Requires the h5py package.
+  :param filepath: path to the transforms file
+  """
+  import h5py
+  with h5py.File(filepath, "r") as hdf5File:
+    return list(_hdf5Columns(hdf5File))
+
+
+def readHDF5Columns(filepath, columns, maxRows=None):
+  """
+  Reads some columns of an HDF5 transforms file into a float64 array. The columns are the fields of
+  the first compound dataset of the file, or otherwise its one-dimensional numeric datasets. Only
+  the requested columns, and rows, are read from the file. Raises a KeyError if a column is missing.
+  Requires the h5py package.
+  :param filepath: path to the transforms file
+  :param columns: names of the columns to read
+  :param maxRows: only read the first maxRows rows, None to read every row
+  """
+  import h5py
+  with h5py.File(filepath, "r") as hdf5File:
+    fileColumns = _hdf5Columns(hdf5File)
+    _columnIndices(list(fileColumns), columns)
+    numRows = min(len(fileColumns[column][0]) for column in columns) if columns else 0
+    if maxRows is not None:
+      numRows = min(numRows, maxRows)
+    values = np.empty((numRows, len(columns)), dtype=np.float64)
+    for position, column in enumerate(columns):
+      dataset, field = fileColumns[column]
+      # Only the requested field of a compound dataset is read
+      values[:, position] = dataset.fields(field)[:numRows] if field is not None else dataset[:numRows]
+  return values